@@ -1,27 +1,21 @@
-from sqlalchemy import select
 from sqlalchemy.orm import Session
-from .models import Outlet, GroupMembership, OutletMembership, GroupRole, OutletRole
+from . import queries
+from .models import GroupRole, OutletRole
+from .outlet_cache import outlet_cache
 
 
 def get_outlet_group_id(db: Session, outlet_id: int) -> int | None:
-    return db.scalar(select(Outlet.group_id).where(Outlet.id == outlet_id))
+    meta = outlet_cache.get(db, outlet_id)
+    return meta.group_id if meta else None
 
 
 def has_wide_access(db: Session, user_id: int, group_id: int) -> bool:
-    role = db.scalar(
-        select(GroupMembership.role).where(
-            GroupMembership.user_id == user_id, GroupMembership.group_id == group_id
-        )
-    )
+    role = queries.group_role(db, user_id, group_id)
     return role in (GroupRole.GROUP_OWNER, GroupRole.GROUP_MANAGER)
 
 
 def has_outlet_access(db: Session, user_id: int, outlet_id: int) -> bool:
-    role = db.scalar(
-        select(OutletMembership.role).where(
-            OutletMembership.user_id == user_id, OutletMembership.outlet_id == outlet_id
-        )
-    )
+    role = queries.outlet_role(db, user_id, outlet_id)
     return role in (OutletRole.OUTLET_MANAGER, OutletRole.OUTLET_STAFF)
 
 
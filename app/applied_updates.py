@@ -0,0 +1,114 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event, insert, select, update as sql_update
+from sqlalchemy.orm import Session
+
+from .dispatch import update_key
+from .models import AppliedUpdate
+
+# Повторы апдейтов в режиме шардов (app/sharding.py): доставка at-least-once,
+# и воркер, упавший после commit, но до ack, получит апдейт ещё раз. Для
+# i:qty, text:set_qty и прочих записей это двойное применение. Поэтому для
+# каждого ключа очереди (чат, а у кнопок без чата — пользователь; id у них
+# пересекаются, так что вид ключа тоже в ключе) храним последний применённый
+# update_id и пишем его в той же транзакции, что и изменения апдейта. Повтор
+# с update_id не больше сохранённого пропускается целиком — до хендлеров.
+# Порядок внутри ключа держит диспетчер, так что гонок по одному ключу нет.
+#
+# Пишем только в commit, где апдейт что-то менял: нажатие, которое лишь
+# показывает меню или список, отметки не получает, и его повтор просто
+# покажет меню ещё раз.
+
+# (kind, key_id, update_id, строка уже есть) для апдейта, который сейчас в работе
+_applying: ContextVar[tuple[str, int, int, bool] | None] = ContextVar(
+    "applying_update", default=None
+)
+
+
+@contextmanager
+def applying(session_factory, update):
+    # -> False, если апдейт уже применён
+    kind, key_id = update_key(update)
+    if kind == "update":
+        # апдейты без чата ничего не пишут
+        yield True
+        return
+    with session_factory() as db:
+        last = db.scalar(
+            select(AppliedUpdate.update_id).where(
+                AppliedUpdate.kind == kind, AppliedUpdate.key_id == key_id
+            )
+        )
+    if last is not None and update.update_id <= last:
+        yield False
+        return
+    token = _applying.set((kind, key_id, update.update_id, last is not None))
+    try:
+        yield True
+    finally:
+        _applying.reset(token)
+
+
+def mark(db: Session):
+    # сессия апдейта: с первым commit, в котором есть изменения, записать
+    # update_id
+    current = _applying.get()
+    if current is not None:
+        db.info["applied_update"] = current
+
+
+def _has_changes(session: Session) -> bool:
+    return bool(
+        session.new
+        or session.deleted
+        or any(session.is_modified(obj) for obj in session.dirty)
+    )
+
+
+@event.listens_for(Session, "after_flush")
+def _flushed(session: Session, flush_context):
+    # изменения, ушедшие в базу до commit (db.flush() в хендлере)
+    if "applied_update" in session.info and _has_changes(session):
+        session.info["applied_changes"] = True
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _executed(state):
+    # insert()/update()/delete() через сессию мимо unit of work
+    if "applied_update" in state.session.info and (
+        state.is_insert or state.is_update or state.is_delete
+    ):
+        state.session.info["applied_changes"] = True
+
+
+@event.listens_for(Session, "before_commit")
+def _write_applied(session: Session):
+    # savepoint (begin_nested) — не то: пишем в основной транзакции
+    current = session.info.get("applied_update")
+    if current is None or session.in_nested_transaction():
+        return
+    if not (session.info.get("applied_changes") or _has_changes(session)):
+        return
+    kind, key_id, update_id, exists = current
+    if exists:
+        session.execute(
+            sql_update(AppliedUpdate)
+            .where(AppliedUpdate.kind == kind, AppliedUpdate.key_id == key_id)
+            .values(update_id=update_id)
+        )
+    else:
+        session.execute(
+            insert(AppliedUpdate).values(kind=kind, key_id=key_id, update_id=update_id)
+        )
+    session.info["applied_written"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _applied_written(session: Session):
+    # не прошёл commit — запишем со следующим
+    if session.in_nested_transaction():
+        return
+    session.info.pop("applied_changes", None)
+    if session.info.pop("applied_written", False):
+        session.info.pop("applied_update", None)
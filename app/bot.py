@@ -1,109 +1,301 @@
 import datetime
-import os
+import logging
+import threading
+import time
+from contextlib import contextmanager, nullcontext
 import telebot
-from telebot import types
+from telebot.apihelper import ApiTelegramException
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from decimal import Decimal, InvalidOperation
-
-from .export_xslx import export_outlet_xlsx
+from tempfile import SpooledTemporaryFile
+
+from .export_xslx import export_outlet_xlsx, export_group_xlsx
+from .export_cache import ExportCache, export_watermark
+from .export_csv import export_outlet_csv, export_outlet_jsonl, TABLE_INVENTORY, TABLE_AUDIT
+from . import applied_updates
+from . import callbacks as cbdata
+from . import keyboards
+from . import metrics
+from . import queries
+from . import sqlstats
+from .callbacks import SORT_ALPHA, SORT_CREATED, SORT_UPDATED
 from .config import Config
+from .dispatch import UpdateDispatcher
+from .outlet_cache import outlet_cache
+from .profiling import UpdateProfiler
+from .render_cache import RenderCache, render_fingerprint
+from .state_store import MemoryStateStore, StateStore
 from .models import User, Outlet, Group, Item, StockBalance
 from .services.onboarding import get_or_create_user
 from .services import groups as groups_svc
-from .access import can_access_outlet, has_wide_access
+from .services import exports as exports_svc
+from .access import can_access_outlet, get_outlet_group_id, has_wide_access
 from .audit import log
 from .models import AuditAction
 
 
-# ---------------------------
-# Callback prefixes
-# ---------------------------
-CB_MENU = "m"  # main menu
-CB_GRP = "g"  # groups
-CB_OUT = "o"  # outlets
-CB_INV = "i"  # inventory
+logger = logging.getLogger(__name__)
+
+# под нагрузкой и при остановке новые выгрузки не начинаем
+# (i:exportrange только спрашивает даты — отказ на следующем шаге)
+EXPORT_ACTIONS = frozenset(
+    ("g:export", "i:export", "i:exportcsv", "i:exportjsonl", "i:exportnew")
+)
+# ответ на сброшенное нажатие кнопки
+SHED_TEXT = "⏳ Бот перегружен, нажми ещё раз через пару секунд"
+
+
+class DispatchingTeleBot(telebot.TeleBot):
+    # Вместо встроенного пула telebot апдейты уходят в UpdateDispatcher:
+    # разные чаты параллельно, один чат — строго по порядку.
+    dispatcher: UpdateDispatcher | None = None
 
-# Sort keys
-SORT_ALPHA = "alpha"
-SORT_CREATED = "created"
-SORT_UPDATED = "updated"
+    def process_new_updates(self, updates):
+        for update in updates:
+            metrics.updates_received.inc(metrics.update_kind(update))
+        if self.dispatcher is None:
+            return super().process_new_updates(updates)
+        for update in updates:
+            # offset для getUpdates считается отсюда — сдвигаем сами
+            if update.update_id > self.last_update_id:
+                self.last_update_id = update.update_id
+            self.dispatcher.submit(update)
+
+    def process_update_now(self, update):
+        super().process_new_updates([update])
 
 
 class BotApp:
-    def __init__(self, cfg: Config, session_factory):
-        self.bot = telebot.TeleBot(cfg.bot_token)
+    def __init__(
+        self,
+        cfg: Config,
+        session_factory,
+        bot: telebot.TeleBot | None = None,
+        state_store: StateStore | None = None,
+        read_session_factory=None,
+    ):
+        # bot передают снаружи шард-воркеры и нагрузочный прогон; иначе —
+        # свой пул потоков
+        if bot is None:
+            pooled = cfg.workers > 0
+            bot = DispatchingTeleBot(cfg.bot_token, threaded=not pooled)
+            if pooled:
+                bot.dispatcher = UpdateDispatcher(
+                    bot.process_update_now,
+                    cfg.workers,
+                    cfg.queue_size,
+                    overflow=cfg.overflow,
+                    stale_after=cfg.stale_callback_age,
+                    shed=self.shed_update,
+                )
+                bot.dispatcher.start()
+        self.bot = bot
         self.Session = session_factory
+        # списки и выгрузки читают через read-only движок (DB_READ_URL), если
+        # он есть; на реплике они могут отставать от только что записанного
+        self.ReadSession = read_session_factory or session_factory
+        self.export_workers = cfg.export_workers
+        self.export_gzip = cfg.export_gzip
+        self.export_spool_bytes = cfg.export_spool_bytes
+        self.export_refuse_load = cfg.export_refuse_load
+        self._draining = False
+        self.sql_warn_queries = cfg.sql_warn_queries
+        self.sql_warn_time = cfg.sql_warn_time
+        self.sql_warn_repeats = cfg.sql_warn_repeats
+        metrics.queue_depth.set_function(lambda: self.queue_depth())
+        # профили апдейтов — только если включены (app/profiling.py)
+        self.profiler = None
+        if cfg.profile_sample_rate > 0 or cfg.profile_slow_after > 0:
+            self.profiler = UpdateProfiler(
+                cfg.profile_dir,
+                sample_rate=cfg.profile_sample_rate,
+                slow_after=cfg.profile_slow_after,
+                keep=cfg.profile_keep,
+                interval=cfg.profile_interval,
+            )
 
-        # in-memory state for dialog steps
+        # state for dialog steps
         # tg_user_id -> dict: {mode, group_id, outlet_id, item_id, sort}
-        self.user_states = {}
+        self.states = state_store or MemoryStateStore(
+            cfg.state_max_users, cfg.state_ttl
+        )
+        self._states_lock = threading.Lock()
+
+        # (chat_id, message_id) -> что сейчас отрисовано в сообщении
+        self.render_cache = RenderCache(cfg.render_cache_size)
+        outlet_cache.configure(cfg.outlet_cache_size, cfg.outlet_cache_ttl)
+
+        # outlet -> уже загруженный в Telegram файл (file_id) + watermark
+        self.export_cache = ExportCache(
+            cfg.export_cache_ttl,
+            cfg.export_cache_max_entries,
+            cfg.export_cache_max_bytes,
+        )
 
         self._register_handlers()
 
+    def feed(self, update):
+        # точка входа для апдейтов не из polling (webhook)
+        self.bot.process_new_updates([update])
+
+    def process_once(self, update) -> bool:
+        # воркер шарда: повтор уже применённого апдейта пропускаем
+        # (app/applied_updates.py); False — пропущен
+        with applied_updates.applying(self.Session, update) as fresh:
+            if fresh:
+                self.bot.process_update_now(update)
+        if not fresh:
+            logger.info("update %s already applied, skipped", update.update_id)
+        return fresh
+
+    # ---------------------------
+    # Load shedding / shutdown
+    # ---------------------------
+    def load(self) -> float:
+        # заполненность очереди апдейтов, 0..1
+        dispatcher = getattr(self.bot, "dispatcher", None)
+        return dispatcher.load() if dispatcher is not None else 0.0
+
+    def queue_depth(self) -> int:
+        # апдейты в очереди и в работе
+        dispatcher = getattr(self.bot, "dispatcher", None)
+        return dispatcher.queue_depth() if dispatcher is not None else 0
+
+    def shed_update(self, update) -> bool:
+        # очередь полна или апдейт залежался: нажатие кнопки бросаем, но
+        # отвечаем, чтобы у пользователя не крутились часики; сообщения
+        # (ввод в диалоге) не бросаем никогда
+        cq = update.callback_query
+        if cq is None:
+            return False
+        metrics.updates_shed.inc()
+        try:
+            self.bot.answer_callback_query(cq.id, SHED_TEXT)
+        except Exception:
+            # query уже протух — ответить нельзя, бросаем всё равно
+            logger.debug("shed: answerCallbackQuery failed", exc_info=True)
+        return True
+
+    def _refuse_exports(self) -> bool:
+        return self._draining or self.load() >= self.export_refuse_load
+
+    def drain(self, timeout: float | None = None):
+        # остановка: новые экспорты не берём, очередь дорабатываем
+        self._draining = True
+        dispatcher = getattr(self.bot, "dispatcher", None)
+        if dispatcher is not None:
+            dispatcher.stop(timeout)
+
     # ---------------------------
     # State helpers
     # ---------------------------
+    # хендлеры работают в нескольких потоках: store отдаёт копию,
+    # read-modify-write — под локом
     def _st(self, tg_user_id: int) -> dict:
-        return self.user_states.setdefault(tg_user_id, {})
+        return self.states.get(tg_user_id)
 
     def _set_mode(self, tg_user_id: int, mode: str, **kwargs):
-        st = self._st(tg_user_id)
-        st["mode"] = mode
-        for k, v in kwargs.items():
-            st[k] = v
+        with self._states_lock:
+            st = self.states.get(tg_user_id)
+            st["mode"] = mode
+            for k, v in kwargs.items():
+                st[k] = v
+            self.states.put(tg_user_id, st)
 
     def _clear_mode(self, tg_user_id: int):
-        st = self._st(tg_user_id)
-        st.pop("mode", None)
-        st.pop("group_id", None)
-        st.pop("outlet_id", None)
-        st.pop("item_id", None)
-        # sort оставляем, это предпочтение
+        with self._states_lock:
+            st = self.states.get(tg_user_id)
+            if not st:
+                return
+            st.pop("mode", None)
+            st.pop("group_id", None)
+            st.pop("outlet_id", None)
+            st.pop("item_id", None)
+            # sort оставляем, это предпочтение
+            self.states.put(tg_user_id, st)
 
     def _get_sort(self, tg_user_id: int) -> str:
         return self._st(tg_user_id).get("sort", SORT_ALPHA)
 
     def _set_sort(self, tg_user_id: int, sort: str):
-        self._st(tg_user_id)["sort"] = sort
+        with self._states_lock:
+            st = self.states.get(tg_user_id)
+            st["sort"] = sort
+            self.states.put(tg_user_id, st)
 
     # ---------------------------
     # DB helpers (inventory)
     # ---------------------------
     def _get_balance(self, db, outlet_id: int, item_id: int) -> StockBalance:
-        bal = db.scalar(
-            select(StockBalance).where(
-                StockBalance.outlet_id == outlet_id, StockBalance.item_id == item_id
-            )
-        )
+        bal = queries.balance(db, outlet_id, item_id)
         if not bal:
             bal = StockBalance(outlet_id=outlet_id, item_id=item_id, quantity=0)
             db.add(bal)
             db.flush()
         return bal
 
-    def _list_items_with_qty(self, db, outlet_id: int, sort: str):
-        q = select(Item).where(Item.outlet_id == outlet_id, Item.is_active == True)
-        # если у Item нет created_at/updated_at — оставь только alpha или сортируй по id
-        if sort == SORT_CREATED and hasattr(Item, "created_at"):
-            q = q.order_by(Item.created_at.desc(), Item.id.desc())
-        elif sort == SORT_UPDATED and hasattr(Item, "updated_at"):
-            q = q.order_by(Item.updated_at.desc(), Item.id.desc())
-        else:
-            q = q.order_by(Item.name.asc())
+    @contextmanager
+    def _unit_of_work(
+        self,
+        handler: str,
+        action: str,
+        user_id: int | None = None,
+        outlet_id: int | None = None,
+    ):
+        # одна транзакция на апдейт: сервисы только flush'ат, хендлер коммитит
+        # один раз — до ответа в Telegram, чтобы не держать блокировку на время
+        # сетевых вызовов. Что осталось (новый пользователь, смена имени) —
+        # коммитится на выходе; пустой commit в базу не пишет. Исключение —
+        # откат всего апдейта.
+        # Весь SQL апдейта считается в app/sqlstats.py под (handler, action),
+        # время и число запросов уходят в метрики. user_id / outlet_id —
+        # только для имени файла профиля.
+        profile = (
+            self.profiler.profile(action, user_id, outlet_id)
+            if self.profiler is not None
+            else nullcontext()
+        )
+        started = time.perf_counter()
+        with profile, sqlstats.track(
+            handler,
+            action,
+            self.sql_warn_queries,
+            self.sql_warn_time,
+            self.sql_warn_repeats,
+        ) as stats:
+            try:
+                with self.Session() as db:
+                    applied_updates.mark(db)
+                    yield db
+                    db.commit()
+            except Exception:
+                metrics.action_errors.inc(handler, action)
+                raise
+            finally:
+                metrics.action_seconds.observe(
+                    time.perf_counter() - started, handler, action
+                )
+                metrics.action_queries.observe(stats.count, handler, action)
 
-        items = db.scalars(q).all()
+    @contextmanager
+    def _read_db(self, db):
+        # сессия для чтения списка: отдельная, если задан read-движок
+        if self.ReadSession is self.Session:
+            yield db
+            return
+        with self.ReadSession() as rdb:
+            yield rdb
+
+    def _list_items_with_qty(self, db, outlet_id: int, sort: str):
+        items = queries.active_items(db, outlet_id, sort)
 
         # balances одним проходом
         item_ids = [it.id for it in items]
         if not item_ids:
             return []
 
-        bals = db.scalars(
-            select(StockBalance).where(
-                StockBalance.outlet_id == outlet_id, StockBalance.item_id.in_(item_ids)
-            )
-        ).all()
+        bals = queries.balances_for(db, outlet_id, item_ids)
         bmap = {b.item_id: b for b in bals}
 
         result = []
@@ -116,194 +308,35 @@ class BotApp:
             result.append((it, qty))
         return result
 
-    # ---------------------------
-    # Keyboards
-    # ---------------------------
-    def _kb_main(self):
-        kb = types.InlineKeyboardMarkup()
-        kb.row(types.InlineKeyboardButton("🏢 Группы", callback_data=f"{CB_GRP}:list"))
-        kb.row(
-            types.InlineKeyboardButton("🏬 Точки", callback_data=f"{CB_OUT}:pick_group")
-        )
-        kb.row(
-            types.InlineKeyboardButton(
-                "📦 Инвентарь", callback_data=f"{CB_INV}:pick_group"
-            )
-        )
-        return kb
-
-    def _kb_groups_list(self):
-        kb = types.InlineKeyboardMarkup()
-        kb.row(
-            types.InlineKeyboardButton(
-                "➕ Создать группу", callback_data=f"{CB_GRP}:create"
-            )
-        )
-        kb.row(types.InlineKeyboardButton("⬅️ В меню", callback_data=f"{CB_MENU}:home"))
-        return kb
-
-    def _kb_group_pick(self, groups: list[Group], back_cb: str):
-        kb = types.InlineKeyboardMarkup()
-        for g in groups:
-            kb.row(
-                types.InlineKeyboardButton(
-                    f"🏢 {g.name} (#{g.id})",
-                    callback_data=f"{CB_GRP}:select:{g.id}:{back_cb}",
-                )
-            )
-        kb.row(types.InlineKeyboardButton("⬅️ В меню", callback_data=f"{CB_MENU}:home"))
-        return kb
-
-    def _kb_outlets_list(self, group_id: int, can_create: bool):
-        kb = types.InlineKeyboardMarkup()
-        if can_create:
-            kb.row(
-                types.InlineKeyboardButton(
-                    "➕ Создать точку", callback_data=f"{CB_OUT}:create:{group_id}"
-                )
-            )
-        kb.row(
-            types.InlineKeyboardButton(
-                "⬅️ Назад (группы)", callback_data=f"{CB_OUT}:pick_group"
-            )
-        )
-        kb.row(types.InlineKeyboardButton("⬅️ В меню", callback_data=f"{CB_MENU}:home"))
-        return kb
-
-    def _kb_outlet_pick(self, group_id: int, outlets: list[Outlet], next_cb: str):
-        kb = types.InlineKeyboardMarkup()
-        for o in outlets:
-            kb.row(
-                types.InlineKeyboardButton(
-                    f"🏬 {o.name} (#{o.id})",
-                    callback_data=f"{CB_OUT}:select:{o.id}:{next_cb}",
-                )
-            )
-        kb.row(
-            types.InlineKeyboardButton(
-                "⬅️ Назад (группы)", callback_data=f"{CB_OUT}:pick_group"
-            )
-        )
-        kb.row(types.InlineKeyboardButton("⬅️ В меню", callback_data=f"{CB_MENU}:home"))
-        return kb
-
-    def _kb_inventory(self, outlet_id: int, sort: str):
-        kb = types.InlineKeyboardMarkup()
-        kb.row(
-            types.InlineKeyboardButton(
-                "➕ Добавить товар", callback_data=f"{CB_INV}:add:{outlet_id}"
-            ),
-            types.InlineKeyboardButton(
-                "↕️ Сортировка", callback_data=f"{CB_INV}:sort:{outlet_id}"
-            ),
-        )
-        kb.row(
-            types.InlineKeyboardButton(
-                "🔄 Обновить", callback_data=f"{CB_INV}:open:{outlet_id}:{sort}"
-            )
-        )
-        kb.row(
-            types.InlineKeyboardButton(
-                "📤 Экспорт в Excel", callback_data=f"i:export:{outlet_id}"
-            )
-        )
-
-        kb.row(
-            types.InlineKeyboardButton(
-                "⬅️ Назад (точки)", callback_data=f"{CB_INV}:pick_group"
-            )
-        )
-        kb.row(types.InlineKeyboardButton("⬅️ В меню", callback_data=f"{CB_MENU}:home"))
-        return kb
-
-    def _kb_inventory_sort(self, outlet_id: int, current: str):
-        kb = types.InlineKeyboardMarkup()
-
-        def b(lbl, key):
-            mark = " ✅" if current == key else ""
-            return types.InlineKeyboardButton(
-                lbl + mark, callback_data=f"{CB_INV}:setsort:{outlet_id}:{key}"
-            )
-
-        kb.row(b("🔤 По алфавиту", SORT_ALPHA))
-        kb.row(b("🕒 По времени добавления", SORT_CREATED))
-        kb.row(b("✏️ По времени изменения", SORT_UPDATED))
-        kb.row(
-            types.InlineKeyboardButton(
-                "⬅️ Назад", callback_data=f"{CB_INV}:open:{outlet_id}:{current}"
-            )
-        )
-        return kb
-
-    def _kb_item_card(self, outlet_id: int, item_id: int, sort: str):
-        kb = types.InlineKeyboardMarkup()
-        kb.row(
-            types.InlineKeyboardButton(
-                "➖10", callback_data=f"{CB_INV}:qty:{outlet_id}:{item_id}:-10:{sort}"
-            ),
-            types.InlineKeyboardButton(
-                "➖1", callback_data=f"{CB_INV}:qty:{outlet_id}:{item_id}:-1:{sort}"
-            ),
-            types.InlineKeyboardButton(
-                "➕1", callback_data=f"{CB_INV}:qty:{outlet_id}:{item_id}:1:{sort}"
-            ),
-            types.InlineKeyboardButton(
-                "➕10", callback_data=f"{CB_INV}:qty:{outlet_id}:{item_id}:10:{sort}"
-            ),
-        )
-        kb.row(
-            types.InlineKeyboardButton(
-                "✍️ Задать количество",
-                callback_data=f"{CB_INV}:setqty:{outlet_id}:{item_id}:{sort}",
-            )
-        )
-        kb.row(
-            types.InlineKeyboardButton(
-                "✏️ Переименовать",
-                callback_data=f"{CB_INV}:rename:{outlet_id}:{item_id}:{sort}",
-            ),
-            types.InlineKeyboardButton(
-                "📏 Изменить unit",
-                callback_data=f"{CB_INV}:unit:{outlet_id}:{item_id}:{sort}",
-            ),
-        )
-        kb.row(
-            types.InlineKeyboardButton(
-                "🗑 Удалить", callback_data=f"{CB_INV}:del:{outlet_id}:{item_id}:{sort}"
-            )
-        )
-        kb.row(
-            types.InlineKeyboardButton(
-                "⬅️ К списку", callback_data=f"{CB_INV}:open:{outlet_id}:{sort}"
-            )
-        )
-        return kb
-
-    def _kb_delete_confirm(self, outlet_id: int, item_id: int, sort: str):
-        kb = types.InlineKeyboardMarkup()
-        kb.row(
-            types.InlineKeyboardButton(
-                "✅ Да, удалить",
-                callback_data=f"{CB_INV}:delok:{outlet_id}:{item_id}:{sort}",
-            ),
-            types.InlineKeyboardButton(
-                "❌ Отмена", callback_data=f"{CB_INV}:item:{outlet_id}:{item_id}:{sort}"
-            ),
-        )
-        return kb
-
     # ---------------------------
     # Renderers
     # ---------------------------
     def _send_or_edit(self, chat_id: int, message_id: int | None, text: str, kb=None):
-        # пытаемся редактировать, если не выйдет — отправим новое
+        # пытаемся редактировать, если не выйдет — отправим новое.
+        # 429 сюда не доходит: его пережидает планировщик (app/outbound.py),
+        # а сетевые ошибки не глотаем — иначе сообщение молча теряется
+        fp = render_fingerprint(text, kb)
         if message_id:
+            # то же самое уже на экране — round trip не нужен
+            if self.render_cache.is_current(chat_id, message_id, fp):
+                return
             try:
-                self.bot.edit_message_text(text, chat_id, message_id, reply_markup=kb)
+                with metrics.telegram_call("editMessageText"):
+                    self.bot.edit_message_text(
+                        text, chat_id, message_id, reply_markup=kb
+                    )
+                self.render_cache.remember(chat_id, message_id, fp)
                 return
-            except Exception:
-                pass
-        self.bot.send_message(chat_id, text, reply_markup=kb)
+            except ApiTelegramException as e:
+                if "message is not modified" in (e.description or ""):
+                    self.render_cache.remember(chat_id, message_id, fp)
+                    return
+                self.render_cache.forget(chat_id, message_id)
+                logger.debug("edit %s/%s failed: %s", chat_id, message_id, e)
+        with metrics.telegram_call("sendMessage"):
+            sent = self.bot.send_message(chat_id, text, reply_markup=kb)
+        if sent is not None:
+            self.render_cache.remember(chat_id, sent.message_id, fp)
 
     def _render_main(self, chat_id: int, message_id: int | None, u: User):
         active = f"#{u.active_outlet_id}" if u.active_outlet_id else "не выбрана"
@@ -312,7 +345,7 @@ class BotApp:
             f"Активная точка: {active}\n\n"
             "Выбери действие:"
         )
-        self._send_or_edit(chat_id, message_id, text, self._kb_main())
+        self._send_or_edit(chat_id, message_id, text, keyboards.main())
 
     # ---------------------------
     # Handlers
@@ -322,7 +355,7 @@ class BotApp:
 
         @bot.message_handler(commands=["start"])
         def start(m):
-            with self.Session() as db:
+            with self._unit_of_work("command", "/start", m.from_user.id) as db:
                 u = get_or_create_user(db, m.from_user.id, m.from_user.full_name)
                 self._clear_mode(m.from_user.id)
                 self._render_main(m.chat.id, None, u)
@@ -330,477 +363,19 @@ class BotApp:
         # можно оставить /menu
         @bot.message_handler(commands=["menu"])
         def menu(m):
-            with self.Session() as db:
+            with self._unit_of_work("command", "/menu", m.from_user.id) as db:
                 u = get_or_create_user(db, m.from_user.id, m.from_user.full_name)
                 self._clear_mode(m.from_user.id)
                 self._render_main(m.chat.id, None, u)
 
         # ---------------------------
-        # MAIN callbacks
-        # ---------------------------
-        @bot.callback_query_handler(func=lambda c: c.data.startswith(f"{CB_MENU}:"))
-        def cb_menu(c):
-            with self.Session() as db:
-                u = get_or_create_user(db, c.from_user.id, c.from_user.full_name)
-                self._clear_mode(c.from_user.id)
-                self._render_main(c.message.chat.id, c.message.message_id, u)
-                bot.answer_callback_query(c.id)
-
-        # ---------------------------
-        # GROUPS callbacks
-        # ---------------------------
-        @bot.callback_query_handler(func=lambda c: c.data.startswith(f"{CB_GRP}:"))
-        def cb_groups(c):
-            parts = c.data.split(":")
-            action = parts[1]
-
-            with self.Session() as db:
-                u = get_or_create_user(db, c.from_user.id, c.from_user.full_name)
-
-                if action == "list":
-                    groups = groups_svc.user_groups(db, u.id)
-                    if not groups:
-                        text = "У тебя пока нет групп.\nНажми «Создать группу»."
-                    else:
-                        text = "Твои группы:\n" + "\n".join(
-                            [f"- 🏢 {g.name} (#{g.id})" for g in groups]
-                        )
-
-                    self._send_or_edit(
-                        c.message.chat.id,
-                        c.message.message_id,
-                        text,
-                        self._kb_groups_list(),
-                    )
-                    self._clear_mode(c.from_user.id)
-                    bot.answer_callback_query(c.id)
-                    return
-
-                if action == "create":
-                    self._set_mode(c.from_user.id, "create_group")
-                    bot.answer_callback_query(c.id)
-                    bot.send_message(
-                        c.message.chat.id, "✍️ Введи название группы одним сообщением:"
-                    )
-                    return
-
-                if action == "select":
-                    # g:select:<group_id>:<back_cb>
-                    group_id = int(parts[2])
-                    back_cb = parts[3] if len(parts) >= 4 else "outlets"
-
-                    # перенаправление: после выбора группы показать точки или инвентарь
-                    if back_cb == "outlets":
-                        # открываем точки по группе
-                        return self._open_outlets_for_group(db, c, u, group_id)
-                    if back_cb == "inventory":
-                        # открыть точки чтобы выбрать точку для инвентаря
-                        return self._pick_outlet_for_inventory(db, c, u, group_id)
-
-                    bot.answer_callback_query(c.id, "Неизвестное действие")
-                    return
-
-                bot.answer_callback_query(c.id, "Неизвестное действие")
-
-        # ---------------------------
-        # OUTLETS callbacks
-        # ---------------------------
-        @bot.callback_query_handler(func=lambda c: c.data.startswith(f"{CB_OUT}:"))
-        def cb_outlets(c):
-            parts = c.data.split(":")
-            action = parts[1]
-
-            with self.Session() as db:
-                u = get_or_create_user(db, c.from_user.id, c.from_user.full_name)
-
-                if action == "pick_group":
-                    groups = groups_svc.user_groups(db, u.id)
-                    if not groups:
-                        self._send_or_edit(
-                            c.message.chat.id,
-                            c.message.message_id,
-                            "У тебя нет групп. Сначала создай группу.",
-                            self._kb_groups_list(),
-                        )
-                        bot.answer_callback_query(c.id)
-                        return
-
-                    self._send_or_edit(
-                        c.message.chat.id,
-                        c.message.message_id,
-                        "Выбери группу для просмотра точек:",
-                        self._kb_group_pick(groups, "outlets"),
-                    )
-                    bot.answer_callback_query(c.id)
-                    return
-
-                if action == "select":
-                    # o:select:<outlet_id>:<next_cb>
-                    outlet_id = int(parts[2])
-                    next_cb = parts[3] if len(parts) >= 4 else "inventory"
-
-                    if not can_access_outlet(db, u.id, outlet_id):
-                        bot.answer_callback_query(c.id, "Нет доступа к точке")
-                        return
-
-                    u.active_outlet_id = outlet_id
-                    db.commit()
-
-                    bot.answer_callback_query(c.id, "Активная точка выбрана")
-                    if next_cb == "inventory":
-                        # открыть инвентарь по этой точке
-                        return self._open_inventory(
-                            db,
-                            c.message.chat.id,
-                            c.message.message_id,
-                            u,
-                            outlet_id,
-                            self._get_sort(c.from_user.id),
-                        )
-                    else:
-                        # просто вернемся в меню
-                        self._render_main(c.message.chat.id, c.message.message_id, u)
-                        return
-
-                if action == "create":
-                    # o:create:<group_id>
-                    group_id = int(parts[2])
-
-                    # проверка прав: wide-owner/manager
-                    if not has_wide_access(db, u.id, group_id):
-                        bot.answer_callback_query(
-                            c.id, "Нет прав создавать точки в этой группе"
-                        )
-                        return
-
-                    self._set_mode(c.from_user.id, "create_outlet", group_id=group_id)
-                    bot.answer_callback_query(c.id)
-                    bot.send_message(
-                        c.message.chat.id,
-                        "✍️ Введи название точки одним сообщением (адрес можно потом):",
-                    )
-                    return
-
-                bot.answer_callback_query(c.id, "Неизвестное действие")
-
-        # ---------------------------
-        # INVENTORY callbacks
+        # Callbacks: один вход, дальше — по таблице действий (_callback_routes)
         # ---------------------------
-        @bot.callback_query_handler(func=lambda c: c.data.startswith(f"{CB_INV}:"))
-        def cb_inventory(c):
-            parts = c.data.split(":")
-            action = parts[1]
-
-            with self.Session() as db:
-                u = get_or_create_user(db, c.from_user.id, c.from_user.full_name)
-                
-                if action == "export":
-                    outlet_id = int(parts[2])
-
-                    if not can_access_outlet(db, u.id, outlet_id):
-                        bot.answer_callback_query(c.id, "Нет доступа")
-                        return
-
-                    # генерируем файл
-                    ts = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-                    filename = f"inventory_outlet_{outlet_id}_{ts}.xlsx"
-                    path = os.path.join("tmp_exports", filename)
-
-                    export_outlet_xlsx(db, outlet_id, path)
-
-                    bot.answer_callback_query(c.id, "Готовлю файл…")
-                    with open(path, "rb") as f:
-                        bot.send_document(c.message.chat.id, f, visible_file_name=filename)
-                    return
-
-                if action == "pick_group":
-                    groups = groups_svc.user_groups(db, u.id)
-                    if not groups:
-                        self._send_or_edit(
-                            c.message.chat.id,
-                            c.message.message_id,
-                            "У тебя нет групп. Сначала создай группу.",
-                            self._kb_groups_list(),
-                        )
-                        bot.answer_callback_query(c.id)
-                        return
-
-                    self._send_or_edit(
-                        c.message.chat.id,
-                        c.message.message_id,
-                        "Выбери группу, затем точку, чтобы открыть инвентарь:",
-                        self._kb_group_pick(groups, "inventory"),
-                    )
-                    bot.answer_callback_query(c.id)
-                    return
-
-                if action == "open":
-                    # i:open:<outlet_id>:<sort>
-                    outlet_id = int(parts[2])
-                    sort = (
-                        parts[3] if len(parts) >= 4 else self._get_sort(c.from_user.id)
-                    )
-                    self._set_sort(c.from_user.id, sort)
-
-                    if not can_access_outlet(db, u.id, outlet_id):
-                        bot.answer_callback_query(c.id, "Нет доступа к точке")
-                        return
-
-                    u.active_outlet_id = outlet_id
-                    db.commit()
-
-                    bot.answer_callback_query(c.id)
-                    return self._open_inventory(
-                        db, c.message.chat.id, c.message.message_id, u, outlet_id, sort
-                    )
-
-                if action == "sort":
-                    outlet_id = int(parts[2])
-                    sort = self._get_sort(c.from_user.id)
-                    bot.answer_callback_query(c.id)
-                    self._send_or_edit(
-                        c.message.chat.id,
-                        c.message.message_id,
-                        "Выбери сортировку:",
-                        self._kb_inventory_sort(outlet_id, sort),
-                    )
-                    return
-
-                if action == "setsort":
-                    outlet_id = int(parts[2])
-                    sort = parts[3]
-                    self._set_sort(c.from_user.id, sort)
-                    bot.answer_callback_query(c.id, "Сортировка сохранена")
-                    return self._open_inventory(
-                        db, c.message.chat.id, c.message.message_id, u, outlet_id, sort
-                    )
-
-                if action == "add":
-                    outlet_id = int(parts[2])
-                    if not can_access_outlet(db, u.id, outlet_id):
-                        bot.answer_callback_query(c.id, "Нет доступа")
-                        return
-                    self._set_mode(c.from_user.id, "add_item", outlet_id=outlet_id)
-                    bot.answer_callback_query(c.id)
-                    bot.send_message(
-                        c.message.chat.id,
-                        "➕ Добавление товара\n"
-                        "Введи одной строкой:\n"
-                        "`название | unit | qty`\n\n"
-                        "Пример:\n"
-                        "Молоко | l | 10\n"
-                        "Сахар | kg | 3.5\n"
-                        "Крышка | pcs | 100\n\n"
-                        "qty можно пропустить (тогда 0).",
-                        parse_mode="Markdown",
-                    )
-                    return
-
-                if action == "item":
-                    # i:item:<outlet_id>:<item_id>:<sort>
-                    outlet_id = int(parts[2])
-                    item_id = int(parts[3])
-                    sort = (
-                        parts[4] if len(parts) >= 5 else self._get_sort(c.from_user.id)
-                    )
-
-                    if not can_access_outlet(db, u.id, outlet_id):
-                        bot.answer_callback_query(c.id, "Нет доступа")
-                        return
-
-                    return self._open_item_card(
-                        db,
-                        c.message.chat.id,
-                        c.message.message_id,
-                        outlet_id,
-                        item_id,
-                        sort,
-                        answer_cb=c.id,
-                    )
-
-                if action == "qty":
-                    # i:qty:<outlet_id>:<item_id>:<delta>:<sort>
-                    outlet_id = int(parts[2])
-                    item_id = int(parts[3])
-                    delta = int(parts[4])
-                    sort = (
-                        parts[5] if len(parts) >= 6 else self._get_sort(c.from_user.id)
-                    )
-
-                    if not can_access_outlet(db, u.id, outlet_id):
-                        bot.answer_callback_query(c.id, "Нет доступа")
-                        return
-
-                    group_id = db.scalar(
-                        select(Outlet.group_id).where(Outlet.id == outlet_id)
-                    )
-
-                    item = db.scalar(
-                        select(Item).where(
-                            Item.id == item_id,
-                            Item.outlet_id == outlet_id,
-                            Item.is_active == True,
-                        )
-                    )
-                    if not item:
-                        bot.answer_callback_query(c.id, "Товар не найден")
-                        return
-
-                    bal = self._get_balance(db, outlet_id, item_id)
-                    old = Decimal(str(bal.quantity))
-                    new_qty = Decimal(str(bal.quantity)) + Decimal(delta)
-                    if new_qty < 0:
-                        new_qty = Decimal("0")
-                    bal.quantity = new_qty
-                    # updated_at если есть
-                    if hasattr(item, "updated_at"):
-                        item.updated_at = datetime.datetime.utcnow()
-                    log(
-                        db,
-                        u.id,
-                        AuditAction.QTY_DELTA,
-                        "balance",
-                        entity_id=item_id,
-                        group_id=group_id,
-                        outlet_id=outlet_id,
-                        details=f"item_id={item_id};delta={delta};from={old};to={bal.quantity}",
-                    )
-                    db.commit()
-
-                    bot.answer_callback_query(c.id, "Ок")
-                    return self._open_item_card(
-                        db,
-                        c.message.chat.id,
-                        c.message.message_id,
-                        outlet_id,
-                        item_id,
-                        sort,
-                    )
-
-                if action == "setqty":
-                    # i:setqty:<outlet_id>:<item_id>:<sort>
-                    outlet_id = int(parts[2])
-                    item_id = int(parts[3])
-                    sort = (
-                        parts[4] if len(parts) >= 5 else self._get_sort(c.from_user.id)
-                    )
-                    if not can_access_outlet(db, u.id, outlet_id):
-                        bot.answer_callback_query(c.id, "Нет доступа")
-                        return
-
-                    self._set_mode(
-                        c.from_user.id,
-                        "set_qty",
-                        outlet_id=outlet_id,
-                        item_id=item_id,
-                        sort=sort,
-                    )
-                    bot.answer_callback_query(c.id)
-                    bot.send_message(
-                        c.message.chat.id,
-                        "✍️ Введи новое количество числом (например 12 или 3.5):",
-                    )
-                    return
-
-                if action == "rename":
-                    outlet_id = int(parts[2])
-                    item_id = int(parts[3])
-                    sort = (
-                        parts[4] if len(parts) >= 5 else self._get_sort(c.from_user.id)
-                    )
-                    if not can_access_outlet(db, u.id, outlet_id):
-                        bot.answer_callback_query(c.id, "Нет доступа")
-                        return
-
-                    self._set_mode(
-                        c.from_user.id,
-                        "rename_item",
-                        outlet_id=outlet_id,
-                        item_id=item_id,
-                        sort=sort,
-                    )
-                    bot.answer_callback_query(c.id)
-                    bot.send_message(
-                        c.message.chat.id, "✍️ Введи новое название товара:"
-                    )
-                    return
-
-                if action == "unit":
-                    outlet_id = int(parts[2])
-                    item_id = int(parts[3])
-                    sort = (
-                        parts[4] if len(parts) >= 5 else self._get_sort(c.from_user.id)
-                    )
-                    if not can_access_outlet(db, u.id, outlet_id):
-                        bot.answer_callback_query(c.id, "Нет доступа")
-                        return
-
-                    self._set_mode(
-                        c.from_user.id,
-                        "set_unit",
-                        outlet_id=outlet_id,
-                        item_id=item_id,
-                        sort=sort,
-                    )
-                    bot.answer_callback_query(c.id)
-                    bot.send_message(
-                        c.message.chat.id, "✍️ Введи новый unit (например pcs / kg / l):"
-                    )
-                    return
-
-                if action == "del":
-                    outlet_id = int(parts[2])
-                    item_id = int(parts[3])
-                    sort = (
-                        parts[4] if len(parts) >= 5 else self._get_sort(c.from_user.id)
-                    )
-
-                    if not can_access_outlet(db, u.id, outlet_id):
-                        bot.answer_callback_query(c.id, "Нет доступа")
-                        return
-
-                    bot.answer_callback_query(c.id)
-                    self._send_or_edit(
-                        c.message.chat.id,
-                        c.message.message_id,
-                        f"🗑 Удалить товар #{item_id}? (будет скрыт из списка)",
-                        self._kb_delete_confirm(outlet_id, item_id, sort),
-                    )
-                    return
-
-                if action == "delok":
-                    outlet_id = int(parts[2])
-                    item_id = int(parts[3])
-                    sort = (
-                        parts[4] if len(parts) >= 5 else self._get_sort(c.from_user.id)
-                    )
-
-                    if not can_access_outlet(db, u.id, outlet_id):
-                        bot.answer_callback_query(c.id, "Нет доступа")
-                        return
-
-                    item = db.scalar(
-                        select(Item).where(
-                            Item.id == item_id,
-                            Item.outlet_id == outlet_id,
-                            Item.is_active == True,
-                        )
-                    )
-                    if not item:
-                        bot.answer_callback_query(c.id, "Товар не найден")
-                        return
-
-                    item.is_active = False
-                    if hasattr(item, "updated_at"):
-                        item.updated_at = datetime.datetime.utcnow()
-                    db.commit()
-
-                    bot.answer_callback_query(c.id, "Удалено")
-                    return self._open_inventory(
-                        db, c.message.chat.id, c.message.message_id, u, outlet_id, sort
-                    )
+        self._cb_routes = self._callback_routes()
 
-                bot.answer_callback_query(c.id, "Неизвестное действие")
+        @bot.callback_query_handler(func=lambda c: True)
+        def on_callback(c):
+            self._route_callback(c)
 
         # ---------------------------
         # Text router (input steps)
@@ -812,7 +387,9 @@ class BotApp:
             if not mode:
                 return
 
-            with self.Session() as db:
+            with self._unit_of_work(
+                "text", mode, m.from_user.id, st.get("outlet_id")
+            ) as db:
                 u = get_or_create_user(db, m.from_user.id, m.from_user.full_name)
 
                 # create_group: plain text name
@@ -912,45 +489,44 @@ class BotApp:
                             )
                             return
 
+                    # дубль названия откатывает только savepoint: новый
+                    # пользователь и смена имени из этого же апдейта остаются
                     try:
-                        group_id = db.scalar(
-                            select(Outlet.group_id).where(Outlet.id == int(outlet_id))
-                        )
-                        item = Item(
-                            outlet_id=int(outlet_id),
-                            name=name,
-                            unit=unit,
-                            is_active=True,
-                        )
-                        # timestamps если есть
-                        if hasattr(item, "created_at"):
-                            item.created_at = datetime.datetime.utcnow()
-                        if hasattr(item, "updated_at"):
-                            item.updated_at = datetime.datetime.utcnow()
-
-                        db.add(item)
-                        db.flush()
-
-                        bal = self._get_balance(db, int(outlet_id), item.id)
-                        bal.quantity = qty
-                        log(
-                            db,
-                            u.id,
-                            AuditAction.ITEM_CREATED,
-                            "item",
-                            item.id,
-                            group_id=group_id,
-                            outlet_id=outlet_id,
-                            details=f"name={item.name};unit={item.unit};qty={qty}",
-                        )
-                        db.commit()
-
+                        with db.begin_nested():
+                            group_id = get_outlet_group_id(db, int(outlet_id))
+                            item = Item(
+                                outlet_id=int(outlet_id),
+                                name=name,
+                                unit=unit,
+                                is_active=True,
+                            )
+                            # timestamps если есть
+                            if hasattr(item, "created_at"):
+                                item.created_at = datetime.datetime.utcnow()
+                            if hasattr(item, "updated_at"):
+                                item.updated_at = datetime.datetime.utcnow()
+
+                            db.add(item)
+                            db.flush()
+
+                            bal = self._get_balance(db, int(outlet_id), item.id)
+                            bal.quantity = qty
+                            log(
+                                db,
+                                u.id,
+                                AuditAction.ITEM_CREATED,
+                                "item",
+                                item.id,
+                                group_id=group_id,
+                                outlet_id=outlet_id,
+                                details=f"name={item.name};unit={item.unit};qty={qty}",
+                            )
                     except IntegrityError:
-                        db.rollback()
                         bot.reply_to(
                             m, "⛔ Товар с таким названием уже есть в этой точке."
                         )
                         return
+                    db.commit()
 
                     self._clear_mode(m.from_user.id)
                     bot.reply_to(m, f"✅ Добавлено: {name} ({unit}), qty={qty}")
@@ -984,21 +560,13 @@ class BotApp:
                         bot.reply_to(m, "Введите число (например 12 или 3.5):")
                         return
 
-                    item = db.scalar(
-                        select(Item).where(
-                            Item.id == item_id,
-                            Item.outlet_id == outlet_id,
-                            Item.is_active == True,
-                        )
-                    )
+                    item = queries.active_item(db, outlet_id, item_id)
                     if not item:
                         self._clear_mode(m.from_user.id)
                         bot.reply_to(m, "Товар не найден.")
                         return
 
-                    group_id = db.scalar(
-                        select(Outlet.group_id).where(Outlet.id == outlet_id)
-                    )
+                    group_id = get_outlet_group_id(db, outlet_id)
                     bal = self._get_balance(db, outlet_id, item_id)
                     old = Decimal(str(bal.quantity))
                     bal.quantity = qty
@@ -1018,7 +586,9 @@ class BotApp:
 
                     self._clear_mode(m.from_user.id)
                     bot.reply_to(m, "✅ Количество обновлено.")
-                    self._open_item_card(db, m.chat.id, None, outlet_id, item_id, sort)
+                    self._open_item_card(
+                        db, m.chat.id, None, outlet_id, item_id, sort, item=item, bal=bal
+                    )
                     return
 
                 # rename_item
@@ -1036,33 +606,30 @@ class BotApp:
                         bot.reply_to(m, "⛔ Нет доступа.")
                         return
 
-                    item = db.scalar(
-                        select(Item).where(
-                            Item.id == item_id,
-                            Item.outlet_id == outlet_id,
-                            Item.is_active == True,
-                        )
-                    )
+                    item = queries.active_item(db, outlet_id, item_id)
                     if not item:
                         self._clear_mode(m.from_user.id)
                         bot.reply_to(m, "Товар не найден.")
                         return
 
+                    # как при добавлении: при дубле откатываем только savepoint
                     try:
-                        item.name = new_name
-                        if hasattr(item, "updated_at"):
-                            item.updated_at = datetime.datetime.utcnow()
-                        db.commit()
+                        with db.begin_nested():
+                            item.name = new_name
+                            if hasattr(item, "updated_at"):
+                                item.updated_at = datetime.datetime.utcnow()
                     except IntegrityError:
-                        db.rollback()
                         bot.reply_to(
                             m, "⛔ Товар с таким названием уже есть в этой точке."
                         )
                         return
+                    db.commit()
 
                     self._clear_mode(m.from_user.id)
                     bot.reply_to(m, "✅ Переименовано.")
-                    self._open_item_card(db, m.chat.id, None, outlet_id, item_id, sort)
+                    self._open_item_card(
+                        db, m.chat.id, None, outlet_id, item_id, sort, item=item
+                    )
                     return
 
                 # set_unit
@@ -1080,13 +647,7 @@ class BotApp:
                         bot.reply_to(m, "⛔ Нет доступа.")
                         return
 
-                    item = db.scalar(
-                        select(Item).where(
-                            Item.id == item_id,
-                            Item.outlet_id == outlet_id,
-                            Item.is_active == True,
-                        )
-                    )
+                    item = queries.active_item(db, outlet_id, item_id)
                     if not item:
                         self._clear_mode(m.from_user.id)
                         bot.reply_to(m, "Товар не найден.")
@@ -1099,13 +660,644 @@ class BotApp:
 
                     self._clear_mode(m.from_user.id)
                     bot.reply_to(m, "✅ Unit обновлён.")
-                    self._open_item_card(db, m.chat.id, None, outlet_id, item_id, sort)
+                    self._open_item_card(
+                        db, m.chat.id, None, outlet_id, item_id, sort, item=item
+                    )
+                    return
+
+                # export_range: "YYYY-MM-DD YYYY-MM-DD"
+                if mode == "export_range":
+                    outlet_id = int(st.get("outlet_id", 0))
+                    if not outlet_id or not can_access_outlet(db, u.id, outlet_id):
+                        self._clear_mode(m.from_user.id)
+                        bot.reply_to(m, "⛔ Нет доступа.")
+                        return
+
+                    dates = (m.text or "").split()
+                    try:
+                        if not 1 <= len(dates) <= 2:
+                            raise ValueError
+                        since = datetime.datetime.strptime(dates[0], "%Y-%m-%d")
+                        last = datetime.datetime.strptime(dates[-1], "%Y-%m-%d")
+                    except ValueError:
+                        bot.reply_to(
+                            m, "Формат: `ГГГГ-ММ-ДД ГГГГ-ММ-ДД`", parse_mode="Markdown"
+                        )
+                        return
+                    if last < since:
+                        since, last = last, since
+                    if self._refuse_exports():
+                        # режим оставляем: те же даты можно прислать ещё раз
+                        bot.reply_to(
+                            m,
+                            "⏳ Сейчас много запросов. "
+                            "Пришли даты ещё раз через минуту.",
+                        )
+                        return
+
+                    self._clear_mode(m.from_user.id)
+                    bot.reply_to(m, "Готовлю файл…")
+                    self._send_outlet_export(
+                        m.chat.id,
+                        outlet_id,
+                        since=since,
+                        until=last + datetime.timedelta(days=1),
+                    )
                     return
 
                 # неизвестный mode
                 self._clear_mode(m.from_user.id)
                 bot.reply_to(m, "Сбросил состояние. Открой меню: /start")
 
+    # ---------------------------
+    # Callback handlers
+    # ---------------------------
+    # c.data -> (действие, аргументы) через app/callbacks.py, дальше — по
+    # таблице. Хендлер: (c, db, u, *аргументы действия).
+    def _callback_routes(self) -> dict:
+        return {
+            "m:home": self._cb_home,
+            "g:list": self._cb_groups_list,
+            "g:create": self._cb_group_create,
+            "g:export": self._cb_group_export,
+            "g:select": self._cb_group_select,
+            "o:pick_group": self._cb_outlets_pick_group,
+            "o:select": self._cb_outlet_select,
+            "o:create": self._cb_outlet_create,
+            "i:pick_group": self._cb_inv_pick_group,
+            "i:open": self._cb_inv_open,
+            "i:sort": self._cb_inv_sort,
+            "i:setsort": self._cb_inv_setsort,
+            "i:add": self._cb_inv_add,
+            "i:item": self._cb_inv_item,
+            "i:qty": self._cb_inv_qty,
+            "i:setqty": self._cb_inv_setqty,
+            "i:rename": self._cb_inv_rename,
+            "i:unit": self._cb_inv_unit,
+            "i:del": self._cb_inv_del,
+            "i:delok": self._cb_inv_delok,
+            "i:export": self._cb_inv_export,
+            "i:exportcsv": self._cb_inv_export_csv,
+            "i:exportjsonl": self._cb_inv_export_jsonl,
+            "i:exportnew": self._cb_inv_export_new,
+            "i:exportrange": self._cb_inv_export_range,
+        }
+
+    def _route_callback(self, c):
+        decoded = cbdata.decode(c.data or "")
+        handler = self._cb_routes.get(decoded[0]) if decoded else None
+        if handler is None:
+            self.bot.answer_callback_query(c.id, "Неизвестное действие")
+            return
+        if decoded[0] in EXPORT_ACTIONS and self._refuse_exports():
+            self.bot.answer_callback_query(
+                c.id,
+                "⏳ Сейчас много запросов, экспорт недоступен. "
+                "Попробуй через минуту.",
+                show_alert=True,
+            )
+            return
+        with self._unit_of_work(
+            "callback",
+            decoded[0],
+            c.from_user.id,
+            cbdata.outlet_of(*decoded),
+        ) as db:
+            u = get_or_create_user(db, c.from_user.id, c.from_user.full_name)
+            handler(c, db, u, *decoded[1])
+
+    # MAIN
+    def _cb_home(self, c, db, u: User):
+        self._clear_mode(c.from_user.id)
+        self._render_main(c.message.chat.id, c.message.message_id, u)
+        self.bot.answer_callback_query(c.id)
+
+    # GROUPS
+    def _cb_groups_list(self, c, db, u: User):
+        groups = groups_svc.user_groups(db, u.id)
+        if not groups:
+            text = "У тебя пока нет групп.\nНажми «Создать группу»."
+        else:
+            text = "Твои группы:\n" + "\n".join(
+                [f"- 🏢 {g.name} (#{g.id})" for g in groups]
+            )
+
+        self._send_or_edit(
+            c.message.chat.id,
+            c.message.message_id,
+            text,
+            keyboards.groups_list(),
+        )
+        self._clear_mode(c.from_user.id)
+        self.bot.answer_callback_query(c.id)
+
+    def _cb_group_create(self, c, db, u: User):
+        self._set_mode(c.from_user.id, "create_group")
+        self.bot.answer_callback_query(c.id)
+        self.bot.send_message(
+            c.message.chat.id, "✍️ Введи название группы одним сообщением:"
+        )
+
+    def _cb_group_export(self, c, db, u: User, group_id: int):
+        # книга с листом на каждую точку
+        if not has_wide_access(db, u.id, group_id):
+            self.bot.answer_callback_query(c.id, "Нет доступа")
+            return
+
+        self.bot.answer_callback_query(c.id, "Готовлю файл…")
+        ts = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        filename = f"inventory_group_{group_id}_{ts}.xlsx"
+
+        with self._spool() as buf:
+            with metrics.export_seconds.time("group_xlsx"):
+                export_group_xlsx(
+                    self.ReadSession,
+                    group_id,
+                    buf,
+                    max_workers=self.export_workers,
+                )
+            buf.seek(0)
+            self.bot.send_document(c.message.chat.id, buf, visible_file_name=filename)
+
+    def _cb_group_select(self, c, db, u: User, group_id: int, back_cb: str | None):
+        # перенаправление: после выбора группы показать точки или инвентарь
+        if back_cb == "inventory":
+            # открыть точки чтобы выбрать точку для инвентаря
+            return self._pick_outlet_for_inventory(db, c, u, group_id)
+        # открываем точки по группе
+        return self._open_outlets_for_group(db, c, u, group_id)
+
+    # OUTLETS
+    def _cb_outlets_pick_group(self, c, db, u: User):
+        groups = groups_svc.user_groups(db, u.id)
+        if not groups:
+            self._send_or_edit(
+                c.message.chat.id,
+                c.message.message_id,
+                "У тебя нет групп. Сначала создай группу.",
+                keyboards.groups_list(),
+            )
+            self.bot.answer_callback_query(c.id)
+            return
+
+        self._send_or_edit(
+            c.message.chat.id,
+            c.message.message_id,
+            "Выбери группу для просмотра точек:",
+            keyboards.group_pick(groups, "outlets"),
+        )
+        self.bot.answer_callback_query(c.id)
+
+    def _cb_outlet_select(self, c, db, u: User, outlet_id: int, next_cb: str | None):
+        if not can_access_outlet(db, u.id, outlet_id):
+            self.bot.answer_callback_query(c.id, "Нет доступа к точке")
+            return
+
+        u.active_outlet_id = outlet_id
+        db.commit()
+
+        self.bot.answer_callback_query(c.id, "Активная точка выбрана")
+        if next_cb in (None, "inventory"):
+            # открыть инвентарь по этой точке
+            return self._open_inventory(
+                db,
+                c.message.chat.id,
+                c.message.message_id,
+                u,
+                outlet_id,
+                self._get_sort(c.from_user.id),
+            )
+        # просто вернемся в меню
+        self._render_main(c.message.chat.id, c.message.message_id, u)
+
+    def _cb_outlet_create(self, c, db, u: User, group_id: int):
+        # проверка прав: wide-owner/manager
+        if not has_wide_access(db, u.id, group_id):
+            self.bot.answer_callback_query(
+                c.id, "Нет прав создавать точки в этой группе"
+            )
+            return
+
+        self._set_mode(c.from_user.id, "create_outlet", group_id=group_id)
+        self.bot.answer_callback_query(c.id)
+        self.bot.send_message(
+            c.message.chat.id,
+            "✍️ Введи название точки одним сообщением (адрес можно потом):",
+        )
+
+    # INVENTORY
+    def _cb_inv_pick_group(self, c, db, u: User):
+        groups = groups_svc.user_groups(db, u.id)
+        if not groups:
+            self._send_or_edit(
+                c.message.chat.id,
+                c.message.message_id,
+                "У тебя нет групп. Сначала создай группу.",
+                keyboards.groups_list(),
+            )
+            self.bot.answer_callback_query(c.id)
+            return
+
+        self._send_or_edit(
+            c.message.chat.id,
+            c.message.message_id,
+            "Выбери группу, затем точку, чтобы открыть инвентарь:",
+            keyboards.group_pick(groups, "inventory"),
+        )
+        self.bot.answer_callback_query(c.id)
+
+    def _cb_inv_open(self, c, db, u: User, outlet_id: int, sort: str | None):
+        sort = sort or self._get_sort(c.from_user.id)
+        self._set_sort(c.from_user.id, sort)
+
+        if not can_access_outlet(db, u.id, outlet_id):
+            self.bot.answer_callback_query(c.id, "Нет доступа к точке")
+            return
+
+        u.active_outlet_id = outlet_id
+        db.commit()
+
+        self.bot.answer_callback_query(c.id)
+        return self._open_inventory(
+            db, c.message.chat.id, c.message.message_id, u, outlet_id, sort
+        )
+
+    def _cb_inv_sort(self, c, db, u: User, outlet_id: int):
+        sort = self._get_sort(c.from_user.id)
+        self.bot.answer_callback_query(c.id)
+        self._send_or_edit(
+            c.message.chat.id,
+            c.message.message_id,
+            "Выбери сортировку:",
+            keyboards.inventory_sort(outlet_id, sort),
+        )
+
+    def _cb_inv_setsort(self, c, db, u: User, outlet_id: int, sort: str | None):
+        sort = sort or SORT_ALPHA
+        self._set_sort(c.from_user.id, sort)
+        self.bot.answer_callback_query(c.id, "Сортировка сохранена")
+        return self._open_inventory(
+            db, c.message.chat.id, c.message.message_id, u, outlet_id, sort
+        )
+
+    def _cb_inv_add(self, c, db, u: User, outlet_id: int):
+        if not can_access_outlet(db, u.id, outlet_id):
+            self.bot.answer_callback_query(c.id, "Нет доступа")
+            return
+        self._set_mode(c.from_user.id, "add_item", outlet_id=outlet_id)
+        self.bot.answer_callback_query(c.id)
+        self.bot.send_message(
+            c.message.chat.id,
+            "➕ Добавление товара\n"
+            "Введи одной строкой:\n"
+            "`название | unit | qty`\n\n"
+            "Пример:\n"
+            "Молоко | l | 10\n"
+            "Сахар | kg | 3.5\n"
+            "Крышка | pcs | 100\n\n"
+            "qty можно пропустить (тогда 0).",
+            parse_mode="Markdown",
+        )
+
+    def _cb_inv_item(
+        self, c, db, u: User, outlet_id: int, item_id: int, sort: str | None
+    ):
+        sort = sort or self._get_sort(c.from_user.id)
+        if not can_access_outlet(db, u.id, outlet_id):
+            self.bot.answer_callback_query(c.id, "Нет доступа")
+            return
+
+        return self._open_item_card(
+            db,
+            c.message.chat.id,
+            c.message.message_id,
+            outlet_id,
+            item_id,
+            sort,
+            answer_cb=c.id,
+        )
+
+    def _cb_inv_qty(
+        self, c, db, u: User, outlet_id: int, item_id: int, delta: int, sort: str | None
+    ):
+        sort = sort or self._get_sort(c.from_user.id)
+        if not can_access_outlet(db, u.id, outlet_id):
+            self.bot.answer_callback_query(c.id, "Нет доступа")
+            return
+
+        group_id = get_outlet_group_id(db, outlet_id)
+
+        item = queries.active_item(db, outlet_id, item_id)
+        if not item:
+            self.bot.answer_callback_query(c.id, "Товар не найден")
+            return
+
+        bal = self._get_balance(db, outlet_id, item_id)
+        old = Decimal(str(bal.quantity))
+        new_qty = Decimal(str(bal.quantity)) + Decimal(delta)
+        if new_qty < 0:
+            new_qty = Decimal("0")
+        bal.quantity = new_qty
+        # updated_at если есть
+        if hasattr(item, "updated_at"):
+            item.updated_at = datetime.datetime.utcnow()
+        log(
+            db,
+            u.id,
+            AuditAction.QTY_DELTA,
+            "balance",
+            entity_id=item_id,
+            group_id=group_id,
+            outlet_id=outlet_id,
+            details=f"item_id={item_id};delta={delta};from={old};to={bal.quantity}",
+        )
+        db.commit()
+
+        self.bot.answer_callback_query(c.id, "Ок")
+        return self._open_item_card(
+            db,
+            c.message.chat.id,
+            c.message.message_id,
+            outlet_id,
+            item_id,
+            sort,
+            item=item,
+            bal=bal,
+        )
+
+    def _ask_item_input(
+        self,
+        c,
+        db,
+        u: User,
+        outlet_id: int,
+        item_id: int,
+        sort: str | None,
+        mode: str,
+        prompt: str,
+    ):
+        # общий шаг для setqty / rename / unit: запомнить режим и спросить текст
+        sort = sort or self._get_sort(c.from_user.id)
+        if not can_access_outlet(db, u.id, outlet_id):
+            self.bot.answer_callback_query(c.id, "Нет доступа")
+            return
+
+        self._set_mode(
+            c.from_user.id,
+            mode,
+            outlet_id=outlet_id,
+            item_id=item_id,
+            sort=sort,
+        )
+        self.bot.answer_callback_query(c.id)
+        self.bot.send_message(c.message.chat.id, prompt)
+
+    def _cb_inv_setqty(
+        self, c, db, u: User, outlet_id: int, item_id: int, sort: str | None
+    ):
+        self._ask_item_input(
+            c,
+            db,
+            u,
+            outlet_id,
+            item_id,
+            sort,
+            "set_qty",
+            "✍️ Введи новое количество числом (например 12 или 3.5):",
+        )
+
+    def _cb_inv_rename(
+        self, c, db, u: User, outlet_id: int, item_id: int, sort: str | None
+    ):
+        self._ask_item_input(
+            c,
+            db,
+            u,
+            outlet_id,
+            item_id,
+            sort,
+            "rename_item",
+            "✍️ Введи новое название товара:",
+        )
+
+    def _cb_inv_unit(
+        self, c, db, u: User, outlet_id: int, item_id: int, sort: str | None
+    ):
+        self._ask_item_input(
+            c,
+            db,
+            u,
+            outlet_id,
+            item_id,
+            sort,
+            "set_unit",
+            "✍️ Введи новый unit (например pcs / kg / l):",
+        )
+
+    def _cb_inv_del(
+        self, c, db, u: User, outlet_id: int, item_id: int, sort: str | None
+    ):
+        sort = sort or self._get_sort(c.from_user.id)
+        if not can_access_outlet(db, u.id, outlet_id):
+            self.bot.answer_callback_query(c.id, "Нет доступа")
+            return
+
+        self.bot.answer_callback_query(c.id)
+        self._send_or_edit(
+            c.message.chat.id,
+            c.message.message_id,
+            f"🗑 Удалить товар #{item_id}? (будет скрыт из списка)",
+            keyboards.delete_confirm(outlet_id, item_id, sort),
+        )
+
+    def _cb_inv_delok(
+        self, c, db, u: User, outlet_id: int, item_id: int, sort: str | None
+    ):
+        sort = sort or self._get_sort(c.from_user.id)
+        if not can_access_outlet(db, u.id, outlet_id):
+            self.bot.answer_callback_query(c.id, "Нет доступа")
+            return
+
+        item = queries.active_item(db, outlet_id, item_id)
+        if not item:
+            self.bot.answer_callback_query(c.id, "Товар не найден")
+            return
+
+        item.is_active = False
+        if hasattr(item, "updated_at"):
+            item.updated_at = datetime.datetime.utcnow()
+        db.commit()
+
+        self.bot.answer_callback_query(c.id, "Удалено")
+        return self._open_inventory(
+            db, c.message.chat.id, c.message.message_id, u, outlet_id, sort
+        )
+
+    # INVENTORY exports
+    def _cb_inv_export(self, c, db, u: User, outlet_id: int):
+        if not can_access_outlet(db, u.id, outlet_id):
+            self.bot.answer_callback_query(c.id, "Нет доступа")
+            return
+
+        now = datetime.datetime.utcnow()
+
+        # если с прошлого экспорта ничего не менялось —
+        # переотправляем уже загруженный файл по file_id; сверяем с основной
+        # базой, так что файл с отстающей реплики не подойдёт и соберётся снова
+        cache_key = ("outlet", outlet_id)
+        cached = self.export_cache.get(cache_key, export_watermark(db, outlet_id))
+        sent = None
+        if cached:
+            self.bot.answer_callback_query(c.id, "Отправляю файл…")
+            try:
+                sent = self.bot.send_document(c.message.chat.id, cached.file_id)
+            except ApiTelegramException:
+                # file_id протух — соберём файл заново
+                self.export_cache.drop(cache_key)
+        else:
+            self.bot.answer_callback_query(c.id, "Готовлю файл…")
+
+        if sent is None:
+            sent, size, filename, watermark = self._send_outlet_export(
+                c.message.chat.id, outlet_id
+            )
+            if sent and sent.document:
+                self.export_cache.put(
+                    cache_key,
+                    watermark,
+                    sent.document.file_id,
+                    filename,
+                    size,
+                )
+
+        # полный экспорт тоже сдвигает «изменения с прошлого экспорта»
+        exports_svc.set_watermark(db, u.id, outlet_id, now)
+        db.commit()
+
+    def _cb_inv_export_csv(self, c, db, u: User, outlet_id: int):
+        # две таблицы — два файла
+        ts = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        gz = ".gz" if self.export_gzip else ""
+        jobs = [
+            (
+                f"{table}_outlet_{outlet_id}_{ts}.csv{gz}",
+                lambda t=table: self._export(
+                    export_outlet_csv, outlet_id, t, **self._stream_opts()
+                ),
+            )
+            for table in (TABLE_INVENTORY, TABLE_AUDIT)
+        ]
+        self._send_stream_exports(c, db, u, outlet_id, jobs)
+
+    def _cb_inv_export_jsonl(self, c, db, u: User, outlet_id: int):
+        ts = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        gz = ".gz" if self.export_gzip else ""
+        jobs = [
+            (
+                f"outlet_{outlet_id}_{ts}.jsonl{gz}",
+                lambda: self._export(
+                    export_outlet_jsonl, outlet_id, **self._stream_opts()
+                ),
+            )
+        ]
+        self._send_stream_exports(c, db, u, outlet_id, jobs)
+
+    def _cb_inv_export_new(self, c, db, u: User, outlet_id: int):
+        # только то, что изменилось с прошлого раза
+        if not can_access_outlet(db, u.id, outlet_id):
+            self.bot.answer_callback_query(c.id, "Нет доступа")
+            return
+
+        now = datetime.datetime.utcnow()
+        since = exports_svc.get_watermark(db, u.id, outlet_id)
+        self.bot.answer_callback_query(
+            c.id,
+            "Готовлю файл…" if since else "Первый экспорт — выгружаю всё",
+        )
+        self._send_outlet_export(c.message.chat.id, outlet_id, since=since, until=now)
+        exports_svc.set_watermark(db, u.id, outlet_id, now)
+        db.commit()
+
+    def _cb_inv_export_range(self, c, db, u: User, outlet_id: int):
+        # даты вводятся текстом
+        if not can_access_outlet(db, u.id, outlet_id):
+            self.bot.answer_callback_query(c.id, "Нет доступа")
+            return
+        self._set_mode(c.from_user.id, "export_range", outlet_id=outlet_id)
+        self.bot.answer_callback_query(c.id)
+        self.bot.send_message(
+            c.message.chat.id,
+            "📅 Введи период одной строкой: `ГГГГ-ММ-ДД ГГГГ-ММ-ДД`\n"
+            "Пример: 2026-01-01 2026-01-31 (обе даты включительно).\n"
+            "Одна дата — выгрузка за один день.",
+            parse_mode="Markdown",
+        )
+
+    # ---------------------------
+    # Export helpers
+    # ---------------------------
+    def _send_outlet_export(
+        self,
+        chat_id: int,
+        outlet_id: int,
+        since: datetime.datetime | None = None,
+        until: datetime.datetime | None = None,
+    ):
+        # -> (отправленное сообщение, размер файла, имя файла, watermark
+        # полного экспорта или None)
+        ts = datetime.datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+        if since is None and until is None:
+            filename = f"inventory_outlet_{outlet_id}_{ts}.xlsx"
+        else:
+            frm = since.strftime("%Y%m%d_%H%M%S") if since else "start"
+            filename = f"changes_outlet_{outlet_id}_{frm}_{ts}.xlsx"
+
+        # файл собирается в памяти (большой — во временном файле) и
+        # удаляется сразу после загрузки, на диске ничего не копится
+        with self._spool() as buf:
+            with self._export_session("outlet_xlsx") as edb:
+                # watermark — в той же сессии, что и файл, и до его строк:
+                # на отстающей реплике файл не окажется старше watermark, под
+                # которым его закешируют
+                watermark = None
+                if since is None and until is None:
+                    watermark = export_watermark(edb, outlet_id)
+                export_outlet_xlsx(edb, outlet_id, buf, since=since, until=until)
+            size = buf.tell()
+            buf.seek(0)
+            sent = self.bot.send_document(chat_id, buf, visible_file_name=filename)
+        return sent, size, filename, watermark
+
+    def _stream_opts(self) -> dict:
+        return dict(compress=self.export_gzip, spool_max_bytes=self.export_spool_bytes)
+
+    def _send_stream_exports(self, c, db, u: User, outlet_id: int, jobs):
+        # jobs: [(имя файла, build() -> буфер)]
+        if not can_access_outlet(db, u.id, outlet_id):
+            self.bot.answer_callback_query(c.id, "Нет доступа")
+            return
+
+        self.bot.answer_callback_query(c.id, "Готовлю файл…")
+        for filename, build in jobs:
+            # буфер закрывается сразу после отправки
+            with build() as buf:
+                self.bot.send_document(
+                    c.message.chat.id, buf, visible_file_name=filename
+                )
+
+    def _export(self, fn, *args, **kwargs):
+        # fn(db, *args, **kwargs) на отдельной сессии ReadSession
+        with self._export_session(fn.__name__.removeprefix("export_")) as edb:
+            return fn(edb, *args, **kwargs)
+
+    @contextmanager
+    def _export_session(self, kind: str):
+        with self.ReadSession() as edb, metrics.export_seconds.time(kind):
+            yield edb
+
+    def _spool(self):
+        return SpooledTemporaryFile(max_size=self.export_spool_bytes, mode="w+b")
+
     # ---------------------------
     # Navigation helpers for group->outlet flows
     # ---------------------------
@@ -1127,7 +1319,7 @@ class BotApp:
             c.message.chat.id,
             c.message.message_id,
             text,
-            self._kb_outlets_list(group_id, can_create),
+            keyboards.outlets_list(group_id, can_create),
         )
         self.bot.answer_callback_query(c.id)
 
@@ -1140,11 +1332,7 @@ class BotApp:
                 c.message.chat.id,
                 c.message.message_id,
                 f"В группе #{group_id} пока нет точек.",
-                types.InlineKeyboardMarkup().row(
-                    types.InlineKeyboardButton(
-                        "⬅️ Назад (группы)", callback_data=f"{CB_INV}:pick_group"
-                    )
-                ),
+                keyboards.no_outlets(),
             )
             self.bot.answer_callback_query(c.id)
             return
@@ -1153,7 +1341,7 @@ class BotApp:
             c.message.chat.id,
             c.message.message_id,
             "Выбери точку:",
-            self._kb_outlet_pick(group_id, outs, "inventory"),
+            keyboards.outlet_pick(outs, "inventory"),
         )
         self.bot.answer_callback_query(c.id)
 
@@ -1167,9 +1355,12 @@ class BotApp:
         sort: str,
     ):
         # build list with inline “open item card” buttons
-        items = self._list_items_with_qty(db, outlet_id, sort)
+        with self._read_db(db) as rdb:
+            items = self._list_items_with_qty(rdb, outlet_id, sort)
 
-        text_lines = [f"📦 Инвентарь точки #{outlet_id}", f"Сортировка: {sort}", ""]
+        meta = outlet_cache.get(db, outlet_id)
+        title = f"«{meta.name}» (#{outlet_id})" if meta else f"#{outlet_id}"
+        text_lines = [f"📦 Инвентарь точки {title}", f"Сортировка: {sort}", ""]
         if not items:
             text_lines.append("Пока нет товаров. Нажми «Добавить товар».")
         else:
@@ -1180,19 +1371,7 @@ class BotApp:
                 text_lines.append(f"\n…и ещё {len(items)-15}")
 
         # Клавиатура: список товаров как кнопки (первые 10), плюс управление
-        kb = types.InlineKeyboardMarkup()
-        for it, qty in items[:10]:
-            kb.row(
-                types.InlineKeyboardButton(
-                    f"{it.name} ({qty:g} {it.unit})",
-                    callback_data=f"{CB_INV}:item:{outlet_id}:{it.id}:{sort}",
-                )
-            )
-        # control row(s)
-        kb2 = self._kb_inventory(outlet_id, sort)
-        # merge kb2 into kb (telebot позволяет просто добавлять rows)
-        for row in kb2.keyboard:
-            kb.keyboard.append(row)
+        kb = keyboards.inventory_with_items(outlet_id, sort, items[:10])
 
         self._send_or_edit(chat_id, message_id, "\n".join(text_lines), kb)
 
@@ -1205,12 +1384,13 @@ class BotApp:
         item_id: int,
         sort: str,
         answer_cb: str | None = None,
+        item: Item | None = None,
+        bal: StockBalance | None = None,
     ):
-        item = db.scalar(
-            select(Item).where(
-                Item.id == item_id, Item.outlet_id == outlet_id, Item.is_active == True
-            )
-        )
+        # item/bal — если вызывающий уже загрузил их в этом апдейте
+        # (после commit они не протухают, см. make_session_factory)
+        if item is None:
+            item = queries.active_item(db, outlet_id, item_id)
         if not item:
             if answer_cb:
                 self.bot.answer_callback_query(answer_cb, "Товар не найден")
@@ -1219,7 +1399,8 @@ class BotApp:
             )
             return
 
-        bal = self._get_balance(db, outlet_id, item_id)
+        if bal is None:
+            bal = self._get_balance(db, outlet_id, item_id)
         try:
             qty = float(bal.quantity)
         except Exception:
@@ -1236,5 +1417,5 @@ class BotApp:
             self.bot.answer_callback_query(answer_cb)
 
         self._send_or_edit(
-            chat_id, message_id, text, self._kb_item_card(outlet_id, item_id, sort)
+            chat_id, message_id, text, keyboards.item_card(outlet_id, item_id, sort)
         )
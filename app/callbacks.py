@@ -0,0 +1,175 @@
+import base64
+from dataclasses import dataclass
+
+# callback_data кнопок.
+# Новый формат — компактный бинарный, в base64url с маркером "~":
+#   [версия][код действия][аргументы...]
+# int — zigzag varint, перечисления (сортировка, куда вернуться) — один байт.
+# "i:qty:<outlet>:<item>:<delta>:<sort>" занимает ~15 байт вместо 30+ и не
+# упирается в лимит Telegram в 64 байта при росте id.
+# Старые строки ("i:qty:1:2:-1:alpha") с уже отправленных кнопок тоже
+# разбираются — пока такие сообщения живы в чатах.
+#
+# Коды действий не переиспользуются: кнопки в старых сообщениях должны
+# открывать то же самое. Поменялся формат аргументов — новый код или VERSION.
+
+MARKER = "~"
+VERSION = 1
+MAX_LEN = 64  # лимит Telegram на callback_data
+
+# ключи сортировки инвентаря
+SORT_ALPHA = "alpha"
+SORT_CREATED = "created"
+SORT_UPDATED = "updated"
+
+INT = "int"
+SORT = "sort"
+TARGET = "target"
+
+# 0 — «не задано», значения с 1
+ENUMS = {
+    SORT: (SORT_ALPHA, SORT_CREATED, SORT_UPDATED),
+    TARGET: ("outlets", "inventory"),
+}
+
+
+@dataclass(frozen=True)
+class Action:
+    name: str  # "i:qty" — он же ключ роутера и метка в логах/метриках
+    code: int
+    fields: tuple[str, ...] = ()
+
+
+ACTIONS = (
+    Action("m:home", 1),
+    Action("g:list", 10),
+    Action("g:create", 11),
+    Action("g:export", 12, (INT,)),
+    Action("g:select", 13, (INT, TARGET)),
+    Action("o:pick_group", 20),
+    Action("o:select", 21, (INT, TARGET)),
+    Action("o:create", 22, (INT,)),
+    Action("i:pick_group", 30),
+    Action("i:open", 31, (INT, SORT)),
+    Action("i:sort", 32, (INT,)),
+    Action("i:setsort", 33, (INT, SORT)),
+    Action("i:add", 34, (INT,)),
+    Action("i:item", 35, (INT, INT, SORT)),
+    Action("i:qty", 36, (INT, INT, INT, SORT)),
+    Action("i:setqty", 37, (INT, INT, SORT)),
+    Action("i:rename", 38, (INT, INT, SORT)),
+    Action("i:unit", 39, (INT, INT, SORT)),
+    Action("i:del", 40, (INT, INT, SORT)),
+    Action("i:delok", 41, (INT, INT, SORT)),
+    Action("i:export", 50, (INT,)),
+    Action("i:exportcsv", 51, (INT,)),
+    Action("i:exportjsonl", 52, (INT,)),
+    Action("i:exportnew", 53, (INT,)),
+    Action("i:exportrange", 54, (INT,)),
+)
+
+BY_NAME = {a.name: a for a in ACTIONS}
+BY_CODE = {a.code: a for a in ACTIONS}
+
+
+def outlet_of(name: str, args: tuple) -> int | None:
+    # id точки, если действие про точку: у "i:*" и "o:select" он первый
+    if args and (name.startswith("i:") or name == "o:select"):
+        return args[0]
+    return None
+
+
+def encode(name: str, *args) -> str:
+    # недостающие хвостовые аргументы — None
+    action = BY_NAME[name]
+    if len(args) > len(action.fields):
+        raise ValueError(f"{name}: too many arguments")
+    out = bytearray((VERSION, action.code))
+    args = args + (None,) * (len(action.fields) - len(args))
+    for kind, value in zip(action.fields, args):
+        if kind == INT:
+            _put_varint(out, _zigzag(int(value)))
+        else:
+            out.append(0 if value is None else ENUMS[kind].index(value) + 1)
+    data = MARKER + base64.urlsafe_b64encode(bytes(out)).rstrip(b"=").decode()
+    if len(data) > MAX_LEN:
+        raise ValueError(f"{name}: callback_data too long ({len(data)})")
+    return data
+
+
+def decode(data: str) -> tuple[str, tuple] | None:
+    # -> (имя действия, аргументы) или None, если кнопка не наша / битая
+    try:
+        if data.startswith(MARKER):
+            return _decode_binary(data[1:])
+        return _decode_legacy(data)
+    except (ValueError, IndexError, KeyError):
+        return None
+
+
+def _decode_binary(s: str) -> tuple[str, tuple] | None:
+    raw = base64.urlsafe_b64decode(s + "=" * (-len(s) % 4))
+    if len(raw) < 2 or raw[0] != VERSION:
+        return None
+    action = BY_CODE[raw[1]]
+    pos = 2
+    args = []
+    for kind in action.fields:
+        if kind == INT:
+            value, pos = _get_varint(raw, pos)
+            args.append(_unzigzag(value))
+        else:
+            n = raw[pos]
+            pos += 1
+            args.append(None if n == 0 else ENUMS[kind][n - 1])
+    if pos != len(raw):
+        return None
+    return action.name, tuple(args)
+
+
+def _decode_legacy(data: str) -> tuple[str, tuple] | None:
+    # "i:qty:<outlet>:<item>:<delta>[:<sort>]"
+    parts = data.split(":")
+    action = BY_NAME.get(":".join(parts[:2]))
+    if action is None or len(parts) - 2 > len(action.fields):
+        return None
+    args = []
+    for i, kind in enumerate(action.fields):
+        raw = parts[i + 2] if i + 2 < len(parts) else None
+        if raw is None:
+            if kind == INT:
+                return None
+            args.append(None)
+        elif kind == INT:
+            args.append(int(raw))
+        elif raw not in ENUMS[kind]:
+            return None
+        else:
+            args.append(raw)
+    return action.name, tuple(args)
+
+
+def _zigzag(n: int) -> int:
+    return n * 2 if n >= 0 else -n * 2 - 1
+
+
+def _unzigzag(n: int) -> int:
+    return n >> 1 if not n & 1 else -((n + 1) >> 1)
+
+
+def _put_varint(out: bytearray, n: int):
+    while n >= 0x80:
+        out.append((n & 0x7F) | 0x80)
+        n >>= 7
+    out.append(n)
+
+
+def _get_varint(raw: bytes, pos: int) -> tuple[int, int]:
+    n = shift = 0
+    while True:
+        b = raw[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if not b & 0x80:
+            return n, pos
+        shift += 7
@@ -1,12 +1,136 @@
 import os
+import re
+import secrets
 from dataclasses import dataclass
 
+# что Telegram принимает в secret_token у setWebhook
+_WEBHOOK_SECRET = re.compile(r"[A-Za-z0-9_-]{1,256}")
+
 
 @dataclass(frozen=True)
 class Config:
     bot_token: str
     db_url: str
 
+    # профиль движка БД ("default" / "production", см. app/db.py), отдельная
+    # база для чтения списков и выгрузок (пусто — отдельный пул к db_url,
+    # только если профиль production), пул PostgreSQL и таймаут запроса (сек)
+    db_profile: str = "default"
+    db_read_url: str | None = None
+    db_pool_size: int = 10
+    db_max_overflow: int = 20
+    db_statement_timeout: float = 30.0
+
+    # как получаем апдейты: "polling" или "webhook"
+    mode: str = "polling"
+    webhook_host: str = "0.0.0.0"
+    webhook_port: int = 8080
+    webhook_path: str = "/webhook"
+    webhook_url: str | None = None  # публичный URL для setWebhook; пусто — не регистрируем
+    webhook_secret: str | None = None
+
+    # Prometheus /metrics; порт 0 — выключено
+    metrics_host: str = "127.0.0.1"
+    metrics_port: int = 0
+
+    # процессов-воркеров (0 — всё в одном процессе); апдейты раскладываются
+    # по ним по chat id, см. app/sharding.py
+    shards: int = 0
+
+    # обработка апдейтов: воркеры (0 — встроенный пул telebot) и глубина очереди
+    workers: int = 8
+    queue_size: int = 1000
+
+    # очередь полна: "block" — ждём, "shed" — сбрасываем нажатия кнопок
+    # с ответом «повтори»; нажатия старше stale_callback_age (сек) сбрасываем
+    # всегда (0 — не сбрасывать); при загрузке очереди выше export_refuse_load
+    # (доля queue_size) новые экспорты не берём; drain_timeout — сколько
+    # дорабатывать очередь при остановке
+    overflow: str = "block"
+    stale_callback_age: float = 10.0
+    export_refuse_load: float = 0.8
+    drain_timeout: float = 30.0
+
+    # исходящие запросы к Telegram: лимиты (запросов/сек) и число отправителей
+    tg_global_rate: float = 30.0
+    tg_chat_rate: float = 1.0
+    tg_group_rate: float = 20 / 60
+    tg_senders: int = 8
+
+    # состояние диалогов: "memory", "sql" или "redis://host:port/db";
+    # сколько пользователей держим в памяти, TTL (сек) и период записи (сек)
+    state_store: str = "memory"
+    state_max_users: int = 100_000
+    state_ttl: int = 24 * 3600
+    state_flush_interval: float = 1.0
+
+    # сколько последних сообщений помним для пропуска edit без изменений
+    render_cache_size: int = 50_000
+
+    # кеш метаданных точек (группа, название, активность): размер и TTL (сек);
+    # TTL важен только при нескольких процессах — в своём сброс явный
+    outlet_cache_size: int = 10_000
+    outlet_cache_ttl: float = 60.0
+
+    # предупреждение в лог, если апдейт сделал больше запросов, провёл в базе
+    # больше времени (сек) или повторил один запрос больше раз; 0 — выключено
+    sql_warn_queries: int = 30
+    sql_warn_time: float = 0.5
+    sql_warn_repeats: int = 5
+
+    # профилирование апдейтов (app/profiling.py): доля под cProfile, порог
+    # (сек) для снимков стека медленных, период снимков, куда и сколько хранить
+    profile_sample_rate: float = 0.0
+    profile_slow_after: float = 0.0
+    profile_interval: float = 0.005
+    profile_dir: str = "profiles"
+    profile_keep: int = 200
+
+    # кеш экспортов: повторно отправляем file_id, пока точка не менялась
+    export_cache_ttl: int = 24 * 3600
+    export_cache_max_entries: int = 512
+    export_cache_max_bytes: int = 256 * 1024 * 1024
+
+    # сколько точек выгружаем параллельно при экспорте группы
+    export_workers: int = 8
+
+    # CSV/JSONL: gzip и порог, после которого буфер уходит с памяти на диск
+    export_gzip: bool = True
+    export_spool_bytes: int = 8 * 1024 * 1024
+
+    # уборка каталога экспортов: возраст (сек), квота (байт), период (сек)
+    export_dir: str = "tmp_exports"
+    export_dir_max_age: int = 24 * 3600
+    export_dir_max_bytes: int = 512 * 1024 * 1024
+    export_janitor_interval: int = 600
+
+
+def _env_int(name: str, default: int) -> int:
+    raw = os.getenv(name)
+    if raw is None or raw.strip() == "":
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        raise RuntimeError(f"{name} must be an integer, got {raw!r}")
+
+
+def _env_float(name: str, default: float) -> float:
+    raw = os.getenv(name)
+    if raw is None or raw.strip() == "":
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        raise RuntimeError(f"{name} must be a number, got {raw!r}")
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None or raw.strip() == "":
+        return default
+    return raw.strip().lower() in ("1", "true", "yes", "on")
+
 
 def load_config() -> Config:
     token = os.getenv("BOT_TOKEN")
@@ -14,4 +138,108 @@ def load_config() -> Config:
         raise RuntimeError("BOT_TOKEN env var is required")
 
     db_url = os.getenv("DB_URL", "sqlite:///./bot.db")
-    return Config(bot_token=token, db_url=db_url)
+
+    db_profile = os.getenv("DB_PROFILE", Config.db_profile).strip().lower()
+    if db_profile not in ("default", "production"):
+        raise RuntimeError(
+            f"DB_PROFILE must be default or production, got {db_profile!r}"
+        )
+
+    mode = os.getenv("BOT_MODE", Config.mode).strip().lower()
+    if mode not in ("polling", "webhook"):
+        raise RuntimeError(f"BOT_MODE must be polling or webhook, got {mode!r}")
+    webhook_url = os.getenv("WEBHOOK_URL") or None
+    webhook_secret = os.getenv("WEBHOOK_SECRET") or None
+    if mode == "webhook" and webhook_secret is None:
+        if webhook_url is None:
+            # webhook регистрируют снаружи — без секрета любой, кто знает
+            # адрес, может прислать поддельный апдейт
+            raise RuntimeError(
+                "BOT_MODE=webhook requires WEBHOOK_SECRET or WEBHOOK_URL"
+            )
+        # регистрируем сами — секрет на один запуск, уходит в setWebhook
+        webhook_secret = secrets.token_urlsafe(32)
+    if webhook_secret is not None and not _WEBHOOK_SECRET.fullmatch(webhook_secret):
+        raise RuntimeError(
+            "WEBHOOK_SECRET must be 1-256 characters A-Z, a-z, 0-9, _ or -"
+        )
+    overflow = os.getenv("BOT_OVERFLOW", Config.overflow).strip().lower()
+    if overflow not in ("block", "shed"):
+        raise RuntimeError(f"BOT_OVERFLOW must be block or shed, got {overflow!r}")
+    state_store = os.getenv("STATE_STORE", Config.state_store).strip()
+    if state_store not in ("memory", "sql") and not state_store.startswith("redis://"):
+        raise RuntimeError(
+            f"STATE_STORE must be memory, sql or redis://..., got {state_store!r}"
+        )
+    profile_sample_rate = _env_float("PROFILE_SAMPLE_RATE", Config.profile_sample_rate)
+    if not 0 <= profile_sample_rate <= 1:
+        raise RuntimeError(
+            f"PROFILE_SAMPLE_RATE must be between 0 and 1, got {profile_sample_rate!r}"
+        )
+    return Config(
+        bot_token=token,
+        db_url=db_url,
+        db_profile=db_profile,
+        db_read_url=os.getenv("DB_READ_URL") or None,
+        db_pool_size=_env_int("DB_POOL_SIZE", Config.db_pool_size),
+        db_max_overflow=_env_int("DB_MAX_OVERFLOW", Config.db_max_overflow),
+        db_statement_timeout=_env_float(
+            "DB_STATEMENT_TIMEOUT", Config.db_statement_timeout
+        ),
+        mode=mode,
+        webhook_host=os.getenv("WEBHOOK_HOST", Config.webhook_host),
+        webhook_port=_env_int("WEBHOOK_PORT", Config.webhook_port),
+        webhook_path=os.getenv("WEBHOOK_PATH", Config.webhook_path),
+        webhook_url=webhook_url,
+        webhook_secret=webhook_secret,
+        metrics_host=os.getenv("METRICS_HOST", Config.metrics_host),
+        metrics_port=_env_int("METRICS_PORT", Config.metrics_port),
+        shards=_env_int("BOT_SHARDS", Config.shards),
+        workers=_env_int("BOT_WORKERS", Config.workers),
+        queue_size=_env_int("BOT_QUEUE_SIZE", Config.queue_size),
+        overflow=overflow,
+        stale_callback_age=_env_float(
+            "BOT_STALE_CALLBACK_AGE", Config.stale_callback_age
+        ),
+        export_refuse_load=_env_float("EXPORT_REFUSE_LOAD", Config.export_refuse_load),
+        drain_timeout=_env_float("BOT_DRAIN_TIMEOUT", Config.drain_timeout),
+        tg_global_rate=_env_float("TG_GLOBAL_RATE", Config.tg_global_rate),
+        tg_chat_rate=_env_float("TG_CHAT_RATE", Config.tg_chat_rate),
+        tg_group_rate=_env_float("TG_GROUP_RATE", Config.tg_group_rate),
+        tg_senders=_env_int("TG_SENDERS", Config.tg_senders),
+        state_store=state_store,
+        state_max_users=_env_int("STATE_MAX_USERS", Config.state_max_users),
+        state_ttl=_env_int("STATE_TTL", Config.state_ttl),
+        state_flush_interval=_env_float(
+            "STATE_FLUSH_INTERVAL", Config.state_flush_interval
+        ),
+        render_cache_size=_env_int("RENDER_CACHE_SIZE", Config.render_cache_size),
+        outlet_cache_size=_env_int("OUTLET_CACHE_SIZE", Config.outlet_cache_size),
+        outlet_cache_ttl=_env_float("OUTLET_CACHE_TTL", Config.outlet_cache_ttl),
+        sql_warn_queries=_env_int("SQL_WARN_QUERIES", Config.sql_warn_queries),
+        sql_warn_time=_env_float("SQL_WARN_TIME", Config.sql_warn_time),
+        sql_warn_repeats=_env_int("SQL_WARN_REPEATS", Config.sql_warn_repeats),
+        profile_sample_rate=profile_sample_rate,
+        profile_slow_after=_env_float("PROFILE_SLOW_AFTER", Config.profile_slow_after),
+        profile_interval=_env_float("PROFILE_INTERVAL", Config.profile_interval),
+        profile_dir=os.getenv("PROFILE_DIR", Config.profile_dir),
+        profile_keep=_env_int("PROFILE_KEEP", Config.profile_keep),
+        export_cache_ttl=_env_int("EXPORT_CACHE_TTL", Config.export_cache_ttl),
+        export_cache_max_entries=_env_int(
+            "EXPORT_CACHE_MAX_ENTRIES", Config.export_cache_max_entries
+        ),
+        export_cache_max_bytes=_env_int(
+            "EXPORT_CACHE_MAX_BYTES", Config.export_cache_max_bytes
+        ),
+        export_workers=_env_int("EXPORT_WORKERS", Config.export_workers),
+        export_gzip=_env_bool("EXPORT_GZIP", Config.export_gzip),
+        export_spool_bytes=_env_int("EXPORT_SPOOL_BYTES", Config.export_spool_bytes),
+        export_dir=os.getenv("EXPORT_DIR", Config.export_dir),
+        export_dir_max_age=_env_int("EXPORT_DIR_MAX_AGE", Config.export_dir_max_age),
+        export_dir_max_bytes=_env_int(
+            "EXPORT_DIR_MAX_BYTES", Config.export_dir_max_bytes
+        ),
+        export_janitor_interval=_env_int(
+            "EXPORT_JANITOR_INTERVAL", Config.export_janitor_interval
+        ),
+    )
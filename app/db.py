@@ -1,15 +1,163 @@
-from sqlalchemy import create_engine
+from collections import Counter
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
 
+from . import sqlstats
+
 
 class Base(DeclarativeBase):
     pass
 
 
-def make_engine(db_url: str):
-    connect_args = {"check_same_thread": False} if db_url.startswith("sqlite") else {}
-    return create_engine(db_url, echo=False, future=True, connect_args=connect_args)
+# Профили движка (DB_PROFILE):
+#   "default"    — как есть, настройки драйвера по умолчанию;
+#   "production" — SQLite: WAL (читатели не ждут писателя), synchronous=NORMAL
+#                  (fsync на checkpoint, а не на каждый commit), busy_timeout
+#                  вместо мгновенного "database is locked", mmap и кеш страниц;
+#                  PostgreSQL: размер пула, pre-ping, recycle, statement_timeout.
+# read_only — движок для списков и выгрузок (DB_READ_URL): в SQLite
+# query_only, в PostgreSQL default_transaction_read_only (реплика или тот же
+# сервер).
+PROFILES = ("default", "production")
+
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "busy_timeout": 5000,  # мс
+    "mmap_size": 256 * 1024 * 1024,
+    "cache_size": -64 * 1024,  # отрицательное — в КиБ: 64 МиБ
+    "temp_store": "MEMORY",
+}
+
+
+# выполнения по результату поиска в кеше компиляции SQLAlchemy
+# (CACHE_HIT, CACHE_MISS, ...), по всем движкам процесса. Промахи после
+# прогрева — кеш мал или форм запросов слишком много; выигрыш lambda_stmt
+# (сборка и ключ запроса) эта доля не показывает
+compiled_cache_stats: Counter = Counter()
+
+
+def compiled_cache_hit_rate() -> float | None:
+    hits = compiled_cache_stats["CACHE_HIT"]
+    total = hits + compiled_cache_stats["CACHE_MISS"]
+    return hits / total if total else None
+
+
+def _count_compiled_cache(conn, cursor, statement, params, context, executemany):
+    if context is not None:
+        compiled_cache_stats[context.cache_hit.name] += 1
+
+
+def _instrument(engine):
+    # кеш компиляции и SQL на апдейт (app/sqlstats.py)
+    event.listen(engine, "before_cursor_execute", sqlstats.before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", sqlstats.after_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _count_compiled_cache)
+
+
+def make_engine(
+    db_url: str,
+    profile: str = "default",
+    read_only: bool = False,
+    pool_size: int = 10,
+    max_overflow: int = 20,
+    statement_timeout: float = 30.0,
+):
+    backend = make_url(db_url).get_backend_name()
+    kwargs = {}
+    connect_args = {}
+    if backend == "sqlite":
+        connect_args["check_same_thread"] = False
+    elif backend == "postgresql" and profile == "production":
+        kwargs.update(_pg_pool_kwargs(pool_size, max_overflow))
+        connect_args["options"] = " ".join(
+            f"-c {k}={v}" for k, v in _pg_settings(statement_timeout, read_only).items()
+        )
+    engine = create_engine(
+        db_url, echo=False, future=True, connect_args=connect_args, **kwargs
+    )
+    _instrument(engine)
+    if backend == "sqlite":
+        _install_sqlite_pragmas(engine, profile, read_only)
+    return engine
+
+
+def engine_from_config(cfg):
+    return _engine_from_config(cfg, cfg.db_url, read_only=False)
+
+
+def read_engine_from_config(cfg):
+    # -> движок для чтения или None (тогда читаем через основной).
+    # Без DB_READ_URL в production — отдельный пул к той же базе: выгрузки
+    # не занимают соединения, нужные записи
+    if cfg.db_read_url:
+        return _engine_from_config(cfg, cfg.db_read_url, read_only=True)
+    if cfg.db_profile == "production":
+        return _engine_from_config(cfg, cfg.db_url, read_only=True)
+    return None
+
+
+def _engine_from_config(cfg, url: str, read_only: bool):
+    return make_engine(
+        url,
+        cfg.db_profile,
+        read_only=read_only,
+        pool_size=cfg.db_pool_size,
+        max_overflow=cfg.db_max_overflow,
+        statement_timeout=cfg.db_statement_timeout,
+    )
+
+
+def _pg_pool_kwargs(pool_size: int, max_overflow: int) -> dict:
+    return dict(
+        pool_size=pool_size,
+        max_overflow=max_overflow,
+        pool_timeout=10,
+        # соединение, убитое балансировщиком/рестартом, не всплывает ошибкой
+        pool_pre_ping=True,
+        pool_recycle=1800,
+    )
+
+
+def _pg_settings(statement_timeout: float, read_only: bool) -> dict:
+    settings = {"statement_timeout": int(statement_timeout * 1000)}
+    if read_only:
+        settings["default_transaction_read_only"] = "on"
+    return settings
+
+
+def _install_sqlite_pragmas(engine, profile: str, read_only: bool):
+    pragmas = dict(SQLITE_PRAGMAS) if profile == "production" else {}
+    if read_only:
+        pragmas["query_only"] = "ON"
+    if not pragmas or engine.url.database in (None, "", ":memory:"):
+        return
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _record):
+        cur = dbapi_conn.cursor()
+        for name, value in pragmas.items():
+            cur.execute(f"PRAGMA {name}={value}")
+        cur.close()
+
+
+def ensure_indexes(engine):
+    # create_all не трогает уже существующие таблицы — новые индексы
+    # на старой базе досоздаём сами
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
 
 
 def make_session_factory(engine):
-    return sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    # expire_on_commit=False: после commit объекты не перечитываются из базы
+    # при следующем обращении — хендлер дорисовывает ответ без лишних SELECT
+    return sessionmaker(
+        bind=engine,
+        autoflush=False,
+        autocommit=False,
+        expire_on_commit=False,
+        future=True,
+    )
@@ -0,0 +1,167 @@
+import logging
+import threading
+import time
+from collections import deque
+from queue import SimpleQueue
+from typing import Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+def update_key(update) -> Hashable:
+    # апдейты одного чата обрабатываются строго по очереди;
+    # если чата нет (inline-кнопки) — по пользователю
+    msg = update.message or update.edited_message
+    if msg is not None:
+        return ("chat", msg.chat.id)
+    cq = update.callback_query
+    if cq is not None:
+        if cq.message is not None:
+            return ("chat", cq.message.chat.id)
+        return ("user", cq.from_user.id)
+    # прочие типы апдейтов порядок не требуют
+    return ("update", update.update_id)
+
+
+class UpdateDispatcher:
+    # Пул воркеров с упорядочиванием по ключу (чату).
+    # Для каждого ключа своя очередь; ключ одновременно обрабатывает не больше
+    # одного воркера, поэтому порядок внутри чата сохраняется, а разные чаты
+    # идут параллельно. Медленный апдейт держит только свой чат.
+    # Общее число ожидающих апдейтов ограничено queue_size. Что делать при
+    # переполнении — overflow:
+    #   "block" — submit() ждёт места;
+    #   "shed"  — апдейт отдаётся в shed(); тот решает, можно ли его бросить
+    #             (нажатие кнопки — да, с ответом «повтори»; текст — нет, ждём).
+    # stale_after: апдейт, простоявший в очереди дольше, тоже идёт в shed().
+
+    def __init__(
+        self,
+        handle: Callable[[object], None],
+        workers: int,
+        queue_size: int,
+        key: Callable[[object], Hashable] = update_key,
+        overflow: str = "block",
+        stale_after: float = 0,
+        shed: Callable[[object], bool] | None = None,
+    ):
+        self._handle = handle
+        self._key = key
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.overflow = overflow
+        self.stale_after = stale_after
+        self._shed = shed
+        self.shed_count = 0
+
+        self._lock = threading.Lock()
+        self._not_full = threading.Condition(self._lock)
+        # key -> deque (время постановки, апдейт); ключ есть в словаре,
+        # пока он в работе или в очереди
+        self._pending: dict[Hashable, deque] = {}
+        self._ready: SimpleQueue = SimpleQueue()
+        self._size = 0
+        self._closed = False
+        self._threads: list[threading.Thread] = []
+
+    def start(self):
+        for i in range(self.workers):
+            t = threading.Thread(
+                target=self._worker, name=f"update-worker-{i}", daemon=True
+            )
+            t.start()
+            self._threads.append(t)
+
+    def submit(self, update) -> bool:
+        # -> False, если апдейт не принят (сброшен или идёт остановка)
+        key = self._key(update)
+        if self.overflow == "shed" and self._shed is not None:
+            with self._lock:
+                full = self._size >= self.queue_size
+            if full and self._try_shed(update):
+                return False
+
+        with self._not_full:
+            # "block" или shed() отказался бросать — ждём места
+            while self._size >= self.queue_size and not self._closed:
+                self._not_full.wait()
+            if self._closed:
+                logger.warning("dispatcher is stopping, update %s refused", key)
+                return False
+            self._size += 1
+            item = (time.monotonic(), update)
+            dq = self._pending.get(key)
+            if dq is None:
+                self._pending[key] = deque([item])
+                self._ready.put(key)
+            else:
+                dq.append(item)
+        return True
+
+    def queue_depth(self) -> int:
+        return self._size
+
+    def load(self) -> float:
+        # доля занятой очереди, 0..1
+        return self._size / self.queue_size
+
+    def stop(self, timeout: float | None = None):
+        # новые не принимаем, очередь дорабатываем (не дольше timeout),
+        # потом гасим воркеры
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._not_full:
+            self._closed = True
+            self._not_full.notify_all()
+            while self._size:
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    logger.warning(
+                        "dispatcher stopped with %s updates unprocessed", self._size
+                    )
+                    break
+                self._not_full.wait(left)
+        for _ in self._threads:
+            self._ready.put(_STOP)
+        for t in self._threads:
+            t.join(timeout)
+        self._threads.clear()
+
+    def _try_shed(self, update) -> bool:
+        try:
+            dropped = self._shed(update)
+        except Exception:
+            logger.exception("shed failed")
+            return False
+        if dropped:
+            self.shed_count += 1
+        return dropped
+
+    def _worker(self):
+        while True:
+            key = self._ready.get()
+            if key is _STOP:
+                return
+            with self._lock:
+                queued_at, update = self._pending[key].popleft()
+            try:
+                stale = (
+                    self.stale_after > 0
+                    and self._shed is not None
+                    and time.monotonic() - queued_at > self.stale_after
+                )
+                if not (stale and self._try_shed(update)):
+                    self._handle(update)
+            except Exception:
+                logger.exception("update handler failed")
+            finally:
+                with self._not_full:
+                    self._size -= 1
+                    # ждут и submit(), и stop()
+                    self._not_full.notify_all()
+                    if self._pending[key]:
+                        # у чата есть ещё апдейты — в конец очереди готовых
+                        self._ready.put(key)
+                    else:
+                        del self._pending[key]
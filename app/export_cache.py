@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Hashable
+
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+
+from .models import Item, AuditLog
+
+
+# (max Item.updated_at, max AuditLog.id) — если ни то ни другое не сдвинулось,
+# содержимое экспорта по точке не изменилось
+Watermark = tuple[datetime | None, int | None]
+
+
+def export_watermark(db: Session, outlet_id: int) -> Watermark:
+    # один round-trip вместо двух
+    row = db.execute(
+        select(
+            select(func.max(Item.updated_at))
+            .where(Item.outlet_id == outlet_id)
+            .scalar_subquery(),
+            select(func.max(AuditLog.id))
+            .where(AuditLog.outlet_id == outlet_id)
+            .scalar_subquery(),
+        )
+    ).one()
+    return (row[0], row[1])
+
+
+@dataclass(frozen=True)
+class CachedExport:
+    watermark: Watermark
+    file_id: str
+    file_name: str
+    size: int
+    stored_at: float
+
+
+class ExportCache:
+    # LRU уже загруженных в Telegram файлов: key -> file_id + watermark.
+    # Ограничен по возрасту (ttl, сек), числу записей и суммарному размеру файлов.
+
+    def __init__(self, ttl: int, max_entries: int, max_bytes: int):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, CachedExport] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable, watermark: Watermark) -> CachedExport | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expired = time.monotonic() - entry.stored_at > self.ttl
+            if expired or entry.watermark != watermark:
+                self._pop(key)
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(
+        self, key: Hashable, watermark: Watermark, file_id: str, file_name: str, size: int
+    ):
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        with self._lock:
+            self._pop(key)
+            self._entries[key] = CachedExport(
+                watermark=watermark,
+                file_id=file_id,
+                file_name=file_name,
+                size=size,
+                stored_at=time.monotonic(),
+            )
+            self._bytes += size
+            self._evict()
+
+    def drop(self, key: Hashable):
+        with self._lock:
+            self._pop(key)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _pop(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.size
+
+    def _evict(self):
+        now = time.monotonic()
+        for key in [k for k, e in self._entries.items() if now - e.stored_at > self.ttl]:
+            self._pop(key)
+        while self._entries and (
+            len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+        ):
+            _, entry = self._entries.popitem(last=False)
+            self._bytes -= entry.size
@@ -0,0 +1,97 @@
+import csv
+import gzip
+import io
+import json
+from datetime import datetime
+from tempfile import SpooledTemporaryFile
+from typing import IO, Iterator
+from sqlalchemy.orm import Session
+
+from .export_rows import INVENTORY_HEADER, AUDIT_HEADER, inventory_rows, audit_rows
+
+# Лёгкие форматы рядом с xlsx: те же строки из export_rows, но без openpyxl.
+# Пишем потоком в SpooledTemporaryFile: маленькие файлы остаются в памяти,
+# большие уходят во временный файл, который удаляется при close().
+
+SPOOL_MAX_BYTES = 8 * 1024 * 1024
+
+TABLE_INVENTORY = "inventory"
+TABLE_AUDIT = "audit"
+
+
+def _table(db: Session, table: str, outlet_id: int, since, until):
+    if table == TABLE_INVENTORY:
+        return INVENTORY_HEADER, inventory_rows(db, outlet_id, since, until)
+    if table == TABLE_AUDIT:
+        return AUDIT_HEADER, audit_rows(db, outlet_id, since, until)
+    raise ValueError(f"unknown export table: {table}")
+
+
+def _open_text(buf: IO[bytes], compress: bool):
+    raw = gzip.GzipFile(fileobj=buf, mode="wb") if compress else None
+    text = io.TextIOWrapper(raw or buf, encoding="utf-8", newline="")
+    return raw, text
+
+
+def _close_text(buf: IO[bytes], raw, text) -> IO[bytes]:
+    text.flush()
+    # detach, чтобы TextIOWrapper не закрыл буфер под собой
+    text.detach()
+    if raw is not None:
+        raw.close()  # дописывает gzip-трейлер, fileobj не закрывает
+    buf.seek(0)
+    return buf
+
+
+def export_outlet_csv(
+    db: Session,
+    outlet_id: int,
+    table: str = TABLE_INVENTORY,
+    compress: bool = False,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    spool_max_bytes: int = SPOOL_MAX_BYTES,
+) -> IO[bytes]:
+    # -> буфер, спозиционированный на начало; закрывает вызывающий
+    header, rows = _table(db, table, outlet_id, since, until)
+
+    buf = SpooledTemporaryFile(max_size=spool_max_bytes, mode="w+b")
+    try:
+        raw, text = _open_text(buf, compress)
+        w = csv.writer(text)
+        w.writerow(header)
+        w.writerows(rows)
+        return _close_text(buf, raw, text)
+    except BaseException:
+        buf.close()
+        raise
+
+
+def _jsonl_records(db: Session, outlet_id: int, since, until) -> Iterator[dict]:
+    for table in (TABLE_INVENTORY, TABLE_AUDIT):
+        header, rows = _table(db, table, outlet_id, since, until)
+        for row in rows:
+            rec = {"type": table}
+            rec.update(zip(header, row))
+            yield rec
+
+
+def export_outlet_jsonl(
+    db: Session,
+    outlet_id: int,
+    compress: bool = False,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    spool_max_bytes: int = SPOOL_MAX_BYTES,
+) -> IO[bytes]:
+    # одна строка = один объект; тип строки — в поле "type"
+    buf = SpooledTemporaryFile(max_size=spool_max_bytes, mode="w+b")
+    try:
+        raw, text = _open_text(buf, compress)
+        for rec in _jsonl_records(db, outlet_id, since, until):
+            text.write(json.dumps(rec, ensure_ascii=False))
+            text.write("\n")
+        return _close_text(buf, raw, text)
+    except BaseException:
+        buf.close()
+        raise
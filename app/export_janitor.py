@@ -0,0 +1,67 @@
+import logging
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+# Экспорты больше не пишутся на диск, но каталог (tmp_exports от старых
+# версий, ручные выгрузки) всё равно держим в рамках по возрасту и объёму.
+
+
+def sweep_export_dir(path: str, max_age: int, max_bytes: int) -> tuple[int, int]:
+    # -> (удалено файлов, освобождено байт)
+    root = Path(path)
+    if not root.is_dir():
+        return 0, 0
+
+    now = time.time()
+    files = []
+    for p in root.iterdir():
+        try:
+            if p.is_file():
+                st = p.stat()
+                files.append((st.st_mtime, st.st_size, p))
+        except FileNotFoundError:
+            continue
+
+    removed, freed = 0, 0
+    # старые сначала: сперва по возрасту, потом по квоте объёма
+    files.sort(key=lambda f: f[0])
+    total = sum(size for _, size, _ in files)
+    for mtime, size, p in files:
+        if now - mtime <= max_age and total <= max_bytes:
+            break
+        try:
+            p.unlink()
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning("export janitor: cannot remove %s: %s", p, e)
+            continue
+        total -= size
+        removed += 1
+        freed += size
+
+    if removed:
+        logger.info("export janitor: removed %s files (%s bytes) from %s", removed, freed, path)
+    return removed, freed
+
+
+def start_janitor(
+    path: str, max_age: int, max_bytes: int, interval: int
+) -> threading.Event:
+    # фоновый поток; set() у возвращённого события его останавливает
+    stop = threading.Event()
+
+    def loop():
+        while True:
+            try:
+                sweep_export_dir(path, max_age, max_bytes)
+            except Exception:
+                logger.exception("export janitor failed")
+            if stop.wait(interval):
+                return
+
+    threading.Thread(target=loop, name="export-janitor", daemon=True).start()
+    return stop
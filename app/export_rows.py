@@ -0,0 +1,139 @@
+from datetime import datetime
+from typing import Iterator
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from .models import Item, StockBalance, AuditLog, User
+
+# общий источник строк для всех форматов экспорта;
+# since/until — полуинтервал [since, until) по времени изменения
+
+INVENTORY_HEADER = [
+    "ItemID",
+    "Name",
+    "Unit",
+    "Quantity",
+    "CreatedAt(UTC)",
+    "UpdatedAt(UTC)",
+]
+
+AUDIT_HEADER = [
+    "Time(UTC)",
+    "User",
+    "Action",
+    "EntityType",
+    "EntityID",
+    "OutletID",
+    "GroupID",
+    "Details",
+]
+
+YIELD_PER = 1000
+
+
+def _iso(dt):
+    return dt.isoformat(timespec="seconds") if dt else None
+
+
+def inventory_rows(
+    db: Session,
+    outlet_id: int,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> Iterator[list]:
+    q = (
+        select(
+            Item.id,
+            Item.name,
+            Item.unit,
+            StockBalance.quantity,
+            Item.created_at,
+            Item.updated_at,
+        )
+        .join(
+            StockBalance,
+            (StockBalance.item_id == Item.id) & (StockBalance.outlet_id == outlet_id),
+            isouter=True,
+        )
+        .where(Item.outlet_id == outlet_id, Item.is_active == True)
+        .order_by(Item.name.asc())
+        .execution_options(yield_per=YIELD_PER)
+    )
+    # только товары, чей остаток/карточка менялись в окне
+    if since is not None:
+        q = q.where(Item.updated_at >= since)
+    if until is not None:
+        q = q.where(Item.updated_at < until)
+
+    rows = db.execute(q)
+    for item_id, name, unit, qty, created, updated in rows:
+        yield [
+            item_id,
+            name,
+            unit,
+            float(qty) if qty is not None else 0,
+            _iso(created),
+            _iso(updated),
+        ]
+
+
+def audit_rows(
+    db: Session,
+    outlet_id: int,
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> Iterator[list]:
+    # имя пользователя подтягиваем join'ом, без отдельного запроса
+    q = (
+        select(
+            AuditLog.created_at,
+            AuditLog.user_id,
+            User.name,
+            User.tg_user_id,
+            AuditLog.action,
+            AuditLog.entity_type,
+            AuditLog.entity_id,
+            AuditLog.outlet_id,
+            AuditLog.group_id,
+            AuditLog.details,
+        )
+        .join(User, User.id == AuditLog.user_id, isouter=True)
+        .where(AuditLog.outlet_id == outlet_id)
+        .order_by(AuditLog.created_at.asc())
+        .execution_options(yield_per=YIELD_PER)
+    )
+    # диапазон по created_at — идёт по индексу, а не по всей истории
+    if since is not None:
+        q = q.where(AuditLog.created_at >= since)
+    if until is not None:
+        q = q.where(AuditLog.created_at < until)
+
+    rows = db.execute(q)
+    for (
+        created,
+        user_id,
+        user_name,
+        tg_user_id,
+        action,
+        entity_type,
+        entity_id,
+        row_outlet_id,
+        group_id,
+        details,
+    ) in rows:
+        if user_name:
+            user = user_name
+        elif tg_user_id is not None:
+            user = str(tg_user_id)
+        else:
+            user = str(user_id)
+        yield [
+            _iso(created),
+            user,
+            action.value if hasattr(action, "value") else str(action),
+            entity_type,
+            entity_id,
+            row_outlet_id,
+            group_id,
+            details,
+        ]
@@ -1,14 +1,36 @@
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
 from datetime import datetime
+from itertools import islice
 from pathlib import Path
+from typing import IO
 from openpyxl import Workbook
 from openpyxl.utils import get_column_letter
 from sqlalchemy import select
 from sqlalchemy.orm import Session
 
-from .models import Item, StockBalance, AuditLog, User
+from .models import Outlet
+from .export_rows import INVENTORY_HEADER, AUDIT_HEADER, inventory_rows, audit_rows
 
 
-def export_outlet_xlsx(db: Session, outlet_id: int, file_path: str) -> str:
+def _save(wb: Workbook, target: str | IO[bytes]):
+    if isinstance(target, str):
+        Path(target).parent.mkdir(parents=True, exist_ok=True)
+    wb.save(target)
+    return target
+
+
+def export_outlet_xlsx(
+    db: Session,
+    outlet_id: int,
+    target: str | IO[bytes],
+    since: datetime | None = None,
+    until: datetime | None = None,
+) -> str | IO[bytes]:
+    # target — путь или бинарный буфер (например SpooledTemporaryFile)
+    # since/until заданы — только изменения в окне [since, until)
     wb = Workbook()
 
     # -------- Sheet 1: Inventory --------
@@ -17,39 +39,19 @@ def export_outlet_xlsx(db: Session, outlet_id: int, file_path: str) -> str:
 
     ws.append(["GeneratedAt(UTC)", datetime.utcnow().isoformat(timespec="seconds")])
     ws.append(["OutletID", outlet_id])
+    if since is not None or until is not None:
+        ws.append(
+            [
+                "Changes(UTC)",
+                since.isoformat(timespec="seconds") if since else None,
+                until.isoformat(timespec="seconds") if until else None,
+            ]
+        )
     ws.append([])
-    ws.append(
-        ["ItemID", "Name", "Unit", "Quantity", "CreatedAt(UTC)", "UpdatedAt(UTC)"]
-    )
+    ws.append(INVENTORY_HEADER)
 
-    items = db.scalars(
-        select(Item)
-        .where(Item.outlet_id == outlet_id, Item.is_active == True)
-        .order_by(Item.name.asc())
-    ).all()
-    if items:
-        item_ids = [it.id for it in items]
-        bals = db.scalars(
-            select(StockBalance).where(
-                StockBalance.outlet_id == outlet_id, StockBalance.item_id.in_(item_ids)
-            )
-        ).all()
-        bmap = {b.item_id: b for b in bals}
-
-        for it in items:
-            qty = bmap.get(it.id).quantity if bmap.get(it.id) else 0
-            created = getattr(it, "created_at", None)
-            updated = getattr(it, "updated_at", None)
-            ws.append(
-                [
-                    it.id,
-                    it.name,
-                    it.unit,
-                    float(qty) if qty is not None else 0,
-                    created.isoformat(timespec="seconds") if created else None,
-                    updated.isoformat(timespec="seconds") if updated else None,
-                ]
-            )
+    for row in inventory_rows(db, outlet_id, since, until):
+        ws.append(row)
 
     # autosize columns (простенько)
     for col in range(1, 7):
@@ -57,50 +59,129 @@ def export_outlet_xlsx(db: Session, outlet_id: int, file_path: str) -> str:
 
     # -------- Sheet 2: Audit --------
     ws2 = wb.create_sheet("Audit")
-    ws2.append(
-        [
-            "Time(UTC)",
-            "User",
-            "Action",
-            "EntityType",
-            "EntityID",
-            "OutletID",
-            "GroupID",
-            "Details",
-        ]
-    )
+    ws2.append(AUDIT_HEADER)
 
-    # подмешаем имя пользователя
-    # (можно оптимизировать join'ом, но для прототипа ок)
-    logs = db.scalars(
-        select(AuditLog)
-        .where(AuditLog.outlet_id == outlet_id)
-        .order_by(AuditLog.created_at.asc())
-    ).all()
-
-    user_ids = sorted({l.user_id for l in logs})
-    users = {}
-    if user_ids:
-        us = db.scalars(select(User).where(User.id.in_(user_ids))).all()
-        users = {u.id: (u.name or str(u.tg_user_id)) for u in us}
-
-    for l in logs:
-        ws2.append(
-            [
-                l.created_at.isoformat(timespec="seconds"),
-                users.get(l.user_id, str(l.user_id)),
-                l.action.value if hasattr(l.action, "value") else str(l.action),
-                l.entity_type,
-                l.entity_id,
-                l.outlet_id,
-                l.group_id,
-                l.details,
-            ]
-        )
+    for row in audit_rows(db, outlet_id, since, until):
+        ws2.append(row)
 
     for col in range(1, 9):
         ws2.column_dimensions[get_column_letter(col)].width = 22
 
-    Path(file_path).parent.mkdir(parents=True, exist_ok=True)
-    wb.save(file_path)
-    return file_path
+    return _save(wb, target)
+
+
+# ---------------------------
+# Group export (sheet per outlet)
+# ---------------------------
+SUMMARY_HEADER = [
+    "OutletID",
+    "Name",
+    "Items",
+    "TotalQuantity",
+    "AuditEntries",
+    "LastChange(UTC)",
+]
+
+
+@dataclass
+class OutletSnapshot:
+    outlet_id: int
+    name: str
+    inventory: list[list]
+    audit: list[list]
+
+
+def _snapshot_outlet(session_factory, outlet_id: int, name: str) -> OutletSnapshot:
+    # у каждого воркера своя сессия — Session не потокобезопасна
+    with session_factory() as db:
+        return OutletSnapshot(
+            outlet_id=outlet_id,
+            name=name,
+            inventory=list(inventory_rows(db, outlet_id)),
+            audit=list(audit_rows(db, outlet_id)),
+        )
+
+
+def _sheet_title(outlet_id: int, name: str, used: set[str]) -> str:
+    # Excel: <= 31 символ, без []:*?/\ и уникально в книге
+    base = re.sub(r"[\[\]:*?/\\]", " ", f"{outlet_id} {name}").strip()[:31]
+    title, n = base, 2
+    while title.lower() in used:
+        suffix = f" ({n})"
+        title = base[: 31 - len(suffix)] + suffix
+        n += 1
+    used.add(title.lower())
+    return title
+
+
+def _set_widths(ws, count: int, width: int):
+    # в write_only режиме ширины задаются до первой строки
+    for col in range(1, count + 1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+
+
+def export_group_xlsx(
+    session_factory, group_id: int, target: str | IO[bytes], max_workers: int = 8
+) -> str | IO[bytes]:
+    with session_factory() as db:
+        outlets = db.execute(
+            select(Outlet.id, Outlet.name)
+            .where(Outlet.group_id == group_id, Outlet.is_active == True)
+            .order_by(Outlet.id.asc())
+        ).all()
+
+    # write_only: строки сразу уходят во временные файлы листов, а не в память
+    wb = Workbook(write_only=True)
+    summary = wb.create_sheet("Summary")
+    _set_widths(summary, len(SUMMARY_HEADER), 20)
+    summary.append(
+        ["GeneratedAt(UTC)", datetime.utcnow().isoformat(timespec="seconds")]
+    )
+    summary.append(["GroupID", group_id])
+    summary.append([])
+    summary.append(SUMMARY_HEADER)
+
+    audit = wb.create_sheet("Audit")
+    _set_widths(audit, len(AUDIT_HEADER), 22)
+    audit.append(AUDIT_HEADER)
+
+    used_titles = {"summary", "audit"}
+    workers = max(1, min(max_workers, len(outlets)))
+    pending = iter(outlets)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        # выгрузка точек идёт параллельно, а в книгу пишем в исходном порядке.
+        # Окно — не больше workers снимков сразу: следующую точку ставим,
+        # только когда первый в очереди снимок записан и отпущен
+        window = deque(
+            pool.submit(_snapshot_outlet, session_factory, oid, name)
+            for oid, name in islice(pending, workers)
+        )
+        while window:
+            snap = window.popleft().result()
+
+            ws = wb.create_sheet(_sheet_title(snap.outlet_id, snap.name, used_titles))
+            _set_widths(ws, len(INVENTORY_HEADER), 20)
+            ws.append(INVENTORY_HEADER)
+            total_qty = 0.0
+            for row in snap.inventory:
+                ws.append(row)
+                total_qty += row[3]
+
+            for row in snap.audit:
+                audit.append(row)
+
+            summary.append(
+                [
+                    snap.outlet_id,
+                    snap.name,
+                    len(snap.inventory),
+                    total_qty,
+                    len(snap.audit),
+                    snap.audit[-1][0] if snap.audit else None,
+                ]
+            )
+            del snap
+            for oid, name in islice(pending, 1):
+                window.append(pool.submit(_snapshot_outlet, session_factory, oid, name))
+
+    return _save(wb, target)
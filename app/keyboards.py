@@ -0,0 +1,217 @@
+import json
+from functools import lru_cache
+
+from . import callbacks as cbdata
+from .callbacks import SORT_ALPHA, SORT_CREATED, SORT_UPDATED
+
+# Inline-клавиатуры бота.
+# Отдаём сразу готовый JSON (reply_markup принимает строку): статичные
+# клавиатуры собираются один раз, параметризованные кешируются по аргументам.
+# Клавиатура из кусков (список товаров + управление) склеивается из уже
+# сериализованных фрагментов — без InlineKeyboardMarkup и повторного to_json.
+#
+# *_rows() — описание кнопок: ((текст, callback_data), ...) по рядам.
+
+CACHE_SIZE = 4096
+
+Rows = tuple[tuple[tuple[str, str], ...], ...]
+
+SORT_BUTTONS = (
+    ("🔤 По алфавиту", SORT_ALPHA),
+    ("🕒 По времени добавления", SORT_CREATED),
+    ("✏️ По времени изменения", SORT_UPDATED),
+)
+
+
+def rows_json(rows: Rows) -> str:
+    # фрагмент "[...],[...]" для вставки в inline_keyboard
+    return ",".join(
+        "["
+        + ",".join(
+            json.dumps({"text": text, "callback_data": data}, ensure_ascii=False)
+            for text, data in row
+        )
+        + "]"
+        for row in rows
+    )
+
+
+def markup(*fragments: str) -> str:
+    return '{"inline_keyboard":[' + ",".join(f for f in fragments if f) + "]}"
+
+
+def _cached(rows_fn):
+    # rows_fn(*args) -> Rows  =>  f(*args) -> JSON клавиатуры, с кешем
+    @lru_cache(maxsize=CACHE_SIZE)
+    def build(*args) -> str:
+        return markup(rows_json(rows_fn(*args)))
+
+    build.rows = rows_fn
+    return build
+
+
+def _menu_row() -> Rows:
+    return ((("⬅️ В меню", cbdata.encode("m:home")),),)
+
+
+# ---------------------------
+# Static
+# ---------------------------
+def main_rows() -> Rows:
+    return (
+        (("🏢 Группы", cbdata.encode("g:list")),),
+        (("🏬 Точки", cbdata.encode("o:pick_group")),),
+        (("📦 Инвентарь", cbdata.encode("i:pick_group")),),
+    )
+
+
+def groups_list_rows() -> Rows:
+    return ((("➕ Создать группу", cbdata.encode("g:create")),),) + _menu_row()
+
+
+def no_outlets_rows() -> Rows:
+    return ((("⬅️ Назад (группы)", cbdata.encode("i:pick_group")),),)
+
+
+main = _cached(main_rows)
+groups_list = _cached(groups_list_rows)
+no_outlets = _cached(no_outlets_rows)
+
+
+# ---------------------------
+# Parameterized
+# ---------------------------
+def outlets_list_rows(group_id: int, can_create: bool) -> Rows:
+    rows = ()
+    if can_create:
+        rows += (
+            (("➕ Создать точку", cbdata.encode("o:create", group_id)),),
+            (("📤 Экспорт группы в Excel", cbdata.encode("g:export", group_id)),),
+        )
+    return (
+        rows + ((("⬅️ Назад (группы)", cbdata.encode("o:pick_group")),),) + _menu_row()
+    )
+
+
+def inventory_rows(outlet_id: int, sort: str) -> Rows:
+    return (
+        (
+            ("➕ Добавить товар", cbdata.encode("i:add", outlet_id)),
+            ("↕️ Сортировка", cbdata.encode("i:sort", outlet_id)),
+        ),
+        (("🔄 Обновить", cbdata.encode("i:open", outlet_id, sort)),),
+        (("📤 Экспорт в Excel", cbdata.encode("i:export", outlet_id)),),
+        (
+            ("📄 CSV", cbdata.encode("i:exportcsv", outlet_id)),
+            ("🧾 JSON Lines", cbdata.encode("i:exportjsonl", outlet_id)),
+        ),
+        (
+            (
+                "🆕 Изменения с прошлого экспорта",
+                cbdata.encode("i:exportnew", outlet_id),
+            ),
+        ),
+        (("📅 Экспорт за период", cbdata.encode("i:exportrange", outlet_id)),),
+        (("⬅️ Назад (точки)", cbdata.encode("i:pick_group")),),
+    ) + _menu_row()
+
+
+def inventory_sort_rows(outlet_id: int, current: str) -> Rows:
+    rows = tuple(
+        (
+            (
+                label + (" ✅" if current == key else ""),
+                cbdata.encode("i:setsort", outlet_id, key),
+            ),
+        )
+        for label, key in SORT_BUTTONS
+    )
+    return rows + ((("⬅️ Назад", cbdata.encode("i:open", outlet_id, current)),),)
+
+
+def item_card_rows(outlet_id: int, item_id: int, sort: str) -> Rows:
+    def qty(label, delta):
+        return (label, cbdata.encode("i:qty", outlet_id, item_id, delta, sort))
+
+    return (
+        (qty("➖10", -10), qty("➖1", -1), qty("➕1", 1), qty("➕10", 10)),
+        (
+            (
+                "✍️ Задать количество",
+                cbdata.encode("i:setqty", outlet_id, item_id, sort),
+            ),
+        ),
+        (
+            ("✏️ Переименовать", cbdata.encode("i:rename", outlet_id, item_id, sort)),
+            ("📏 Изменить unit", cbdata.encode("i:unit", outlet_id, item_id, sort)),
+        ),
+        (("🗑 Удалить", cbdata.encode("i:del", outlet_id, item_id, sort)),),
+        (("⬅️ К списку", cbdata.encode("i:open", outlet_id, sort)),),
+    )
+
+
+def delete_confirm_rows(outlet_id: int, item_id: int, sort: str) -> Rows:
+    return (
+        (
+            ("✅ Да, удалить", cbdata.encode("i:delok", outlet_id, item_id, sort)),
+            ("❌ Отмена", cbdata.encode("i:item", outlet_id, item_id, sort)),
+        ),
+    )
+
+
+outlets_list = _cached(outlets_list_rows)
+inventory_sort = _cached(inventory_sort_rows)
+item_card = _cached(item_card_rows)
+delete_confirm = _cached(delete_confirm_rows)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def inventory_controls(outlet_id: int, sort: str) -> str:
+    # фрагмент: идёт после кнопок товаров
+    return rows_json(inventory_rows(outlet_id, sort))
+
+
+# ---------------------------
+# Dynamic (названия меняются — кешируем только хвост)
+# ---------------------------
+def group_pick(groups, back_cb: str) -> str:
+    rows = tuple(
+        ((f"🏢 {g.name} (#{g.id})", cbdata.encode("g:select", g.id, back_cb)),)
+        for g in groups
+    )
+    return markup(rows_json(rows), _menu_fragment())
+
+
+def outlet_pick(outlets, next_cb: str) -> str:
+    rows = tuple(
+        ((f"🏬 {o.name} (#{o.id})", cbdata.encode("o:select", o.id, next_cb)),)
+        for o in outlets
+    )
+    return markup(rows_json(rows), _outlet_pick_tail())
+
+
+def inventory_with_items(outlet_id: int, sort: str, items) -> str:
+    # items: [(item, qty)] — кнопки карточек товаров над управлением
+    rows = [
+        _item_row(outlet_id, it.id, sort, f"{it.name} ({qty:g} {it.unit})")
+        for it, qty in items
+    ]
+    return markup(*rows, inventory_controls(outlet_id, sort))
+
+
+@lru_cache(maxsize=CACHE_SIZE * 4)
+def _item_row(outlet_id: int, item_id: int, sort: str, label: str) -> str:
+    # подпись с количеством входит в ключ: поменялся остаток — новая строка
+    return rows_json((((label, cbdata.encode("i:item", outlet_id, item_id, sort)),),))
+
+
+@lru_cache(maxsize=1)
+def _menu_fragment() -> str:
+    return rows_json(_menu_row())
+
+
+@lru_cache(maxsize=1)
+def _outlet_pick_tail() -> str:
+    return rows_json(
+        ((("⬅️ Назад (группы)", cbdata.encode("o:pick_group")),),) + _menu_row()
+    )
@@ -0,0 +1,298 @@
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+from telebot.apihelper import ApiTelegramException
+
+logger = logging.getLogger(__name__)
+
+# Метрики процесса в текстовом формате Prometheus (GET /metrics на
+# METRICS_HOST:METRICS_PORT). Без prometheus_client: счётчики, гистограммы
+# и гейджи-функции, которые считаются в момент запроса. В режиме шардов у
+# каждого воркера свой порт: METRICS_PORT + 1 + номер шарда.
+
+# секунды; от быстрого callback до тяжёлой выгрузки
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+EXPORT_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _num(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labels
+        self._lock = threading.Lock()
+
+    def render(self) -> list[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._values: dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return super().render() + [
+            f"{self.name}{_labels(self.labelnames, k)} {_num(v)}" for k, v in values
+        ]
+
+
+class Gauge(_Metric):
+    # значение — функция, вызывается при каждом запросе /metrics
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._fns: dict[tuple, Callable[[], float | None]] = {}
+
+    def set_function(self, fn: Callable[[], float | None], *labels):
+        with self._lock:
+            self._fns[labels] = fn
+
+    def render(self):
+        with self._lock:
+            fns = sorted(self._fns.items(), key=lambda kv: kv[0])
+        lines = super().render()
+        for k, fn in fns:
+            try:
+                v = fn()
+            except Exception:
+                logger.debug("metrics: gauge %s failed", self.name, exc_info=True)
+                continue
+            if v is not None:
+                lines.append(f"{self.name}{_labels(self.labelnames, k)} {_num(v)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+        # labels -> [счётчики по корзинам..., +Inf], сумма
+        self._values: dict[tuple, tuple[list[int], list[float]]] = {}
+
+    def observe(self, value: float, *labels):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            counts, total = self._values.setdefault(
+                labels, ([0] * (len(self.buckets) + 1), [0.0])
+            )
+            counts[i] += 1
+            total[0] += value
+
+    @contextmanager
+    def time(self, *labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, *labels)
+
+    def render(self):
+        with self._lock:
+            values = sorted(
+                (k, (list(c), t[0])) for k, (c, t) in self._values.items()
+            )
+        lines = super().render()
+        for k, (counts, total) in values:
+            acc = 0
+            for le, n in zip(self.buckets + (float("inf"),), counts):
+                acc += n
+                le_label = f'le="{_num(le)}"'
+                lines.append(
+                    f"{self.name}_bucket{_labels(self.labelnames, k, le_label)} {acc}"
+                )
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, k)} {_num(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, k)} {acc}")
+        return lines
+
+
+_registry: list[_Metric] = []
+
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+# ---------------------------
+# Метрики бота
+# ---------------------------
+updates_received = _register(
+    Counter("bot_updates_received_total", "Updates accepted for processing", ("kind",))
+)
+updates_shed = _register(
+    Counter("bot_updates_shed_total", "Button presses dropped under overload")
+)
+queue_depth = _register(Gauge("bot_queue_depth", "Updates waiting or in progress"))
+
+action_seconds = _register(
+    Histogram(
+        "bot_action_seconds",
+        "Handler time per update, by callback action or dialog step",
+        ("handler", "action"),
+    )
+)
+action_queries = _register(
+    Histogram(
+        "bot_action_queries",
+        "SQL statements per update",
+        ("handler", "action"),
+        QUERY_BUCKETS,
+    )
+)
+action_errors = _register(
+    Counter(
+        "bot_action_errors_total",
+        "Updates whose handler raised",
+        ("handler", "action"),
+    )
+)
+
+telegram_seconds = _register(
+    Histogram("telegram_api_seconds", "Telegram Bot API call time", ("method",))
+)
+telegram_errors = _register(
+    Counter(
+        "telegram_api_errors_total", "Failed Telegram Bot API calls", ("method", "code")
+    )
+)
+
+export_seconds = _register(
+    Histogram(
+        "export_seconds", "Export job build time", ("kind",), EXPORT_BUCKETS
+    )
+)
+
+db_pool = _register(
+    Gauge("db_pool_connections", "Connection pool state", ("engine", "state"))
+)
+compiled_cache = _register(
+    Gauge(
+        "sqlalchemy_compiled_cache_hit_ratio",
+        "Share of statements served from the SQLAlchemy compiled cache",
+    )
+)
+
+
+def update_kind(update) -> str:
+    if update.callback_query is not None:
+        return "callback_query"
+    if update.message is not None:
+        return "message"
+    return "other"
+
+
+@contextmanager
+def telegram_call(method: str):
+    # время и ошибки одного вызова Bot API
+    started = time.perf_counter()
+    try:
+        yield
+    except ApiTelegramException as e:
+        telegram_errors.inc(method, str(e.error_code))
+        raise
+    except Exception as e:
+        telegram_errors.inc(method, type(e).__name__)
+        raise
+    finally:
+        telegram_seconds.observe(time.perf_counter() - started, method)
+
+
+def watch_pool(name: str, engine):
+    # у SQLite в памяти и NullPool этих счётчиков нет — тогда молчим
+    pool = engine.pool
+    for state, attr in (
+        ("checked_out", "checkedout"),
+        ("idle", "checkedin"),
+        ("size", "size"),
+    ):
+        fn = getattr(pool, attr, None)
+        if callable(fn):
+            db_pool.set_function(fn, name, state)
+
+
+def _compiled_cache_hit_rate():
+    from .db import compiled_cache_hit_rate
+
+    return compiled_cache_hit_rate()
+
+
+compiled_cache.set_function(_compiled_cache_hit_rate)
+
+
+# ---------------------------
+# HTTP
+# ---------------------------
+def make_metrics_server(host: str, port: int) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            logger.debug("metrics: " + fmt, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
+
+
+def start_metrics_server(host: str, port: int) -> ThreadingHTTPServer:
+    server = make_metrics_server(host, port)
+    threading.Thread(
+        target=server.serve_forever, name="metrics", daemon=True
+    ).start()
+    logger.info("metrics on http://%s:%s/metrics", host, port)
+    return server
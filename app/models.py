@@ -1,6 +1,7 @@
 import enum
 from datetime import datetime
 from sqlalchemy import (
+    BigInteger,
     String,
     Integer,
     DateTime,
@@ -9,6 +10,7 @@ from sqlalchemy import (
     Numeric,
     UniqueConstraint,
     Boolean,
+    Index,
 )
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from .db import Base
@@ -67,6 +69,16 @@ class Outlet(Base):
     group = relationship("Group", back_populates="outlets")
 
 
+# точки группы в списках и экспорте группы — только активные, по id
+# (id — rowid, он и так в конце ключа индекса)
+Index(
+    "ix_outlets_group_active",
+    Outlet.group_id,
+    sqlite_where=Outlet.is_active == True,
+    postgresql_where=Outlet.is_active == True,
+)
+
+
 class GroupMembership(Base):
     __tablename__ = "group_memberships"
     __table_args__ = (UniqueConstraint("group_id", "user_id", name="uq_group_user"),)
@@ -113,6 +125,39 @@ class Item(Base):
     )
 
 
+# Индексы под реальные запросы. Список товаров точки — всегда только активные
+# и с одной из трёх сортировок: частичные индексы (WHERE is_active) отдают
+# строки уже в нужном порядке, без сортировки во временном B-дереве.
+# Сортировка по времени — "created_at DESC, id DESC": индекс идёт задом наперёд.
+_ACTIVE_ITEM = Item.is_active == True
+
+Index(
+    "ix_items_outlet_active_name",
+    Item.outlet_id,
+    Item.name,
+    sqlite_where=_ACTIVE_ITEM,
+    postgresql_where=_ACTIVE_ITEM,
+)
+Index(
+    "ix_items_outlet_active_created",
+    Item.outlet_id,
+    Item.created_at,
+    Item.id,
+    sqlite_where=_ACTIVE_ITEM,
+    postgresql_where=_ACTIVE_ITEM,
+)
+Index(
+    "ix_items_outlet_active_updated",
+    Item.outlet_id,
+    Item.updated_at,
+    Item.id,
+    sqlite_where=_ACTIVE_ITEM,
+    postgresql_where=_ACTIVE_ITEM,
+)
+# max(updated_at) по точке для кеша экспортов — включая удалённые товары
+Index("ix_items_outlet_updated", Item.outlet_id, Item.updated_at)
+
+
 class StockBalance(Base):
     __tablename__ = "stock_balances"
     __table_args__ = (UniqueConstraint("outlet_id", "item_id", name="uq_outlet_item"),)
@@ -123,6 +168,15 @@ class StockBalance(Base):
     quantity: Mapped[float] = mapped_column(Numeric(12, 3), default=0)
 
 
+# остаток по (точка, товар) читается прямо из индекса, без похода в таблицу
+Index(
+    "ix_stock_balances_outlet_item_qty",
+    StockBalance.outlet_id,
+    StockBalance.item_id,
+    StockBalance.quantity,
+)
+
+
 class StockTransaction(Base):
     __tablename__ = "stock_transactions"
 
@@ -184,3 +238,41 @@ class AuditLog(Base):
 
     # детали (коротко, человекочитаемо)
     details: Mapped[str | None] = mapped_column(String(255), nullable=True)
+
+
+# история точки за период — экспорты аудита
+Index("ix_audit_logs_outlet_created", AuditLog.outlet_id, AuditLog.created_at)
+
+
+class ExportWatermark(Base):
+    # до какого момента пользователь уже выгружал изменения по точке
+    __tablename__ = "export_watermarks"
+    __table_args__ = (
+        UniqueConstraint("user_id", "outlet_id", name="uq_export_user_outlet"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), index=True)
+    outlet_id: Mapped[int] = mapped_column(ForeignKey("outlets.id"), index=True)
+    exported_until: Mapped[datetime] = mapped_column(DateTime)
+
+
+class DialogState(Base):
+    # состояние диалога пользователя (см. state_store.SqlStateStore)
+    __tablename__ = "dialog_states"
+
+    tg_user_id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=False)
+    data: Mapped[str] = mapped_column(String)  # JSON
+    updated_at: Mapped[datetime] = mapped_column(DateTime, index=True)
+
+
+class AppliedUpdate(Base):
+    # последний применённый апдейт по ключу очереди — чату или, для кнопок
+    # без чата, пользователю (см. app/applied_updates.py)
+    __tablename__ = "applied_updates"
+
+    kind: Mapped[str] = mapped_column(String(8), primary_key=True)  # chat / user
+    key_id: Mapped[int] = mapped_column(
+        BigInteger, primary_key=True, autoincrement=False
+    )
+    update_id: Mapped[int] = mapped_column(BigInteger)
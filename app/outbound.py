@@ -0,0 +1,292 @@
+import bisect
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import requests
+from telebot import apihelper
+
+logger = logging.getLogger(__name__)
+
+# Планировщик исходящих запросов к Telegram Bot API.
+# Встаёт на уровне транспорта (apihelper.CUSTOM_REQUEST_SENDER), поэтому через
+# него идут все sync-вызовы бота, а вызывающий код по-прежнему просто ждёт
+# результат. Что делает:
+#   - token bucket на весь бот (каждый запрос, включая ответы на callback)
+#     и на каждый чат (лимиты Telegram);
+#   - 429: ждёт retry_after и повторяет; на это время «заморожен» чат, а у
+#     вызовов без чата (ответы на callback) — только этот метод;
+#   - приоритеты: ответы на callback раньше правок, правки раньше файлов.
+# Вызывающий ждёт ответа (правка может не пройти — тогда бот шлёт новое
+# сообщение), а апдейты одного чата идут по очереди, так что в очереди
+# планировщика от чата бывает не больше одного запроса. Поэтому правки
+# одного сообщения здесь не склеиваются: двух в очереди сразу не бывает.
+
+PRIO_CALLBACK = 0
+PRIO_INTERACTIVE = 1
+PRIO_BULK = 2
+
+METHOD_PRIORITY = {
+    "answerCallbackQuery": PRIO_CALLBACK,
+    "sendDocument": PRIO_BULK,
+    "sendPhoto": PRIO_BULK,
+    "sendMediaGroup": PRIO_BULK,
+}
+
+# служебные вызовы идут мимо очереди
+BYPASS = {"getUpdates", "getMe", "setWebhook", "deleteWebhook", "getWebhookInfo", "close", "logOut"}
+
+# не отправляются в чат и в лимиты чата не входят
+NO_CHAT_LIMIT = {"answerCallbackQuery"}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.stamp = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def wait_time(self, now: float) -> float:
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def take(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+@dataclass(eq=False)
+class _Job:
+    prio: int
+    seq: int
+    method_name: str
+    chat: object
+    args: tuple
+    kwargs: dict
+    attempts: int = 0
+    done: threading.Event = field(default_factory=threading.Event)
+    response: object = None
+    error: BaseException | None = None
+
+    def resolve(self, response=None, error=None):
+        self.response, self.error = response, error
+        self.done.set()
+
+
+class OutboundScheduler:
+    def __init__(
+        self,
+        send=None,
+        global_rate: float = 30.0,
+        chat_rate: float = 1.0,
+        group_rate: float = 20 / 60,
+        burst: float = 3.0,
+        senders: int = 8,
+        max_retries: int = 5,
+    ):
+        # send(method, url, **kwargs) -> requests.Response
+        self._send = send or self._requests_send
+        self._local = threading.local()
+        self.chat_rate = chat_rate
+        self.group_rate = group_rate
+        self.burst = burst
+        self.max_retries = max_retries
+
+        self._global = TokenBucket(global_rate, global_rate)
+        self._chats: dict[object, TokenBucket] = {}
+        self._frozen_until: dict[object, float] = {}  # _freeze_key -> monotonic
+        self._inflight: set = set()
+        self._queue: list[tuple[int, int, _Job]] = []
+        self._seq = itertools.count()
+
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=senders, thread_name_prefix="tg-send")
+        self._running = True
+        self._loop = threading.Thread(target=self._run, name="tg-scheduler", daemon=True)
+        self._loop.start()
+
+    # ---------------------------
+    # Transport entry point
+    # ---------------------------
+    def install(self):
+        # поверх уже установленного транспорта (например, фейкового в бенчмарке)
+        if apihelper.CUSTOM_REQUEST_SENDER is not None:
+            self._send = apihelper.CUSTOM_REQUEST_SENDER
+        apihelper.CUSTOM_REQUEST_SENDER = self.request
+        return self
+
+    def request(self, method, url, **kwargs):
+        name = url.rsplit("/", 1)[-1]
+        if name in BYPASS or not self._running:
+            return self._send(method, url, **kwargs)
+
+        params = kwargs.get("params") or {}
+        chat = params.get("chat_id")
+        job = _Job(
+            prio=METHOD_PRIORITY.get(name, PRIO_INTERACTIVE),
+            seq=next(self._seq),
+            method_name=name,
+            chat=None if name in NO_CHAT_LIMIT or chat is None else str(chat),
+            args=(method, url),
+            kwargs=kwargs,
+        )
+        with self._cond:
+            bisect.insort(self._queue, (job.prio, job.seq, job))
+            self._cond.notify()
+
+        job.done.wait()
+        if job.error is not None:
+            raise job.error
+        return job.response
+
+    def queue_depth(self) -> int:
+        return len(self._queue)
+
+    def stop(self, timeout: float | None = 10):
+        # дожидаемся очереди, потом гасим; что не успело уйти за timeout,
+        # завершаем ошибкой — иначе вызывающие потоки ждали бы вечно
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._inflight:
+                left = None if deadline is None else deadline - time.monotonic()
+                if left is not None and left <= 0:
+                    break
+                self._cond.wait(left)
+            self._running = False
+            left_over, self._queue = self._queue, []
+            self._cond.notify_all()
+        if left_over:
+            logger.warning("outbound: %s requests dropped on stop", len(left_over))
+        for _, _, job in left_over:
+            job.resolve(error=RuntimeError("outbound scheduler stopped"))
+        self._pool.shutdown(wait=True)
+
+    # ---------------------------
+    # Scheduling
+    # ---------------------------
+    def _remove(self, job: _Job):
+        i = bisect.bisect_left(self._queue, (job.prio, job.seq))
+        if i < len(self._queue) and self._queue[i][2] is job:
+            del self._queue[i]
+
+    def _chat_bucket(self, chat) -> TokenBucket:
+        b = self._chats.get(chat)
+        if b is None:
+            # отрицательные id — группы и каналы, у них лимит строже
+            rate = self.group_rate if chat.startswith("-") else self.chat_rate
+            b = self._chats[chat] = TokenBucket(rate, self.burst)
+        return b
+
+    def _pick(self, now: float) -> tuple[_Job | None, float | None]:
+        # -> (задача, которую можно слать сейчас) или (None, сколько подождать)
+        wait = None
+        # общий лимит — на любой запрос, с чатом или без
+        global_wait = self._global.wait_time(now)
+        if global_wait > 0:
+            return None, global_wait
+        blocked = set()
+        for _, _, job in self._queue:
+            if job.chat is not None:
+                if job.chat in blocked or job.chat in self._inflight:
+                    # порядок внутри чата: пока не ушла предыдущая, ждём
+                    blocked.add(job.chat)
+                    continue
+                frozen = self._frozen_until.get(job.chat, 0) - now
+                chat_wait = max(frozen, self._chat_bucket(job.chat).wait_time(now))
+                if chat_wait > 0:
+                    blocked.add(job.chat)
+                    wait = chat_wait if wait is None else min(wait, chat_wait)
+                    continue
+                self._chat_bucket(job.chat).take(now)
+            else:
+                frozen = self._frozen_until.get(_freeze_key(job), 0) - now
+                if frozen > 0:
+                    wait = frozen if wait is None else min(wait, frozen)
+                    continue
+            self._global.take(now)
+            return job, None
+        return None, wait
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._running:
+                    return
+                job, wait = self._pick(time.monotonic())
+                if job is None:
+                    self._cond.wait(wait)
+                    continue
+                self._remove(job)
+                if job.chat is not None:
+                    self._inflight.add(job.chat)
+            self._pool.submit(self._execute, job)
+
+    def _execute(self, job: _Job):
+        job.attempts += 1
+        retry_after = resp = None
+        try:
+            resp = self._send(*job.args, **job.kwargs)
+            retry_after = _retry_after(resp)
+            if retry_after is None or job.attempts > self.max_retries:
+                job.resolve(response=resp)
+        except BaseException as e:
+            job.resolve(error=e)
+
+        with self._cond:
+            self._inflight.discard(job.chat)
+            if not job.done.is_set() and not self._running:
+                # после stop() повторять некому — отдаём 429 как есть
+                job.resolve(response=resp)
+            if retry_after is not None and not job.done.is_set():
+                logger.warning(
+                    "telegram 429 on %s (chat %s): retry after %ss",
+                    job.method_name,
+                    job.chat,
+                    retry_after,
+                )
+                key = _freeze_key(job)
+                until = time.monotonic() + retry_after
+                self._frozen_until[key] = max(until, self._frozen_until.get(key, 0))
+                _rewind_files(job.kwargs.get("files"))
+                bisect.insort(self._queue, (job.prio, job.seq, job))
+            self._cond.notify_all()
+
+    def _requests_send(self, method, url, **kwargs):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session.request(method, url, **kwargs)
+
+
+def _freeze_key(job: _Job):
+    # 429 относится к чату, а у вызова без чата — к его методу
+    if job.chat is not None:
+        return job.chat
+    return ("method", job.method_name)
+
+
+def _retry_after(resp) -> float | None:
+    if getattr(resp, "status_code", 200) != 429:
+        return None
+    try:
+        return float(resp.json()["parameters"]["retry_after"])
+    except Exception:
+        return 1.0
+
+
+def _rewind_files(files):
+    # файлы уже вычитаны первой попыткой
+    for value in (files or {}).values():
+        f = value[1] if isinstance(value, tuple) else value
+        if hasattr(f, "seek"):
+            f.seek(0)
@@ -0,0 +1,112 @@
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import queries
+from .models import Outlet
+
+
+@dataclass(frozen=True)
+class OutletMeta:
+    group_id: int
+    name: str
+    is_active: bool
+
+
+class OutletCache:
+    # outlet_id -> (group_id, name, is_active). Точки почти не меняются, а
+    # group_id нужен на каждую проверку доступа и каждую запись в аудит.
+    # Сбрасывается явно при любом изменении Outlet через ORM (см. события
+    # внизу); TTL — только на случай нескольких процессов, где сброс из
+    # соседнего процесса сюда не долетает.
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 60.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[int, tuple[float, OutletMeta]] = OrderedDict()
+        self._lock = threading.Lock()
+        # растёт на каждый сброс: чтение, начатое до сброса, в кеш не кладём
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def configure(self, maxsize: int, ttl: float):
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+            self._data.clear()
+
+    def get(self, db: Session, outlet_id: int) -> OutletMeta | None:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(outlet_id)
+            if entry is not None and entry[0] > now:
+                self._data.move_to_end(outlet_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generation
+
+        row = queries.outlet_meta(db, outlet_id)
+        if row is None:
+            # несуществующие id не кешируем — их присылают только руками
+            return None
+        meta = OutletMeta(row.group_id, row.name, bool(row.is_active))
+        if self.maxsize <= 0:
+            return meta
+        with self._lock:
+            if generation == self._generation:
+                self._data[outlet_id] = (now + self.ttl, meta)
+                self._data.move_to_end(outlet_id)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return meta
+
+    def invalidate(self, *outlet_ids: int):
+        with self._lock:
+            self._generation += 1
+            for outlet_id in outlet_ids:
+                self._data.pop(outlet_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+outlet_cache = OutletCache()
+
+
+# Сброс по изменениям: создание, переименование, деактивация, удаление.
+# После flush — чтобы эта же сессия сразу увидела новое, и ещё раз после
+# commit/rollback — чтобы соседний поток не успел закешировать старую
+# строку между flush и commit. Массовые update()/delete() мимо ORM сюда
+# не попадают — после них нужен outlet_cache.invalidate(...) вручную.
+_DIRTY = "outlet_cache_dirty"
+
+
+@event.listens_for(Session, "after_flush")
+def _outlets_flushed(session, flush_context):
+    ids = [
+        obj.id
+        for obj in (*session.new, *session.dirty, *session.deleted)
+        if isinstance(obj, Outlet) and obj.id is not None
+    ]
+    if ids:
+        outlet_cache.invalidate(*ids)
+        session.info.setdefault(_DIRTY, set()).update(ids)
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_soft_rollback")
+def _outlets_committed(session, *args):
+    ids = session.info.pop(_DIRTY, None)
+    if ids:
+        outlet_cache.invalidate(*ids)
@@ -0,0 +1,222 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Профили апдейтов в проде, без передеплоя (PROFILE_SAMPLE_RATE /
+# PROFILE_SLOW_AFTER):
+#  - доля апдейтов целиком идёт под cProfile -> .prof (snakeviz, pstats)
+#    и .txt с верхом по cumulative;
+#  - любой апдейт дольше порога: фоновый поток раз в PROFILE_INTERVAL
+#    снимает стек его потока (только после порога — быстрые апдейты ничего
+#    не платят) -> .txt в формате collapsed stacks для flamegraph.
+# В имени файла — время, длительность, действие, пользователь и точка.
+# Хранится последние PROFILE_KEEP профилей, старые удаляются.
+
+_UNSAFE = re.compile(r"[^A-Za-z0-9_-]+")
+
+
+class _Watch:
+    __slots__ = ("thread_id", "started", "stacks")
+
+    def __init__(self, thread_id: int, started: float):
+        self.thread_id = thread_id
+        self.started = started
+        self.stacks: Counter[str] = Counter()
+
+
+class UpdateProfiler:
+    def __init__(
+        self,
+        directory: str,
+        sample_rate: float = 0.0,
+        slow_after: float = 0.0,
+        keep: int = 200,
+        interval: float = 0.005,
+    ):
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.slow_after = slow_after
+        self.keep = keep
+        self.interval = interval
+        self._watches: set[_Watch] = set()
+        self._lock = threading.Lock()
+        # cProfile — один на процесс: с Python 3.12 второй enable() из другого
+        # потока падает с ValueError ("Another profiling tool is already
+        # active")
+        self._cprofile_lock = threading.Lock()
+        self._files_lock = threading.Lock()
+        self._sampler: threading.Thread | None = None
+        # есть кого сэмплировать; без апдейтов поток спит
+        self._busy = threading.Event()
+        os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def profile(
+        self, action: str, user_id: int | None = None, outlet_id: int | None = None
+    ):
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        # занято — этот апдейт идёт как обычный (снимки стека, если включены)
+        if sampled and self._cprofile_lock.acquire(blocking=False):
+            try:
+                with self._cprofile(action, user_id, outlet_id):
+                    yield
+            finally:
+                self._cprofile_lock.release()
+        elif self.slow_after > 0:
+            with self._watch(action, user_id, outlet_id):
+                yield
+        else:
+            yield
+
+    @contextmanager
+    def _cprofile(self, action, user_id, outlet_id):
+        prof = cProfile.Profile()
+        started = time.perf_counter()
+        try:
+            prof.enable()
+        except ValueError:
+            # профилировщик уже включил кто-то вне бота — апдейт важнее
+            logger.debug("cProfile is busy, update not profiled", exc_info=True)
+            yield
+            return
+        try:
+            yield
+        finally:
+            prof.disable()
+            elapsed = time.perf_counter() - started
+            try:
+                self._dump_cprofile(prof, action, user_id, outlet_id, elapsed)
+            except Exception:
+                logger.exception("profile dump failed")
+
+    @contextmanager
+    def _watch(self, action, user_id, outlet_id):
+        watch = _Watch(threading.get_ident(), time.perf_counter())
+        with self._lock:
+            self._watches.add(watch)
+            self._busy.set()
+            self._ensure_sampler()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._watches.discard(watch)
+                if not self._watches:
+                    self._busy.clear()
+            elapsed = time.perf_counter() - watch.started
+            if elapsed >= self.slow_after and watch.stacks:
+                try:
+                    self._dump_stacks(watch, action, user_id, outlet_id, elapsed)
+                except Exception:
+                    logger.exception("profile dump failed")
+
+    # ---------------------------
+    # Сэмплер стеков
+    # ---------------------------
+    def _ensure_sampler(self):
+        # под self._lock
+        if self._sampler is None:
+            self._sampler = threading.Thread(
+                target=self._sample_loop, name="profiler", daemon=True
+            )
+            self._sampler.start()
+
+    def _sample_loop(self):
+        while True:
+            self._busy.wait()
+            time.sleep(self.interval)
+            now = time.perf_counter()
+            with self._lock:
+                slow = [
+                    w for w in self._watches if now - w.started >= self.slow_after
+                ]
+            if not slow:
+                continue
+            frames = sys._current_frames()
+            for w in slow:
+                frame = frames.get(w.thread_id)
+                if frame is not None:
+                    w.stacks[_collapse(frame)] += 1
+
+    # ---------------------------
+    # Файлы
+    # ---------------------------
+    def _base_name(self, action, user_id, outlet_id, elapsed) -> str:
+        now = time.time()
+        ts = time.strftime("%Y%m%d-%H%M%S", time.localtime(now))
+        ts += f"-{int(now * 1000) % 1000:03d}"
+        parts = [
+            ts,
+            f"{elapsed * 1000:.0f}ms",
+            _UNSAFE.sub("_", action) or "update",
+            f"u{user_id}" if user_id is not None else "u-",
+            f"o{outlet_id}" if outlet_id is not None else "o-",
+        ]
+        return os.path.join(self.directory, "_".join(parts))
+
+    def _header(self, action, user_id, outlet_id, elapsed) -> str:
+        return (
+            f"# action={action} user={user_id} outlet={outlet_id} "
+            f"elapsed_ms={elapsed * 1000:.1f}\n"
+        )
+
+    def _dump_cprofile(self, prof, action, user_id, outlet_id, elapsed):
+        base = self._base_name(action, user_id, outlet_id, elapsed)
+        prof.dump_stats(base + ".prof")
+        out = io.StringIO()
+        pstats.Stats(prof, stream=out).sort_stats("cumulative").print_stats(40)
+        with open(base + ".txt", "w", encoding="utf-8") as f:
+            f.write(self._header(action, user_id, outlet_id, elapsed))
+            f.write(out.getvalue())
+        self._rotate()
+
+    def _dump_stacks(self, watch, action, user_id, outlet_id, elapsed):
+        base = self._base_name(action, user_id, outlet_id, elapsed)
+        with open(base + ".stacks.txt", "w", encoding="utf-8") as f:
+            f.write(self._header(action, user_id, outlet_id, elapsed))
+            f.write(f"# samples every {self.interval * 1000:g} ms after the threshold\n")
+            for stack, n in watch.stacks.most_common():
+                f.write(f"{stack} {n}\n")
+        logger.warning(
+            "slow update %s (%.0f ms), stacks in %s", action, elapsed * 1000, base
+        )
+        self._rotate()
+
+    def _rotate(self):
+        # профиль — это все файлы с одним префиксом (.prof + .txt)
+        with self._files_lock:
+            try:
+                names = os.listdir(self.directory)
+            except FileNotFoundError:
+                return
+            groups: dict[str, list[str]] = {}
+            for name in names:
+                groups.setdefault(name.split(".", 1)[0], []).append(name)
+            for prefix in sorted(groups)[: max(0, len(groups) - self.keep)]:
+                for name in groups[prefix]:
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except OSError:
+                        pass
+
+
+def _collapse(frame) -> str:
+    # корень слева, как ждёт flamegraph.pl / speedscope
+    parts = []
+    while frame is not None:
+        code = frame.f_code
+        where = f"{os.path.basename(code.co_filename)}:{frame.f_lineno}"
+        parts.append(f"{code.co_name} ({where})")
+        frame = frame.f_back
+    return ";".join(reversed(parts))
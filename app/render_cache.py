@@ -0,0 +1,55 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+def render_fingerprint(text: str, kb=None) -> bytes:
+    if kb is None:
+        markup = ""
+    elif isinstance(kb, str):
+        markup = kb
+    else:
+        markup = kb.to_json()
+    return hashlib.blake2b(
+        f"{text}\0{markup}".encode("utf-8"), digest_size=16
+    ).digest()
+
+
+class RenderCache:
+    # (chat_id, message_id) -> отпечаток последнего отрисованного текста и
+    # клавиатуры. Если повторная отрисовка совпадает — edit не шлём вовсе.
+    # LRU, чтобы не расти вместе с числом сообщений.
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: OrderedDict[tuple[int, int], bytes] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def is_current(self, chat_id: int, message_id: int, fp: bytes) -> bool:
+        key = (chat_id, message_id)
+        with self._lock:
+            if self._data.get(key) == fp:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def remember(self, chat_id: int, message_id: int, fp: bytes):
+        if self.maxsize <= 0:
+            return
+        key = (chat_id, message_id)
+        with self._lock:
+            self._data[key] = fp
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def forget(self, chat_id: int, message_id: int):
+        with self._lock:
+            self._data.pop((chat_id, message_id), None)
+
+    def __len__(self) -> int:
+        return len(self._data)
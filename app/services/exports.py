@@ -0,0 +1,26 @@
+from datetime import datetime
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ..models import ExportWatermark
+
+
+def get_watermark(db: Session, user_id: int, outlet_id: int) -> datetime | None:
+    return db.scalar(
+        select(ExportWatermark.exported_until).where(
+            ExportWatermark.user_id == user_id, ExportWatermark.outlet_id == outlet_id
+        )
+    )
+
+
+def set_watermark(db: Session, user_id: int, outlet_id: int, until: datetime):
+    mark = db.scalar(
+        select(ExportWatermark).where(
+            ExportWatermark.user_id == user_id, ExportWatermark.outlet_id == outlet_id
+        )
+    )
+    if mark:
+        # watermark только двигается вперёд
+        if mark.exported_until < until:
+            mark.exported_until = until
+        return
+    db.add(ExportWatermark(user_id=user_id, outlet_id=outlet_id, exported_until=until))
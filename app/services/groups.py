@@ -13,8 +13,7 @@ def create_group(db: Session, creator_user_id: int, name: str) -> Group:
         group_id=g.id, user_id=creator_user_id, role=GroupRole.GROUP_OWNER
     )
     db.add(gm)
-    db.commit()
-    db.refresh(g)
+    db.flush()
     return g
 
 
@@ -32,6 +31,5 @@ def create_outlet(
 ) -> Outlet:
     o = Outlet(group_id=group_id, name=name, address=address)
     db.add(o)
-    db.commit()
-    db.refresh(o)
+    db.flush()
     return o
@@ -1,6 +1,7 @@
 from datetime import datetime
 from sqlalchemy import select
 from sqlalchemy.orm import Session
+from .. import queries
 from ..models import Item, StockBalance
 
 SORT_ALPHA = "alpha"
@@ -24,16 +25,7 @@ def list_balances(db: Session, outlet_id: int) -> list[tuple[str, str, float]]:
 
 
 def list_items(db: Session, outlet_id: int, sort: str = SORT_ALPHA) -> list[Item]:
-    q = select(Item).where(Item.outlet_id == outlet_id, Item.is_active == True)
-
-    if sort == SORT_CREATED:
-        q = q.order_by(Item.created_at.desc(), Item.id.desc())
-    elif sort == SORT_UPDATED:
-        q = q.order_by(Item.updated_at.desc(), Item.id.desc())
-    else:
-        q = q.order_by(Item.name.asc())
-
-    return db.scalars(q).all()
+    return queries.active_items(db, outlet_id, sort)
 
 
 def create_item(db: Session, outlet_id: int, name: str, unit: str) -> Item:
@@ -46,69 +38,54 @@ def create_item(db: Session, outlet_id: int, name: str, unit: str) -> Item:
         updated_at=now,
     )
     db.add(item)
-    db.commit()
-    db.refresh(item)
+    db.flush()
     return item
 
 
 def update_item(
     db: Session, outlet_id: int, item_id: int, name: str, unit: str
 ) -> Item | None:
-    item = db.scalar(
-        select(Item).where(
-            Item.id == item_id, Item.outlet_id == outlet_id, Item.is_active == True
-        )
-    )
+    item = queries.active_item(db, outlet_id, item_id)
     if not item:
         return None
     item.name = name.strip()
     item.unit = unit.strip()
     item.updated_at = datetime.utcnow()
-    db.commit()
-    db.refresh(item)
+    db.flush()
     return item
 
 
 def delete_item(db: Session, outlet_id: int, item_id: int) -> bool:
-    item = db.scalar(
-        select(Item).where(
-            Item.id == item_id, Item.outlet_id == outlet_id, Item.is_active == True
-        )
-    )
+    item = queries.active_item(db, outlet_id, item_id)
     if not item:
         return False
     item.is_active = False
     item.updated_at = datetime.utcnow()
-    db.commit()
+    db.flush()
     return True
 
 
 def get_or_create_balance(db: Session, outlet_id: int, item_id: int) -> StockBalance:
-    bal = db.scalar(
-        select(StockBalance).where(
-            StockBalance.outlet_id == outlet_id, StockBalance.item_id == item_id
-        )
-    )
+    bal = queries.balance(db, outlet_id, item_id)
     if bal:
         return bal
     bal = StockBalance(outlet_id=outlet_id, item_id=item_id, quantity=0)
     db.add(bal)
-    db.commit()
-    db.refresh(bal)
+    db.flush()
     return bal
 
 
 def set_quantity(db: Session, outlet_id: int, item_id: int, qty: float) -> float:
     bal = get_or_create_balance(db, outlet_id, item_id)
     bal.quantity = qty
-    db.commit()
+    db.flush()
     return float(bal.quantity)
 
 
 def add_delta(db: Session, outlet_id: int, item_id: int, delta: float) -> float:
     bal = get_or_create_balance(db, outlet_id, item_id)
     bal.quantity = float(bal.quantity) + delta
-    db.commit()
+    db.flush()
     return float(bal.quantity)
 
 
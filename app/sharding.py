@@ -0,0 +1,382 @@
+import bisect
+import hashlib
+import itertools
+import logging
+import multiprocessing as mp
+import signal
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import replace
+from queue import SimpleQueue
+from typing import Hashable
+
+from telebot import apihelper, types
+
+from . import metrics
+from .bot import SHED_TEXT
+from .config import Config
+
+logger = logging.getLogger(__name__)
+
+# Многопроцессный режим (BOT_SHARDS > 0).
+# Фронт (этот процесс) только принимает апдейты — polling или webhook — и
+# раскладывает их по N воркер-процессам по consistent hash от chat id.
+# Воркер — обычный BotApp со своим пулом, движком БД и планировщиком
+# исходящих; общая у всех только база. Один чат всегда попадает в один
+# воркер, поэтому порядок внутри чата сохраняется.
+#
+# Доставка — at-least-once: фронт держит апдейт, пока воркер не подтвердит,
+# что обработал его (ack). Упал или перезапущен воркер — фронт поднимает
+# новый и переотправляет всё неподтверждённое в исходном порядке. Апдейт,
+# закоммиченный, но не успевший получить ack, воркер узнаёт по сохранённому
+# update_id чата и второй раз не применяет (app/applied_updates.py).
+
+
+def raw_update_key(payload: dict) -> Hashable:
+    # то же, что dispatch.update_key, но по сырому JSON апдейта
+    msg = payload.get("message") or payload.get("edited_message")
+    if msg is not None:
+        return ("chat", msg["chat"]["id"])
+    cq = payload.get("callback_query")
+    if cq is not None:
+        if cq.get("message") is not None:
+            return ("chat", cq["message"]["chat"]["id"])
+        return ("user", cq["from"]["id"])
+    return ("update", payload.get("update_id"))
+
+
+class HashRing:
+    # consistent hashing: при смене числа шардов переезжает ~1/N ключей
+    def __init__(self, nodes, vnodes: int = 64):
+        self._ring: list[tuple[int, int]] = sorted(
+            (_hash(f"{node}#{v}"), node) for node in nodes for v in range(vnodes)
+        )
+        self._points = [p for p, _ in self._ring]
+
+    def node_for(self, key: Hashable) -> int:
+        i = bisect.bisect(self._points, _hash(repr(key))) % len(self._ring)
+        return self._ring[i][1]
+
+
+def _hash(s: str) -> int:
+    return int.from_bytes(hashlib.blake2b(s.encode(), digest_size=8).digest(), "big")
+
+
+class _Shard:
+    def __init__(self, index: int):
+        self.index = index
+        self.proc = None
+        # очередь на отправку в текущий процесс; пишет в pipe отдельный поток,
+        # чтобы submit не блокировался на IO под локом (и не ловил дедлок
+        # с потоком ack'ов, когда pipe забит)
+        self.outbox: SimpleQueue | None = None
+        self.cond = threading.Condition()
+        # seq -> payload, в порядке отправки; удаляется по ack
+        self.unacked: OrderedDict[int, dict] = OrderedDict()
+        self.restarts = 0
+        self.started_at = 0.0
+        self.crash_loop = 0  # падений подряд сразу после старта
+
+
+class ShardFront:
+    def __init__(self, cfg: Config, shards: int, max_unacked: int):
+        self.cfg = cfg
+        self.max_unacked = max(1, max_unacked)
+        self._ctx = mp.get_context("spawn")
+        self._ring = HashRing(range(shards))
+        self._shards = [_Shard(i) for i in range(shards)]
+        self._seq = itertools.count()
+        self._running = False
+        metrics.queue_depth.set_function(self.unacked)
+
+    def start(self):
+        self._running = True
+        for shard in self._shards:
+            with shard.cond:
+                self._spawn(shard)
+
+    def submit(self, payload: dict):
+        metrics.updates_received.inc(_payload_kind(payload))
+        shard = self._shards[self._ring.node_for(raw_update_key(payload))]
+        with shard.cond:
+            full = len(shard.unacked) >= self.max_unacked
+        if full and self.cfg.overflow == "shed" and self._shed(payload):
+            return
+        with shard.cond:
+            # обратное давление: воркер не успевает — фронт ждёт
+            while len(shard.unacked) >= self.max_unacked:
+                shard.cond.wait()
+            seq = next(self._seq)
+            shard.unacked[seq] = payload
+            shard.outbox.put((seq, payload))
+
+    def _shed(self, payload: dict) -> bool:
+        # как BotApp.shed_update, но по сырому апдейту
+        cq = payload.get("callback_query")
+        if cq is None:
+            return False
+        metrics.updates_shed.inc()
+        try:
+            apihelper.answer_callback_query(self.cfg.bot_token, cq["id"], SHED_TEXT)
+        except Exception:
+            logger.debug("shed: answerCallbackQuery failed", exc_info=True)
+        return True
+
+    def unacked(self) -> int:
+        return sum(len(s.unacked) for s in self._shards)
+
+    def restart(self, index: int):
+        # мягкий перезапуск: воркер дорабатывает текущее и выходит,
+        # неподтверждённое уйдёт в новый процесс
+        shard = self._shards[index]
+        with shard.cond:
+            shard.outbox.put(None)
+
+    def stop_intake(self):
+        # poll() выходит после текущего getUpdates
+        self._running = False
+
+    def stop(self, timeout: float | None = 30):
+        # воркеры дорабатывают свои очереди и выходят
+        self._running = False
+        for shard in self._shards:
+            with shard.cond:
+                shard.outbox.put(None)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for shard in self._shards:
+            left = None if deadline is None else max(0, deadline - time.monotonic())
+            shard.proc.join(left)
+            if shard.proc.is_alive():
+                logger.warning("shard %s did not stop in time", shard.index)
+                shard.proc.terminate()
+            if shard.unacked:
+                logger.warning(
+                    "shard %s: %s updates left unprocessed",
+                    shard.index,
+                    len(shard.unacked),
+                )
+
+    def poll(self, timeout: int = 20):
+        # long polling на фронте; offset двигается сразу после раздачи —
+        # дальше за апдейт отвечает фронт (unacked), а не Telegram
+        token = self.cfg.bot_token
+        apihelper.delete_webhook(token)
+        # skip_pending, как и в однопроцессном режиме
+        last = apihelper.get_updates(token, offset=-1, timeout=0)
+        offset = last[-1]["update_id"] + 1 if last else None
+        while self._running:
+            try:
+                updates = apihelper.get_updates(
+                    token, offset=offset, timeout=timeout, long_polling_timeout=timeout
+                )
+            except Exception:
+                logger.exception("getUpdates failed")
+                time.sleep(3)
+                continue
+            for payload in updates:
+                self.submit(payload)
+                offset = payload["update_id"] + 1
+
+    # ---------------------------
+    # Workers
+    # ---------------------------
+    def _spawn(self, shard: _Shard):
+        # под shard.cond
+        parent, child = self._ctx.Pipe()
+        proc = self._ctx.Process(
+            target=_worker_main,
+            args=(shard.index, self._worker_cfg(shard.index), child),
+            name=f"bot-shard-{shard.index}",
+            daemon=True,
+        )
+        proc.start()
+        # своя копия дочернего конца не нужна: иначе не увидим EOF
+        child.close()
+
+        if shard.outbox is not None:
+            # старый отправитель ещё может ждать очередь — отпускаем
+            shard.outbox.put(None)
+        outbox = SimpleQueue()
+        for seq, payload in shard.unacked.items():
+            outbox.put((seq, payload))
+        if shard.unacked:
+            logger.warning(
+                "shard %s: replaying %s unacked updates",
+                shard.index,
+                len(shard.unacked),
+            )
+        shard.proc, shard.outbox = proc, outbox
+        shard.started_at = time.monotonic()
+
+        threading.Thread(
+            target=self._sender,
+            args=(parent, outbox),
+            name=f"shard-{shard.index}-send",
+            daemon=True,
+        ).start()
+        threading.Thread(
+            target=self._reader,
+            args=(shard, parent),
+            name=f"shard-{shard.index}-acks",
+            daemon=True,
+        ).start()
+
+    def _sender(self, conn, outbox: SimpleQueue):
+        while True:
+            msg = outbox.get()
+            try:
+                conn.send(msg)
+            except OSError:
+                # процесс умер; всё неподтверждённое переотправит _spawn
+                return
+            if msg is None:
+                return
+
+    def _worker_cfg(self, index: int) -> Config:
+        # общий лимит Telegram и пул соединений с базой делим между процессами;
+        # метрики — на своём порту у каждого воркера
+        n = len(self._shards)
+        return replace(
+            self.cfg,
+            tg_global_rate=self.cfg.tg_global_rate / n,
+            db_pool_size=max(1, self.cfg.db_pool_size // n),
+            db_max_overflow=self.cfg.db_max_overflow // n,
+            metrics_port=self.cfg.metrics_port + 1 + index
+            if self.cfg.metrics_port
+            else 0,
+        )
+
+    def _reader(self, shard: _Shard, conn):
+        while True:
+            try:
+                seq = conn.recv()
+            except (EOFError, OSError):
+                break
+            with shard.cond:
+                shard.unacked.pop(seq, None)
+                shard.cond.notify_all()
+
+        shard.proc.join(5)
+        conn.close()
+        if not self._running:
+            return
+        # падает сразу после старта — не перезапускаем в цикле без паузы
+        if time.monotonic() - shard.started_at < 10:
+            shard.crash_loop += 1
+            time.sleep(min(30.0, 0.5 * 2**shard.crash_loop))
+        else:
+            shard.crash_loop = 0
+        with shard.cond:
+            if not self._running:
+                return
+            shard.restarts += 1
+            logger.warning(
+                "shard %s exited (code %s), restarting",
+                shard.index,
+                shard.proc.exitcode,
+            )
+            self._spawn(shard)
+
+
+def _payload_kind(payload: dict) -> str:
+    # как metrics.update_kind, но по сырому апдейту
+    if "callback_query" in payload:
+        return "callback_query"
+    if "message" in payload:
+        return "message"
+    return "other"
+
+
+def _worker_main(index: int, cfg: Config, conn):
+    # отдельный процесс: всё своё, кроме базы
+    from .bot import BotApp, DispatchingTeleBot
+    from .db import engine_from_config, make_session_factory, read_engine_from_config
+    from .dispatch import UpdateDispatcher, update_key
+    from .outbound import OutboundScheduler
+    from .state_store import make_state_store
+
+    # Ctrl+C ловит фронт и останавливает воркеры сам
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    engine = engine_from_config(cfg)
+    session_factory = make_session_factory(engine)
+    read_engine = read_engine_from_config(cfg)
+    if cfg.metrics_port:
+        metrics.watch_pool("main", engine)
+        if read_engine is not None:
+            metrics.watch_pool("read", read_engine)
+        metrics.start_metrics_server(cfg.metrics_host, cfg.metrics_port)
+    scheduler = OutboundScheduler(
+        global_rate=cfg.tg_global_rate,
+        chat_rate=cfg.tg_chat_rate,
+        group_rate=cfg.tg_group_rate,
+        senders=cfg.tg_senders,
+    ).install()
+    state_store = make_state_store(
+        cfg.state_store,
+        session_factory,
+        cfg.state_max_users,
+        cfg.state_ttl,
+        cfg.state_flush_interval,
+        shared=True,
+    )
+
+    send_lock = threading.Lock()
+
+    def ack(seq):
+        with send_lock:
+            conn.send(seq)
+
+    def handle(item):
+        seq, update = item
+        try:
+            app.process_once(update)
+        finally:
+            ack(seq)
+
+    def shed(item):
+        # сброшенный апдейт тоже подтверждаем — иначе фронт его переотправит
+        seq, update = item
+        if not app.shed_update(update):
+            return False
+        ack(seq)
+        return True
+
+    bot = DispatchingTeleBot(cfg.bot_token, threaded=False)
+    bot.dispatcher = UpdateDispatcher(
+        handle,
+        cfg.workers,
+        cfg.queue_size,
+        key=lambda item: update_key(item[1]),
+        overflow=cfg.overflow,
+        stale_after=cfg.stale_callback_age,
+        shed=shed,
+    )
+    app = BotApp(
+        cfg,
+        session_factory,
+        bot=bot,
+        state_store=state_store,
+        read_session_factory=read_engine and make_session_factory(read_engine),
+    )
+    bot.dispatcher.start()
+    logger.info("shard %s started", index)
+
+    while True:
+        try:
+            msg = conn.recv()
+        except EOFError:
+            break
+        if msg is None:
+            break
+        seq, payload = msg
+        bot.dispatcher.submit((seq, types.Update.de_json(payload)))
+
+    app.drain(cfg.drain_timeout)
+    scheduler.stop()
+    state_store.close()
+    engine.dispose()
+    if read_engine is not None:
+        read_engine.dispose()
+    conn.close()
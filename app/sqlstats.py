@@ -0,0 +1,128 @@
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+logger = logging.getLogger(__name__)
+
+# Сколько SQL стоит одно нажатие: число запросов, суммарное время в базе и
+# самый медленный запрос — с пометкой, какой хендлер и какое действие
+# (i:qty, i:open, text:set_qty, ...). Слушатели курсора ставит app/db.py на
+# каждый движок; пишут они во все открытые сборщики текущего контекста.
+# Контекст — contextvars, поэтому потоки воркеров друг другу не мешают.
+
+# список значений IN (...) разной длины — одна и та же форма запроса
+_PLACEHOLDERS = re.compile(r"\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+|\$\d+)\s*,?)+\)")
+
+
+def statement_shape(statement: str) -> str:
+    return _PLACEHOLDERS.sub("(?)", " ".join(statement.split()))
+
+
+class SqlStats:
+    def __init__(self, handler: str = "", action: str = ""):
+        self.handler = handler
+        self.action = action
+        self.count = 0
+        self.total = 0.0
+        self.slowest = 0.0
+        self.slowest_statement = ""
+        self.shapes: Counter[str] = Counter()
+
+    def record(self, statement: str, elapsed: float):
+        self.count += 1
+        self.total += elapsed
+        if elapsed > self.slowest:
+            self.slowest = elapsed
+            self.slowest_statement = statement
+        self.shapes[statement_shape(statement)] += 1
+
+    def repeated(self, limit: int) -> list[tuple[str, int]]:
+        # формы, выполненные больше limit раз — похоже на запрос в цикле (N+1)
+        return [(s, n) for s, n in self.shapes.most_common() if n > limit]
+
+    def summary(self) -> str:
+        return (
+            f"{self.count} queries, {self.total * 1000:.0f} ms, slowest "
+            f"{self.slowest * 1000:.0f} ms: {_short(self.slowest_statement)}"
+        )
+
+
+_collectors: ContextVar[tuple[SqlStats, ...]] = ContextVar(
+    "sqlstats_collectors", default=()
+)
+
+
+@contextmanager
+def _collect(stats: SqlStats):
+    token = _collectors.set(_collectors.get() + (stats,))
+    try:
+        yield stats
+    finally:
+        _collectors.reset(token)
+
+
+@contextmanager
+def track(
+    handler: str,
+    action: str,
+    warn_queries: int = 0,
+    warn_time: float = 0.0,
+    warn_repeats: int = 0,
+):
+    # один апдейт; пороги 0 — не предупреждать
+    with _collect(SqlStats(handler, action)) as stats:
+        yield stats
+    repeated = stats.repeated(warn_repeats) if warn_repeats > 0 else []
+    if (
+        (warn_queries > 0 and stats.count > warn_queries)
+        or (warn_time > 0 and stats.total > warn_time)
+        or repeated
+    ):
+        logger.warning(
+            "expensive update %s %s: %s%s",
+            handler,
+            action,
+            stats.summary(),
+            "".join(f"\n  repeated {n}x: {_short(s)}" for s, n in repeated),
+        )
+
+
+@contextmanager
+def assert_query_budget(max_queries: int, max_repeats: int = 1):
+    # для проверок и бенчмарков: всё, что выполнено внутри блока, должно
+    # уложиться в max_queries, и ни одна форма запроса — не чаще max_repeats
+    with _collect(SqlStats("budget", "")) as stats:
+        yield stats
+    problems = []
+    if stats.count > max_queries:
+        problems.append(f"{stats.count} queries > budget {max_queries}")
+    problems.extend(
+        f"repeated {n}x (> {max_repeats}): {_short(s)}"
+        for s, n in stats.repeated(max_repeats)
+    )
+    if problems:
+        raise AssertionError("; ".join(problems))
+
+
+def _short(statement: str, limit: int = 200) -> str:
+    statement = " ".join(statement.split())
+    return statement if len(statement) <= limit else statement[:limit] + "…"
+
+
+# слушатели движка (ставит app/db.py); время начала — на контексте
+# выполнения, чтобы упавший запрос ничего не оставлял за собой
+def before_cursor_execute(conn, cursor, statement, params, context, executemany):
+    if context is not None and _collectors.get():
+        context._sqlstats_start = time.perf_counter()
+
+
+def after_cursor_execute(conn, cursor, statement, params, context, executemany):
+    start = getattr(context, "_sqlstats_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    for stats in _collectors.get():
+        stats.record(statement, elapsed)
@@ -0,0 +1,334 @@
+import json
+import logging
+import socket
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+from sqlalchemy import delete, select
+
+from .models import DialogState
+
+logger = logging.getLogger(__name__)
+
+# Хранилище состояния диалогов (tg_user_id -> dict: mode, outlet_id, sort, ...).
+# get() всегда отдаёт копию; пустой dict в put() равносилен delete().
+#   MemoryStateStore — LRU + TTL в памяти процесса;
+#   SqlStateStore    — таблица dialog_states (переживает рестарт);
+#   RedisStateStore  — любой сервер с протоколом Redis (общий для процессов).
+# Персистентные варианты в одном процессе читают через локальный LRU, а
+# пишут пачками в фоне (write-behind): одна транзакция / один pipeline на
+# flush_interval. С shared=True (несколько процессов, BOT_SHARDS) локального
+# слоя нет: состояние пользователя может читать другой воркер — например,
+# из группового чата, который попал на другой шард, — поэтому каждое get()
+# идёт в хранилище, а put() пишется сразу.
+
+
+class StateStore(ABC):
+    @abstractmethod
+    def get(self, key: int) -> dict: ...
+
+    @abstractmethod
+    def put(self, key: int, state: dict): ...
+
+    def delete(self, key: int):
+        self.put(key, {})
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.flush()
+
+
+class MemoryStateStore(StateStore):
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # key -> (state, monotonic-время протухания)
+        self._data: OrderedDict[int, tuple[dict, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: int) -> dict:
+        state = self.peek(key)
+        return dict(state) if state is not None else {}
+
+    def peek(self, key: int) -> dict | None:
+        # None — ключа нет (в отличие от пустого состояния)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            state, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return state
+
+    def put(self, key: int, state: dict):
+        with self._lock:
+            self._data[key] = (dict(state), time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class _WriteBehindStore(StateStore):
+    # общий каркас: локальный LRU + фоновая пачечная запись
+    def __init__(
+        self, maxsize: int, ttl: float, flush_interval: float, shared: bool = False
+    ):
+        self.ttl = ttl
+        self.shared = shared
+        self._cache = MemoryStateStore(maxsize, ttl)
+        self._dirty: dict[int, dict] = {}
+        self._dirty_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._loop, args=(flush_interval,), name="state-flush", daemon=True
+        )
+        self._thread.start()
+
+    def get(self, key: int) -> dict:
+        if self.shared:
+            return self._load(key) or {}
+        state = self._cache.peek(key)
+        if state is None:
+            with self._dirty_lock:
+                state = self._dirty.get(key)
+            if state is None:
+                state = self._load(key) or {}
+            self._cache.put(key, state)
+        return dict(state)
+
+    def put(self, key: int, state: dict):
+        state = dict(state)
+        if self.shared:
+            self._write_batch({key: state})
+            return
+        self._cache.put(key, state)
+        with self._dirty_lock:
+            self._dirty[key] = state
+
+    def flush(self):
+        with self._flush_lock:
+            with self._dirty_lock:
+                batch, self._dirty = self._dirty, {}
+            if not batch:
+                return
+            try:
+                self._write_batch(batch)
+            except Exception:
+                # вернём в очередь, если за это время не перезаписали
+                with self._dirty_lock:
+                    for key, state in batch.items():
+                        self._dirty.setdefault(key, state)
+                raise
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.flush()
+
+    def _loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("state store flush failed")
+
+    @abstractmethod
+    def _load(self, key: int) -> dict | None: ...
+
+    @abstractmethod
+    def _write_batch(self, batch: dict[int, dict]): ...
+
+
+class SqlStateStore(_WriteBehindStore):
+    def __init__(
+        self,
+        session_factory,
+        maxsize: int,
+        ttl: float,
+        flush_interval: float,
+        shared: bool = False,
+    ):
+        self.Session = session_factory
+        self._last_purge = 0.0
+        super().__init__(maxsize, ttl, flush_interval, shared)
+
+    def _load(self, key: int) -> dict | None:
+        with self.Session() as db:
+            row = db.execute(
+                select(DialogState.data, DialogState.updated_at).where(
+                    DialogState.tg_user_id == key
+                )
+            ).first()
+        if row is None or row.updated_at < datetime.utcnow() - timedelta(seconds=self.ttl):
+            return None
+        return json.loads(row.data)
+
+    def _write_batch(self, batch: dict[int, dict]):
+        now = datetime.utcnow()
+        with self.Session() as db:
+            gone = [key for key, state in batch.items() if not state]
+            if gone:
+                db.execute(delete(DialogState).where(DialogState.tg_user_id.in_(gone)))
+            for key, state in batch.items():
+                if state:
+                    db.merge(
+                        DialogState(
+                            tg_user_id=key,
+                            data=json.dumps(state, ensure_ascii=False),
+                            updated_at=now,
+                        )
+                    )
+            # протухшие строки чистим не чаще раза в ttl/10
+            if time.monotonic() - self._last_purge > self.ttl / 10:
+                db.execute(
+                    delete(DialogState).where(
+                        DialogState.updated_at < now - timedelta(seconds=self.ttl)
+                    )
+                )
+                self._last_purge = time.monotonic()
+            db.commit()
+
+
+class RedisStateStore(_WriteBehindStore):
+    # Минимальный клиент RESP2 (GET / SET EX / DEL) без внешних зависимостей
+    def __init__(
+        self,
+        url: str,
+        maxsize: int,
+        ttl: float,
+        flush_interval: float,
+        shared: bool = False,
+        prefix: str = "stockbot:state:",
+    ):
+        u = urlparse(url)
+        self._addr = (u.hostname or "127.0.0.1", u.port or 6379)
+        self._password = u.password
+        self._db = int((u.path or "/0").lstrip("/") or 0)
+        self.prefix = prefix
+        self._sock: socket.socket | None = None
+        self._rfile = None
+        self._io_lock = threading.Lock()
+        super().__init__(maxsize, ttl, flush_interval, shared)
+
+    def _load(self, key: int) -> dict | None:
+        (raw,) = self._pipeline([("GET", self.prefix + str(key))])
+        return json.loads(raw) if raw else None
+
+    def _write_batch(self, batch: dict[int, dict]):
+        cmds = []
+        for key, state in batch.items():
+            name = self.prefix + str(key)
+            if state:
+                data = json.dumps(state, ensure_ascii=False)
+                cmds.append(("SET", name, data, "EX", str(int(self.ttl))))
+            else:
+                cmds.append(("DEL", name))
+        self._pipeline(cmds)
+
+    def close(self):
+        super().close()
+        with self._io_lock:
+            self._disconnect()
+
+    # ---------------------------
+    # RESP
+    # ---------------------------
+    def _pipeline(self, cmds: list[tuple]) -> list:
+        with self._io_lock:
+            try:
+                return self._roundtrip(cmds)
+            except OSError:
+                # соединение могло умереть — одна попытка переподключиться
+                self._disconnect()
+                return self._roundtrip(cmds)
+
+    def _roundtrip(self, cmds: list[tuple]) -> list:
+        if self._sock is None:
+            self._connect()
+        self._sock.sendall(b"".join(_encode(c) for c in cmds))
+        return [self._read_reply() for _ in cmds]
+
+    def _connect(self):
+        self._sock = socket.create_connection(self._addr, timeout=5)
+        self._rfile = self._sock.makefile("rb")
+        init = []
+        if self._password:
+            init.append(("AUTH", self._password))
+        if self._db:
+            init.append(("SELECT", str(self._db)))
+        if init:
+            self._sock.sendall(b"".join(_encode(c) for c in init))
+            for _ in init:
+                self._read_reply()
+
+    def _disconnect(self):
+        if self._sock is not None:
+            try:
+                self._rfile.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._rfile = None
+
+    def _read_reply(self):
+        line = self._rfile.readline()
+        if not line:
+            raise ConnectionError("redis connection closed")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode()
+        if kind == b"-":
+            raise RuntimeError(f"redis error: {body.decode()}")
+        if kind == b":":
+            return int(body)
+        if kind == b"$":
+            n = int(body)
+            if n < 0:
+                return None
+            data = self._rfile.read(n + 2)
+            return data[:-2].decode("utf-8")
+        if kind == b"*":
+            n = int(body)
+            return None if n < 0 else [self._read_reply() for _ in range(n)]
+        raise ConnectionError(f"unexpected redis reply: {line!r}")
+
+
+def _encode(cmd: tuple) -> bytes:
+    parts = [f"*{len(cmd)}\r\n".encode()]
+    for arg in cmd:
+        b = arg.encode("utf-8") if isinstance(arg, str) else bytes(arg)
+        parts.append(b"$%d\r\n%s\r\n" % (len(b), b))
+    return b"".join(parts)
+
+
+def make_state_store(
+    url: str,
+    session_factory,
+    maxsize: int,
+    ttl: float,
+    flush_interval: float,
+    shared: bool = False,
+) -> StateStore:
+    # url: "memory" | "sql" | "redis://host:port/db"
+    # shared — хранилище читают и пишут несколько процессов
+    if url == "memory":
+        return MemoryStateStore(maxsize, ttl)
+    if url == "sql":
+        return SqlStateStore(session_factory, maxsize, ttl, flush_interval, shared)
+    if url.startswith("redis://"):
+        return RedisStateStore(url, maxsize, ttl, flush_interval, shared)
+    raise RuntimeError(f"unknown state store: {url!r}")
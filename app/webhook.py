@@ -0,0 +1,67 @@
+import hmac
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable
+
+from telebot import types
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+MAX_BODY = 1024 * 1024
+
+
+def make_webhook_server(
+    host: str,
+    port: int,
+    path: str,
+    secret: str,
+    submit: Callable[[types.Update], None],
+    raw: bool = False,
+) -> ThreadingHTTPServer:
+    # Принимает апдейты от Telegram: проверяет секрет (обязателен), кладёт
+    # апдейт в пул обработчиков и сразу отвечает 200 — обработка идёт уже
+    # асинхронно.
+    # raw=True — submit получает JSON апдейта как dict (шардирование).
+    # Локально проверяется так:
+    #   curl -X POST -H "X-Telegram-Bot-Api-Secret-Token: $SECRET" \
+    #        --data @update.json http://127.0.0.1:8080/webhook
+    if not secret:
+        raise ValueError("webhook server needs a secret token")
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            if self.path.split("?", 1)[0] != path:
+                return self._reply(404)
+            if not hmac.compare_digest(self.headers.get(SECRET_HEADER, ""), secret):
+                return self._reply(403)
+
+            length = int(self.headers.get("Content-Length") or 0)
+            if length <= 0 or length > MAX_BODY:
+                return self._reply(400)
+            try:
+                payload = json.loads(self.rfile.read(length))
+                update = payload if raw else types.Update.de_json(payload)
+            except Exception:
+                logger.warning("webhook: bad update payload", exc_info=True)
+                return self._reply(400)
+
+            submit(update)
+            self._reply(200)
+
+        def do_GET(self):
+            # health-check
+            self._reply(200 if self.path == "/healthz" else 404)
+
+        def _reply(self, code: int):
+            self.send_response(code)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+
+        def log_message(self, fmt, *args):
+            logger.debug("webhook: " + fmt, *args)
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    return server
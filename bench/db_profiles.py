@@ -0,0 +1,134 @@
+# SQLite под конкурентными хендлерами: профиль "default" против "production"
+# (WAL + прагмы, отдельный read-only пул для списков, см. app/db.py).
+# Нагрузка похожа на бота: в основном +1/-1 по товару с записью в аудит,
+# иногда — список инвентаря точки.
+#   python -m bench.db_profiles [--threads 8] [--seconds 5] [--items 200]
+import argparse
+import os
+import random
+import tempfile
+import threading
+import time
+from types import SimpleNamespace
+
+from sqlalchemy import select
+from sqlalchemy.exc import OperationalError
+
+from app.audit import log
+from app.db import (
+    Base,
+    engine_from_config,
+    make_session_factory,
+    read_engine_from_config,
+)
+from app.models import AuditAction, Group, Item, Outlet, StockBalance, User
+from app.services.inventory import add_delta, list_balances
+
+READ_SHARE = 0.2
+
+
+def seed(session_factory, items: int):
+    with session_factory() as db:
+        u = User(tg_user_id=1, name="bench")
+        db.add(u)
+        db.flush()
+        g = Group(name="bench", created_by_user_id=u.id)
+        db.add(g)
+        db.flush()
+        o = Outlet(group_id=g.id, name="bench")
+        db.add(o)
+        db.flush()
+        for i in range(items):
+            it = Item(outlet_id=o.id, name=f"item {i:05d}", unit="pcs")
+            db.add(it)
+            db.flush()
+            db.add(StockBalance(outlet_id=o.id, item_id=it.id, quantity=0))
+        db.commit()
+        item_ids = list(db.scalars(select(Item.id)))
+        return u.id, o.id, item_ids
+
+
+def run(profile: str, args) -> dict:
+    path = os.path.join(tempfile.mkdtemp(prefix="bench-db-"), "bench.db")
+    cfg = SimpleNamespace(
+        db_url=f"sqlite:///{path}",
+        db_read_url=None,
+        db_profile=profile,
+        db_pool_size=args.threads,
+        db_max_overflow=args.threads,
+        db_statement_timeout=30.0,
+    )
+    engine = engine_from_config(cfg)
+    Base.metadata.create_all(engine)
+    read_engine = read_engine_from_config(cfg)
+    Session = make_session_factory(engine)
+    ReadSession = make_session_factory(read_engine) if read_engine else Session
+    user_id, outlet_id, item_ids = seed(Session, args.items)
+
+    stats = {"writes": 0, "reads": 0, "errors": 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + args.seconds
+
+    def worker(n: int):
+        rnd = random.Random(n)
+        local = {"writes": 0, "reads": 0, "errors": 0}
+        while time.monotonic() < deadline:
+            try:
+                if rnd.random() < READ_SHARE:
+                    with ReadSession() as db:
+                        list_balances(db, outlet_id)
+                    local["reads"] += 1
+                else:
+                    item_id = rnd.choice(item_ids)
+                    with Session() as db:
+                        add_delta(db, outlet_id, item_id, rnd.choice((-1, 1)))
+                        log(
+                            db,
+                            user_id,
+                            AuditAction.QTY_DELTA,
+                            "item",
+                            item_id,
+                            outlet_id=outlet_id,
+                        )
+                        db.commit()
+                    local["writes"] += 1
+            except OperationalError:
+                # "database is locked"
+                local["errors"] += 1
+        with lock:
+            for k, v in local.items():
+                stats[k] += v
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(args.threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    engine.dispose()
+    if read_engine is not None:
+        read_engine.dispose()
+    return stats
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--threads", type=int, default=8)
+    ap.add_argument("--seconds", type=float, default=5.0)
+    ap.add_argument("--items", type=int, default=200)
+    args = ap.parse_args()
+
+    print(
+        f"{'profile':<12}{'writes/s':>10}{'reads/s':>10}{'locked':>8}"
+        f"  ({args.threads} threads, {args.seconds:g}s)"
+    )
+    for profile in ("default", "production"):
+        s = run(profile, args)
+        print(
+            f"{profile:<12}{s['writes'] / args.seconds:>10.0f}"
+            f"{s['reads'] / args.seconds:>10.0f}{s['errors']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# Микробенчмарк отрисовки клавиатур: как было (InlineKeyboardMarkup на каждый
+# рендер + to_json в telebot) и как сейчас (app/keyboards.py, готовый JSON).
+#   python -m bench.keyboards [--n 20000]
+import argparse
+import timeit
+from types import SimpleNamespace
+
+from telebot import types
+
+from app import keyboards
+from app.render_cache import render_fingerprint
+
+
+def naive(rows) -> str:
+    kb = types.InlineKeyboardMarkup()
+    for row in rows:
+        kb.row(*[types.InlineKeyboardButton(t, callback_data=d) for t, d in row])
+    return kb.to_json()
+
+
+def naive_inventory(outlet_id, sort, items) -> str:
+    item_rows = [
+        [(f"{it.name} ({qty:g} {it.unit})", f"i:item:{outlet_id}:{it.id}:{sort}")]
+        for it, qty in items
+    ]
+    return naive(item_rows + list(keyboards.inventory_rows(outlet_id, sort)))
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--n", type=int, default=20000)
+    args = ap.parse_args()
+
+    items = [
+        (SimpleNamespace(id=1000 + i, name=f"Товар {i}", unit="pcs"), float(i))
+        for i in range(10)
+    ]
+    cases = {
+        "main": (
+            lambda: naive(keyboards.main_rows()),
+            lambda: keyboards.main(),
+        ),
+        "item_card": (
+            lambda: naive(keyboards.item_card_rows(42, 4242, "alpha")),
+            lambda: keyboards.item_card(42, 4242, "alpha"),
+        ),
+        "inventory (10 items)": (
+            lambda: naive_inventory(42, "alpha", items),
+            lambda: keyboards.inventory_with_items(42, "alpha", items),
+        ),
+        "inventory + fingerprint": (
+            lambda: render_fingerprint("x", naive_inventory(42, "alpha", items)),
+            lambda: render_fingerprint(
+                "x", keyboards.inventory_with_items(42, "alpha", items)
+            ),
+        ),
+    }
+
+    print(f"{'case':<26}{'before, us':>12}{'after, us':>12}{'speedup':>10}")
+    for name, (before, after) in cases.items():
+        t0 = min(timeit.repeat(before, number=args.n, repeat=3)) / args.n * 1e6
+        t1 = min(timeit.repeat(after, number=args.n, repeat=3)) / args.n * 1e6
+        print(f"{name:<26}{t0:>12.2f}{t1:>12.2f}{t0 / t1:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,553 @@
+# Нагрузочный прогон BotApp целиком, без сети: Telegram подменён заглушкой
+# на уровне транспорта (apihelper.CUSTOM_REQUEST_SENDER), база — SQLite во
+# временном файле. Синтетические пользователи повторяют настоящие сценарии:
+# открыть инвентарь, +1, задать количество, добавить товар, выгрузить CSV.
+# Апдейты идут через тот же UpdateDispatcher, что и в проде, и через
+# BotApp.process_once, как в воркере шарда, — с проверкой повторов
+# (app/applied_updates.py), её запросы входят в бюджеты.
+#
+# Печатает пропускную способность, p50/p95/p99 времени обработки апдейта
+# (без ожидания в очереди — скрипт подаётся разом, как можно быстрее),
+# запросы и вызовы API на апдейт, пик RSS. --json сохраняет
+# результат; --baseline сравнивает с сохранённым и возвращает 1 при регрессии,
+# так что годится как проверка в CI:
+#   python -m bench.loadtest --json base.json
+#   python -m bench.loadtest --baseline base.json
+# Каждый апдейт ещё и проверяется по бюджету запросов своего действия
+# (QUERY_BUDGETS, sqlstats.assert_query_budget); вышли за бюджет — код 1
+# и без --baseline.
+# --db гоняет сценарии по уже заполненной базе (см. bench/seed.py) —
+# пользователи и их точки берутся из членства; база при этом меняется:
+#   python -m bench.loadtest --db sqlite:///./seed.db
+import argparse
+import itertools
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from sqlalchemy import func, insert, select
+from telebot import apihelper, types
+
+from app import callbacks as cbdata
+from app import sqlstats
+from app.bot import BotApp, DispatchingTeleBot
+from app.config import Config
+from app.db import Base, ensure_indexes, make_engine, make_session_factory
+from app.dispatch import UpdateDispatcher, update_key
+from app.models import (
+    AppliedUpdate,
+    Group,
+    GroupMembership,
+    GroupRole,
+    Item,
+    Outlet,
+    OutletMembership,
+    OutletRole,
+    StockBalance,
+    User,
+)
+
+TG_USER_BASE = 10_000
+# сценарий -> вес; шаги сценария — отдельные апдейты одного пользователя
+FLOWS = {"open": 30, "plus": 45, "setqty": 12, "add": 8, "export": 5}
+# допуски при сравнении с --baseline: время шумит; число запросов почти
+# постоянно (с несколькими воркерами чуть плавают промахи кешей), а лишний
+# запрос в хендлере — это +1 на каждый апдейт действия
+TIME_TOLERANCE = 0.25
+QUERY_TOLERANCE = 0.25
+# потолок запросов на апдейт по действиям — с холодными кешами точек и
+# пользователя; ни одна форма запроса не должна повторяться (N+1). Сюда
+# входит проверка повторов: +1 SELECT на апдейт и +1 запись отметки, если
+# апдейт что-то менял
+QUERY_BUDGETS = {
+    "i:open": 9,
+    "i:qty": 12,
+    "i:setqty": 7,
+    "text:set_qty": 10,
+    "i:add": 7,
+    "text:add_item": 14,
+    "i:exportcsv": 9,
+}
+
+
+# ---------------------------
+# Заглушка Telegram
+# ---------------------------
+class FakeTelegram:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls: Counter[str] = Counter()
+        self._ids = itertools.count(1_000_000)
+        self._lock = threading.Lock()
+
+    def __call__(self, method, url, params=None, files=None, **kwargs):
+        name = url.rsplit("/", 1)[-1]
+        with self._lock:
+            self.calls[name] += 1
+            message_id = next(self._ids)
+        if self.latency:
+            time.sleep(self.latency)
+        p = params or {}
+        if name == "answerCallbackQuery":
+            return _Response(True)
+        chat = {"id": int(p.get("chat_id", 1)), "type": "private"}
+        msg = {"message_id": message_id, "date": 0, "chat": chat, "text": "x"}
+        if name == "editMessageText":
+            msg["message_id"] = int(p["message_id"])
+        if name == "sendDocument":
+            msg["document"] = {"file_id": f"F{message_id}", "file_unique_id": "u"}
+        return _Response(msg)
+
+
+class _Response:
+    status_code = 200
+
+    def __init__(self, result):
+        self._payload = {"ok": True, "result": result}
+        self.text = json.dumps(self._payload)
+
+    def json(self):
+        return self._payload
+
+
+# ---------------------------
+# Данные и апдейты
+# ---------------------------
+def seed(Session, users: int, outlets: int, items: int):
+    # у каждого пользователя — своя "домашняя" точка, доступ как у персонала
+    with Session() as db:
+        owner = User(tg_user_id=TG_USER_BASE - 1, name="owner")
+        db.add(owner)
+        db.flush()
+        g = Group(name="load", created_by_user_id=owner.id)
+        db.add(g)
+        db.flush()
+        db.add(
+            GroupMembership(group_id=g.id, user_id=owner.id, role=GroupRole.GROUP_OWNER)
+        )
+        db.execute(
+            insert(Outlet),
+            [{"group_id": g.id, "name": f"outlet {i}"} for i in range(outlets)],
+        )
+        outlet_ids = list(db.scalars(select(Outlet.id).order_by(Outlet.id)))
+        db.execute(
+            insert(Item),
+            [
+                {"outlet_id": o, "name": f"item {i:05d}", "unit": "pcs"}
+                for o in outlet_ids
+                for i in range(items)
+            ],
+        )
+        rows = db.execute(select(Item.id, Item.outlet_id)).all()
+        db.execute(
+            insert(StockBalance),
+            [{"outlet_id": o, "item_id": i, "quantity": 10} for i, o in rows],
+        )
+        items_by_outlet = defaultdict(list)
+        for item_id, outlet_id in rows:
+            items_by_outlet[outlet_id].append(item_id)
+
+        home = {}
+        for n in range(users):
+            outlet_id = outlet_ids[n % len(outlet_ids)]
+            u = User(
+                tg_user_id=TG_USER_BASE + n,
+                name=f"user {n}",
+                active_outlet_id=outlet_id,
+            )
+            db.add(u)
+            db.flush()
+            db.add(
+                OutletMembership(
+                    outlet_id=outlet_id, user_id=u.id, role=OutletRole.OUTLET_STAFF
+                )
+            )
+            home[TG_USER_BASE + n] = outlet_id
+        db.commit()
+    return home, items_by_outlet
+
+
+def discover(Session, users: int):
+    # готовая база: первые членства в активных точках с товарами
+    with Session() as db:
+        rows = db.execute(
+            select(User.tg_user_id, OutletMembership.outlet_id)
+            .join(OutletMembership, OutletMembership.user_id == User.id)
+            .join(Outlet, Outlet.id == OutletMembership.outlet_id)
+            .where(Outlet.is_active.is_(True))
+            .order_by(OutletMembership.id)
+            .limit(users * 4)
+        ).all()
+        home = {}
+        for tg_id, outlet_id in rows:
+            if len(home) < users:
+                home.setdefault(tg_id, outlet_id)
+        items_by_outlet = defaultdict(list)
+        for item_id, outlet_id in db.execute(
+            select(Item.id, Item.outlet_id).where(
+                Item.outlet_id.in_(set(home.values())), Item.is_active.is_(True)
+            )
+        ):
+            items_by_outlet[outlet_id].append(item_id)
+    home = {tg: o for tg, o in home.items() if items_by_outlet[o]}
+    if not home:
+        sys.exit("no users with active outlets and items in --db")
+    return home, items_by_outlet
+
+
+class Updates:
+    def __init__(self, rnd: random.Random, first_id: int = 1):
+        self.rnd = rnd
+        self._ids = itertools.count(first_id)
+        self._names = itertools.count(1)
+
+    def _user(self, tg_id: int) -> dict:
+        return {"id": tg_id, "is_bot": False, "first_name": f"u{tg_id}"}
+
+    def message(self, tg_id: int, text: str):
+        return types.Update.de_json(
+            {
+                "update_id": next(self._ids),
+                "message": {
+                    "message_id": next(self._ids),
+                    "date": 0,
+                    "chat": {"id": tg_id, "type": "private"},
+                    "from": self._user(tg_id),
+                    "text": text,
+                },
+            }
+        )
+
+    def callback(self, tg_id: int, action: str, *args):
+        return types.Update.de_json(
+            {
+                "update_id": next(self._ids),
+                "callback_query": {
+                    "id": str(next(self._ids)),
+                    "chat_instance": "x",
+                    "data": cbdata.encode(action, *args),
+                    "from": self._user(tg_id),
+                    "message": {
+                        "message_id": 1,
+                        "date": 0,
+                        "chat": {"id": tg_id, "type": "private"},
+                        "text": "x",
+                    },
+                },
+            }
+        )
+
+    def flow(self, name: str, tg_id: int, outlet_id: int, items: list[int]):
+        # -> [(метка для отчёта, апдейт)]
+        sort = cbdata.SORT_ALPHA
+        item_id = self.rnd.choice(items)
+        if name == "open":
+            return [("i:open", self.callback(tg_id, "i:open", outlet_id, sort))]
+        if name == "plus":
+            delta = self.rnd.choice((1, 1, 1, -1))
+            return [
+                (
+                    "i:qty",
+                    self.callback(tg_id, "i:qty", outlet_id, item_id, delta, sort),
+                )
+            ]
+        if name == "setqty":
+            return [
+                (
+                    "i:setqty",
+                    self.callback(tg_id, "i:setqty", outlet_id, item_id, sort),
+                ),
+                ("text:set_qty", self.message(tg_id, str(self.rnd.randint(0, 500)))),
+            ]
+        if name == "add":
+            name = f"new {next(self._names):06d}"
+            return [
+                ("i:add", self.callback(tg_id, "i:add", outlet_id)),
+                ("text:add_item", self.message(tg_id, f"{name} | pcs | 5")),
+            ]
+        if name == "export":
+            return [("i:exportcsv", self.callback(tg_id, "i:exportcsv", outlet_id))]
+        raise ValueError(name)
+
+
+def make_script(args, home, items_by_outlet, first_id: int = 1) -> list:
+    # последовательность апдейтов; сценарий одного пользователя не
+    # перемешивается с его же следующим — порядок в чате держит диспетчер
+    rnd = random.Random(args.seed)
+    gen = Updates(rnd, first_id)
+    names, weights = zip(*FLOWS.items())
+    users = sorted(home)
+    script = []
+    while len(script) < args.updates:
+        tg_id = rnd.choice(users)
+        flow = rnd.choices(names, weights)[0]
+        outlet_id = home[tg_id]
+        script.extend(gen.flow(flow, tg_id, outlet_id, items_by_outlet[outlet_id]))
+    return script
+
+
+# ---------------------------
+# Прогон
+# ---------------------------
+def percentile(values: list[float], p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux — КБ, macOS — байты
+    return rss / 1024 / (1024 if sys.platform == "darwin" else 1)
+
+
+def run(args) -> dict:
+    path = os.path.join(tempfile.mkdtemp(prefix="loadtest-"), "load.db")
+    db_url = args.db or f"sqlite:///{path}"
+    engine = make_engine(db_url, args.db_profile)
+    Base.metadata.create_all(engine)
+    ensure_indexes(engine)
+    Session = make_session_factory(engine)
+    if args.db:
+        home, items_by_outlet = discover(Session, args.users)
+    else:
+        home, items_by_outlet = seed(Session, args.users, args.outlets, args.items)
+    with Session() as db:
+        # --db после прошлого прогона: апдейты с уже записанными id приняли
+        # бы за повторы (app/applied_updates.py)
+        applied = db.scalar(select(func.max(AppliedUpdate.update_id))) or 0
+    script = make_script(args, home, items_by_outlet, applied + 1)
+
+    telegram = FakeTelegram(args.tg_latency / 1000)
+    apihelper.CUSTOM_REQUEST_SENDER = telegram
+
+    cfg = Config(
+        bot_token="1:loadtest",
+        db_url=db_url,
+        db_profile=args.db_profile,
+        workers=args.workers,
+        queue_size=max(1, args.workers) * 64,
+        export_dir=os.path.dirname(path),
+        # в прогоне не предупреждаем — числа и так печатаются
+        sql_warn_queries=0,
+        sql_warn_time=0,
+        sql_warn_repeats=0,
+    )
+    bot = DispatchingTeleBot(cfg.bot_token, threaded=False)
+    app = BotApp(cfg, Session, bot=bot)
+
+    latencies: dict[str, list[float]] = defaultdict(list)
+    queries: dict[str, list[int]] = defaultdict(list)
+    errors = Counter()
+    over_budget = Counter()
+    # первое превышение по каждому действию — для отчёта
+    budget_problems: dict[str, str] = {}
+    lock = threading.Lock()
+
+    def handle(item):
+        action, update = item
+        failed = problem = None
+        started = time.perf_counter()
+        with sqlstats.track("loadtest", action) as stats:
+            try:
+                with sqlstats.assert_query_budget(QUERY_BUDGETS[action]):
+                    app.process_once(update)
+            except AssertionError as e:
+                problem = str(e)
+            except Exception:
+                failed = True
+        latency = time.perf_counter() - started
+        with lock:
+            latencies[action].append(latency)
+            queries[action].append(stats.count)
+            errors[action] += bool(failed)
+            if problem:
+                over_budget[action] += 1
+                budget_problems.setdefault(action, problem)
+
+    rss_before = peak_rss_mb()
+    started = time.perf_counter()
+    if args.workers > 0:
+        dispatcher = UpdateDispatcher(
+            handle,
+            args.workers,
+            cfg.queue_size,
+            key=lambda item: update_key(item[1]),
+        )
+        dispatcher.start()
+        for item in script:
+            dispatcher.submit(item)
+        dispatcher.stop()
+    else:
+        for item in script:
+            handle(item)
+    elapsed = time.perf_counter() - started
+    rss_after = peak_rss_mb()
+
+    app.drain()
+    engine.dispose()
+    apihelper.CUSTOM_REQUEST_SENDER = None
+
+    everything = [x for v in latencies.values() for x in v]
+    return {
+        "params": {
+            k: getattr(args, k)
+            for k in (
+                "users",
+                "outlets",
+                "items",
+                "updates",
+                "workers",
+                "tg_latency",
+                "db_profile",
+                "seed",
+                "db",
+            )
+        },
+        "updates": len(everything),
+        "seconds": elapsed,
+        "throughput": len(everything) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(everything, 50) * 1000,
+        "p95_ms": percentile(everything, 95) * 1000,
+        "p99_ms": percentile(everything, 99) * 1000,
+        "queries_per_update": sum(sum(v) for v in queries.values()) / len(everything),
+        "api_calls_per_update": sum(telegram.calls.values()) / len(everything),
+        "peak_rss_mb": rss_after,
+        "rss_growth_mb": (rss_after - rss_before if rss_after is not None else None),
+        "errors": sum(errors.values()),
+        "over_budget": budget_problems,
+        "actions": {
+            action: {
+                "count": len(latencies[action]),
+                "p50_ms": percentile(latencies[action], 50) * 1000,
+                "p95_ms": percentile(latencies[action], 95) * 1000,
+                "p99_ms": percentile(latencies[action], 99) * 1000,
+                "queries": sum(queries[action]) / len(queries[action]),
+                "errors": errors[action],
+                "over_budget": over_budget[action],
+            }
+            for action in sorted(latencies)
+        },
+    }
+
+
+def report(r: dict):
+    p = r["params"]
+    print(
+        f"{r['updates']} updates, {p['users']} users, "
+        + (
+            f"database {p['db']}"
+            if p.get("db")
+            else f"{p['outlets']} outlets x {p['items']} items"
+        )
+        + f", {p['workers']} workers, Telegram RTT "
+        f"{p['tg_latency']:g} ms, DB profile {p['db_profile']}"
+    )
+    print(
+        f"throughput {r['throughput']:.0f} updates/s   "
+        f"p50 {r['p50_ms']:.1f}  p95 {r['p95_ms']:.1f}  p99 {r['p99_ms']:.1f} ms"
+    )
+    rss = r["peak_rss_mb"]
+    print(
+        f"queries/update {r['queries_per_update']:.2f}   API calls/update "
+        f"{r['api_calls_per_update']:.2f}   peak RSS "
+        f"{f'{rss:.0f} MB' if rss is not None else 'n/a'}   errors {r['errors']}"
+    )
+    print()
+    print(
+        f"{'action':<14}{'count':>7}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+        f"{'queries':>9}{'budget':>8}{'errors':>8}"
+    )
+    for action, a in r["actions"].items():
+        print(
+            f"{action:<14}{a['count']:>7}{a['p50_ms']:>9.1f}{a['p95_ms']:>9.1f}"
+            f"{a['p99_ms']:>9.1f}{a['queries']:>9.2f}"
+            f"{QUERY_BUDGETS[action]:>8}{a['errors']:>8}"
+        )
+
+
+def compare(r: dict, base: dict) -> list[str]:
+    # при том же --seed скрипт тот же; сравниваем запросы на апдейт по
+    # действиям, время и пропускную способность
+    problems = []
+    # у базлайнов до --db этого ключа нет
+    if r["params"] != {"db": None, **base["params"]}:
+        problems.append(f"parameters differ from baseline: {base['params']}")
+        return problems
+    for action, a in r["actions"].items():
+        b = base["actions"].get(action)
+        if b and a["queries"] > b["queries"] + QUERY_TOLERANCE:
+            problems.append(
+                f"{action}: {a['queries']:.2f} queries/update, baseline {b['queries']:.2f}"
+            )
+    if r["p95_ms"] > base["p95_ms"] * (1 + TIME_TOLERANCE):
+        problems.append(f"p95 {r['p95_ms']:.1f} ms, baseline {base['p95_ms']:.1f} ms")
+    if r["throughput"] < base["throughput"] * (1 - TIME_TOLERANCE):
+        problems.append(
+            f"throughput {r['throughput']:.0f}/s, baseline {base['throughput']:.0f}/s"
+        )
+    if r["errors"] > base["errors"]:
+        problems.append(f"{r['errors']} errors, baseline {base['errors']}")
+    return problems
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--outlets", type=int, default=20)
+    ap.add_argument("--items", type=int, default=200, help="per outlet")
+    ap.add_argument("--updates", type=int, default=5000)
+    ap.add_argument("--workers", type=int, default=8, help="0 = inline, one thread")
+    ap.add_argument(
+        "--tg-latency", type=float, default=0.0, help="simulated Bot API RTT, ms"
+    )
+    ap.add_argument(
+        "--db-profile", choices=("default", "production"), default="production"
+    )
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--db", help="run against an existing database URL (bench.seed)")
+    ap.add_argument("--json", help="write results here")
+    ap.add_argument(
+        "--baseline", help="compare with saved --json, exit 1 on regression"
+    )
+    args = ap.parse_args()
+
+    r = run(args)
+    report(r)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(r, f, indent=2)
+    problems = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            problems = compare(r, json.load(f))
+        print()
+        for p in problems:
+            print(f"REGRESSION {p}")
+        if not problems:
+            print("no regressions against baseline")
+    if r["over_budget"]:
+        print()
+        for action, problem in r["over_budget"].items():
+            n = r["actions"][action]["over_budget"]
+            print(f"OVER BUDGET {action} ({n} updates): {problem}")
+    if problems or r["over_budget"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
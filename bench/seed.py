@@ -0,0 +1,422 @@
+# Большой синтетический набор данных для нагрузочных прогонов и проверки
+# планов запросов на реальных объёмах: группы, точки, участники с обеими
+# ролями (GroupRole и OutletRole), товары, остатки, складские операции и
+# многолетняя история аудита.
+#
+# Распределения с перекосом, как в жизни: немногие "горячие" точки дают
+# большую часть операций (Zipf), внутри точки ходовых товаров мало, а
+# хвост длинный; к концу периода активность растёт.
+#
+# Детерминирован: при одном --seed и одних параметрах — те же строки, те же
+# id, поэтому цифры бенчмарков сравнимы между запусками. Пишет пачками через
+# Core insert() (executemany), id проставляет сам, без чтения назад (на
+# PostgreSQL в конце двигает последовательности до max(id)); 10M строк
+# аудита в SQLite грузятся за минуты, память не растёт с объёмом.
+#   python -m bench.seed --db sqlite:///./seed.db --audit 10000000
+#   python -m bench.seed --db postgresql+psycopg2://... --drop
+import argparse
+import datetime
+import random
+import sys
+import time
+from itertools import accumulate
+
+from sqlalchemy import func, insert, select, text
+
+from app.db import Base, ensure_indexes, make_engine
+from app.models import (
+    AuditAction,
+    AuditLog,
+    Group,
+    GroupMembership,
+    GroupRole,
+    Item,
+    Outlet,
+    OutletMembership,
+    OutletRole,
+    StockBalance,
+    StockTransaction,
+    StockTransactionLine,
+    TxType,
+    User,
+)
+
+TG_USER_BASE = 100_000
+UNITS = ("pcs", "pcs", "pcs", "kg", "l", "pack", "box")
+# доля строк аудита по действиям; остальное — редкие правки товаров
+AUDIT_MIX = {
+    AuditAction.QTY_DELTA: 70,
+    AuditAction.QTY_SET: 20,
+    AuditAction.ITEM_CREATED: 5,
+    AuditAction.ITEM_RENAMED: 2,
+    AuditAction.ITEM_UNIT_CHANGED: 1,
+    AuditAction.ITEM_DELETED: 2,
+}
+TX_MIX = {TxType.IN_: 45, TxType.OUT: 45, TxType.ADJUST: 10}
+
+
+def zipf_cum_weights(n: int, s: float) -> list[float]:
+    return list(accumulate(1 / (rank**s) for rank in range(1, n + 1)))
+
+
+class Timeline:
+    # монотонные метки времени на N событий за период; плотность растёт к
+    # концу (u ** GROWTH), поэтому строки пишутся в порядке created_at —
+    # индексы по времени заполняются с конца, без перестроек
+    GROWTH = 0.7
+
+    def __init__(self, start: datetime.datetime, end: datetime.datetime, n: int):
+        self.start = start
+        self.span = (end - start).total_seconds()
+        self.n = max(1, n)
+
+    def at(self, i: int) -> datetime.datetime:
+        u = i / self.n
+        return self.start + datetime.timedelta(seconds=self.span * u**self.GROWTH)
+
+
+class Seeder:
+    def __init__(self, engine, args):
+        self.engine = engine
+        self.args = args
+        self.rnd = random.Random(args.seed)
+        self.end = datetime.datetime(2026, 1, 1)
+        self.start = self.end - datetime.timedelta(days=round(365 * args.years))
+        self.stats: list[tuple[str, int, float]] = []
+
+    # ---------------------------
+    # Запись
+    # ---------------------------
+    def write(self, table, rows):
+        # rows — генератор; пишем пачками по --batch в своих транзакциях
+        self.write_linked((table,), ((table, row) for row in rows))
+
+    def write_linked(self, tables, rows):
+        # rows — генератор пар (таблица, строка) для связанных таблиц: строки
+        # дочерней идут после своей родительской. Пачки сбрасываем все разом
+        # в порядке tables (родители первыми) — внешние ключи не ломаются, а
+        # в памяти не больше --batch строк на таблицу
+        started = time.perf_counter()
+        totals = dict.fromkeys(tables, 0)
+        batches = {table: [] for table in tables}
+        with self.engine.connect() as conn:
+            if self.engine.dialect.name == "sqlite":
+                # данные одноразовые: fsync на каждую пачку не нужен
+                conn.exec_driver_sql("PRAGMA synchronous=OFF")
+
+            def flush():
+                for table in tables:
+                    batch = batches[table]
+                    if batch:
+                        conn.execute(insert(table), batch)
+                        totals[table] += len(batch)
+                        batch.clear()
+                conn.commit()
+
+            for table, row in rows:
+                batches[table].append(row)
+                if len(batches[table]) >= self.args.batch:
+                    flush()
+                    self._progress(table.__tablename__, totals[table], started)
+            flush()
+        elapsed = time.perf_counter() - started
+        for table in tables:
+            name, total = table.__tablename__, totals[table]
+            self.stats.append((name, total, elapsed))
+            print(f"\r{name:<26}{total:>12,} rows{elapsed:>9.1f}s", flush=True)
+
+    def _progress(self, name: str, total: int, started: float):
+        if sys.stdout.isatty():
+            rate = total / max(time.perf_counter() - started, 1e-9)
+            print(f"\r{name:<26}{total:>12,} rows{rate:>9.0f}/s", end="", flush=True)
+
+    def moment(self) -> datetime.datetime:
+        return self.start + datetime.timedelta(
+            seconds=self.rnd.random() * (self.end - self.start).total_seconds()
+        )
+
+    # ---------------------------
+    # Справочники
+    # ---------------------------
+    def run(self):
+        a = self.args
+        rnd = self.rnd
+
+        # пользователи: первые --groups — владельцы групп
+        self.write(
+            User,
+            (
+                {
+                    "id": i,
+                    "tg_user_id": TG_USER_BASE + i,
+                    "name": f"user {i}",
+                    "created_at": self.start,
+                }
+                for i in range(1, a.users + 1)
+            ),
+        )
+        self.write(
+            Group,
+            (
+                {
+                    "id": g,
+                    "name": f"group {g}",
+                    "created_by_user_id": g,
+                    "created_at": self.start,
+                }
+                for g in range(1, a.groups + 1)
+            ),
+        )
+
+        # число точек в группе — тоже с перекосом: сети и одиночки
+        per_group = [
+            max(1, round(rnd.lognormvariate(-0.32, 0.8) * a.outlets_per_group))
+            for _ in range(a.groups)
+        ]
+        outlet_group = {}
+        outlets = []
+        for g, n in enumerate(per_group, start=1):
+            for _ in range(n):
+                o = len(outlets) + 1
+                outlet_group[o] = g
+                outlets.append(
+                    {
+                        "id": o,
+                        "group_id": g,
+                        "name": f"outlet {o}",
+                        "address": f"street {rnd.randint(1, 300)}",
+                        "is_active": rnd.random() > 0.05,
+                    }
+                )
+        self.write(Outlet, outlets)
+        outlet_ids = [o["id"] for o in outlets]
+
+        # роли: владелец и 0–3 менеджера группы; у точки — менеджер и персонал
+        group_members = []
+        outlet_members = []
+        members_of: dict[int, list[int]] = {}
+        staff_pool = range(a.groups + 1, a.users + 1) or range(1, a.users + 1)
+        for g in range(1, a.groups + 1):
+            group_members.append(
+                {
+                    "group_id": g,
+                    "user_id": g,
+                    "role": GroupRole.GROUP_OWNER,
+                    "created_at": self.start,
+                }
+            )
+            for user_id in rnd.sample(
+                staff_pool, min(len(staff_pool), rnd.randint(0, 3))
+            ):
+                group_members.append(
+                    {
+                        "group_id": g,
+                        "user_id": user_id,
+                        "role": GroupRole.GROUP_MANAGER,
+                        "created_at": self.start,
+                    }
+                )
+        for o in outlet_ids:
+            people = rnd.sample(staff_pool, min(len(staff_pool), rnd.randint(2, 8)))
+            for k, user_id in enumerate(people):
+                role = OutletRole.OUTLET_MANAGER if k == 0 else OutletRole.OUTLET_STAFF
+                outlet_members.append(
+                    {
+                        "outlet_id": o,
+                        "user_id": user_id,
+                        "role": role,
+                        "created_at": self.start,
+                    }
+                )
+            # пишут в аудит и владелец группы, и люди точки
+            members_of[o] = [outlet_group[o], *people]
+        self.write(GroupMembership, group_members)
+        self.write(OutletMembership, outlet_members)
+
+        # товары: число на точку — логнормальное вокруг --items
+        items_of: dict[int, list[int]] = {}
+        item_rows = []
+        balances = []
+        next_item = 1
+        for o in outlet_ids:
+            n = max(
+                5, min(20 * a.items, round(rnd.lognormvariate(-0.18, 0.6) * a.items))
+            )
+            ids = list(range(next_item, next_item + n))
+            next_item += n
+            items_of[o] = ids
+            for k, item_id in enumerate(ids):
+                created = self.moment()
+                item_rows.append(
+                    {
+                        "id": item_id,
+                        "outlet_id": o,
+                        "name": f"item {k:05d}",
+                        "unit": rnd.choice(UNITS),
+                        "is_active": rnd.random() > 0.08,
+                        "created_at": created,
+                        "updated_at": created + (self.end - created) * rnd.random(),
+                    }
+                )
+                balances.append(
+                    {
+                        "outlet_id": o,
+                        "item_id": item_id,
+                        "quantity": round(rnd.expovariate(1 / 40), 3),
+                    }
+                )
+        self.write(Item, item_rows)
+        self.write(StockBalance, balances)
+        del item_rows, balances
+
+        # горячие точки разбросаны по группам, а не все в первой
+        hot = outlet_ids[:]
+        rnd.shuffle(hot)
+        outlet_cw = zipf_cum_weights(len(hot), a.skew)
+        self.transactions(hot, outlet_cw, items_of, members_of)
+        self.audit(hot, outlet_cw, items_of, members_of, outlet_group)
+
+    def _item(self, items: list[int]) -> int:
+        # внутри точки — длинный хвост: первые товары ходовые
+        return items[int(len(items) * self.rnd.random() ** 3)]
+
+    # ---------------------------
+    # История
+    # ---------------------------
+    def transactions(self, outlet_ids, outlet_cw, items_of, members_of):
+        a = self.args
+        rnd = self.rnd
+        timeline = Timeline(self.start, self.end, a.transactions)
+        tx_types, tx_cw = list(TX_MIX), list(accumulate(TX_MIX.values()))
+
+        def rows():
+            # операция и сразу её строки — ничего не копим до конца
+            line_id = 1
+            for i in range(1, a.transactions + 1):
+                o = rnd.choices(outlet_ids, cum_weights=outlet_cw)[0]
+                tx_type = rnd.choices(tx_types, cum_weights=tx_cw)[0]
+                yield StockTransaction, {
+                    "id": i,
+                    "outlet_id": o,
+                    "user_id": rnd.choice(members_of[o]),
+                    "type": tx_type,
+                    "comment": None,
+                    "created_at": timeline.at(i),
+                }
+                sign = -1 if tx_type == TxType.OUT else 1
+                for item_id in {
+                    self._item(items_of[o]) for _ in range(rnd.randint(1, 5))
+                }:
+                    yield StockTransactionLine, {
+                        "id": line_id,
+                        "transaction_id": i,
+                        "item_id": item_id,
+                        "delta_quantity": sign * rnd.randint(1, 50),
+                    }
+                    line_id += 1
+
+        self.write_linked((StockTransaction, StockTransactionLine), rows())
+
+    def audit(self, outlet_ids, outlet_cw, items_of, members_of, outlet_group):
+        a = self.args
+        rnd = self.rnd
+        timeline = Timeline(self.start, self.end, a.audit)
+        actions, action_cw = list(AUDIT_MIX), list(accumulate(AUDIT_MIX.values()))
+
+        def rows():
+            block = 10_000
+            for first in range(1, a.audit + 1, block):
+                n = min(block, a.audit + 1 - first)
+                # выбор по весам — пачкой, это заметно быстрее поштучного
+                os_ = rnd.choices(outlet_ids, cum_weights=outlet_cw, k=n)
+                acts = rnd.choices(actions, cum_weights=action_cw, k=n)
+                for k in range(n):
+                    o, action = os_[k], acts[k]
+                    item_id = self._item(items_of[o])
+                    if action == AuditAction.QTY_DELTA:
+                        details = f"item_id={item_id};delta={rnd.choice((1, 1, 1, -1))}"
+                    elif action == AuditAction.QTY_SET:
+                        details = f"item_id={item_id};to={rnd.randint(0, 200)}"
+                    else:
+                        details = f"item_id={item_id}"
+                    yield {
+                        "id": first + k,
+                        "created_at": timeline.at(first + k),
+                        "user_id": rnd.choice(members_of[o]),
+                        "group_id": outlet_group[o],
+                        "outlet_id": o,
+                        "action": action,
+                        "entity_type": "item",
+                        "entity_id": item_id,
+                        "details": details,
+                    }
+
+        self.write(AuditLog, rows())
+
+
+def reset_sequences(engine):
+    # id проставлены явно, последовательности PostgreSQL о них не знают —
+    # без этого первый же INSERT из бота упадёт на дубле первичного ключа
+    if engine.dialect.name != "postgresql":
+        return
+    quote = engine.dialect.identifier_preparer.quote
+    with engine.connect() as conn:
+        for table in Base.metadata.sorted_tables:
+            if "id" not in table.c:
+                continue
+            name = quote(table.name)
+            # нет последовательности или пустая таблица — setval(NULL) ничего
+            # не делает
+            conn.execute(
+                text(
+                    "SELECT setval(pg_get_serial_sequence(:name, 'id'), max(id)) "
+                    f"FROM {name}"
+                ),
+                {"name": name},
+            )
+        conn.commit()
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--db", default="sqlite:///./seed.db")
+    ap.add_argument(
+        "--db-profile", choices=("default", "production"), default="production"
+    )
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--groups", type=int, default=200)
+    ap.add_argument("--outlets-per-group", type=float, default=5, help="average")
+    ap.add_argument("--users", type=int, default=5_000)
+    ap.add_argument("--items", type=int, default=300, help="average per outlet")
+    ap.add_argument("--transactions", type=int, default=200_000)
+    ap.add_argument("--audit", type=int, default=1_000_000)
+    ap.add_argument("--years", type=float, default=3)
+    ap.add_argument("--skew", type=float, default=1.1, help="Zipf exponent for outlets")
+    ap.add_argument("--batch", type=int, default=20_000)
+    ap.add_argument("--drop", action="store_true", help="drop and recreate all tables")
+    args = ap.parse_args()
+    if args.users < args.groups:
+        ap.error("--users must be at least --groups (every group has an owner)")
+
+    engine = make_engine(args.db, args.db_profile)
+    if args.drop:
+        Base.metadata.drop_all(engine)
+    Base.metadata.create_all(engine)
+    with engine.connect() as conn:
+        if conn.scalar(select(func.count()).select_from(User)):
+            sys.exit("database is not empty; pass --drop to recreate it")
+
+    started = time.perf_counter()
+    Seeder(engine, args).run()
+    reset_sequences(engine)
+    ensure_indexes(engine)
+    with engine.connect() as conn:
+        # статистика для планировщика — как на живой базе
+        conn.exec_driver_sql("ANALYZE")
+        conn.commit()
+    engine.dispose()
+    print(f"done in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
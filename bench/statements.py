@@ -0,0 +1,105 @@
+# Накладные расходы Python на одно нажатие: обычный select(), который
+# собирается и хешируется заново при каждом вызове, против lambda_stmt из
+# app/queries.py. Набор запросов — как у "+1" по товару: проверка доступа,
+# товар, остаток. База в памяти; из полного времени вычитаем время курсора
+# (app/sqlstats.py) — остаётся то, что экономит lambda_stmt: сборка запроса,
+# ключ кеша, ORM. Доля попаданий в кеш компиляции тут почти 100% у обоих
+# вариантов — select() тоже находит скомпилированную форму, он платит за
+# сборку и ключ, поэтому её и не печатаем.
+#   python -m bench.statements [--rounds 2000]
+import argparse
+import time
+
+from sqlalchemy import select
+
+from app import queries, sqlstats
+from app.db import Base, make_engine, make_session_factory
+from app.models import (
+    Group,
+    GroupMembership,
+    GroupRole,
+    Item,
+    Outlet,
+    StockBalance,
+    User,
+)
+
+
+def seed(db):
+    u = User(tg_user_id=1, name="bench")
+    db.add(u)
+    db.flush()
+    g = Group(name="bench", created_by_user_id=u.id)
+    db.add(g)
+    db.flush()
+    db.add(GroupMembership(group_id=g.id, user_id=u.id, role=GroupRole.GROUP_OWNER))
+    o = Outlet(group_id=g.id, name="bench")
+    db.add(o)
+    db.flush()
+    it = Item(outlet_id=o.id, name="item", unit="pcs")
+    db.add(it)
+    db.flush()
+    db.add(StockBalance(outlet_id=o.id, item_id=it.id, quantity=0))
+    db.commit()
+    return u.id, o.id, it.id
+
+
+def plain(db, user_id, outlet_id, item_id):
+    # так было до app/queries.py
+    group_id = db.scalar(select(Outlet.group_id).where(Outlet.id == outlet_id))
+    db.scalar(
+        select(GroupMembership.role).where(
+            GroupMembership.user_id == user_id, GroupMembership.group_id == group_id
+        )
+    )
+    db.scalar(
+        select(Item).where(
+            Item.id == item_id, Item.outlet_id == outlet_id, Item.is_active == True
+        )
+    )
+    db.scalar(
+        select(StockBalance).where(
+            StockBalance.outlet_id == outlet_id, StockBalance.item_id == item_id
+        )
+    )
+
+
+def cached(db, user_id, outlet_id, item_id):
+    group_id = queries.outlet_meta(db, outlet_id).group_id
+    queries.group_role(db, user_id, group_id)
+    queries.active_item(db, outlet_id, item_id)
+    queries.balance(db, outlet_id, item_id)
+
+
+def measure(fn, Session, ids, rounds: int) -> tuple[float, float]:
+    # -> (всё на нажатие, без времени курсора), мкс
+    with Session() as db:
+        for _ in range(100):
+            fn(db, *ids)
+        with sqlstats.track("bench", fn.__name__) as stats:
+            start = time.perf_counter()
+            for _ in range(rounds):
+                fn(db, *ids)
+            elapsed = time.perf_counter() - start
+    return elapsed / rounds * 1e6, (elapsed - stats.total) / rounds * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--rounds", type=int, default=2000)
+    args = ap.parse_args()
+
+    engine = make_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    Session = make_session_factory(engine)
+    with Session() as db:
+        ids = seed(db)
+
+    print(f"{'variant':<12}{'µs/callback':>12}{'w/o cursor':>12}  (4 queries each)")
+    for name, fn in (("select()", plain), ("lambda_stmt", cached)):
+        total, python = measure(fn, Session, ids, args.rounds)
+        print(f"{name:<12}{total:>12.1f}{python:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
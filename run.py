@@ -1,20 +1,158 @@
+import logging
+import signal
+import threading
 from dotenv import load_dotenv
+from telebot import apihelper
+from app import metrics
 from app.config import load_config
-from app.db import make_engine, make_session_factory, Base
+from app.db import (
+    Base,
+    engine_from_config,
+    ensure_indexes,
+    make_session_factory,
+    read_engine_from_config,
+)
 from app.bot import BotApp
+from app.export_janitor import start_janitor
+from app.outbound import OutboundScheduler
+from app.sharding import ShardFront
+from app.state_store import make_state_store
+from app.webhook import make_webhook_server
+
+logger = logging.getLogger(__name__)
+
+
+def _webhook_server(cfg, submit, raw=False):
+    return make_webhook_server(
+        cfg.webhook_host,
+        cfg.webhook_port,
+        cfg.webhook_path,
+        cfg.webhook_secret,
+        submit,
+        raw=raw,
+    )
+
+
+def _on_shutdown(stop):
+    # SIGTERM (docker stop, systemd) и Ctrl+C: stop() только прекращает приём
+    # апдейтов, очередь дорабатывает вызывающий. В отдельном потоке — главный
+    # поток сам сидит в serve_forever/polling, а server.shutdown() ждёт его
+    def handler(signum, frame):
+        logger.info("got signal %s, stopping intake", signum)
+        threading.Thread(target=stop, name="shutdown", daemon=True).start()
+
+    signal.signal(signal.SIGINT, handler)
+    signal.signal(signal.SIGTERM, handler)
+
+
+def run_threads(cfg, session_factory, state_store, read_session_factory=None):
+    # все вызовы Telegram API идут через планировщик с лимитами
+    scheduler = OutboundScheduler(
+        global_rate=cfg.tg_global_rate,
+        chat_rate=cfg.tg_chat_rate,
+        group_rate=cfg.tg_group_rate,
+        senders=cfg.tg_senders,
+    ).install()
+    app = BotApp(
+        cfg,
+        session_factory,
+        state_store=state_store,
+        read_session_factory=read_session_factory,
+    )
+
+    try:
+        if cfg.mode == "webhook":
+            server = _webhook_server(cfg, app.feed)
+            _on_shutdown(server.shutdown)
+            if cfg.webhook_url:
+                app.bot.set_webhook(
+                    url=cfg.webhook_url,
+                    secret_token=cfg.webhook_secret,
+                    drop_pending_updates=True,
+                )
+            server.serve_forever()
+            server.server_close()
+        else:
+            _on_shutdown(app.bot.stop_polling)
+            # getUpdates не работает, пока зарегистрирован webhook
+            app.bot.remove_webhook()
+            app.bot.infinity_polling(skip_pending=True)
+    finally:
+        # приём остановлен: дорабатываем очередь, потом отправляем исходящие
+        app.drain(cfg.drain_timeout)
+        scheduler.stop()
+
+
+def run_sharded(cfg):
+    # фронт только принимает апдейты; обработка — в cfg.shards процессах
+    front = ShardFront(cfg, cfg.shards, max_unacked=cfg.queue_size)
+    front.start()
+    try:
+        if cfg.mode == "webhook":
+            server = _webhook_server(cfg, front.submit, raw=True)
+            _on_shutdown(server.shutdown)
+            if cfg.webhook_url:
+                apihelper.set_webhook(
+                    cfg.bot_token,
+                    url=cfg.webhook_url,
+                    secret_token=cfg.webhook_secret,
+                    drop_pending_updates=True,
+                )
+            server.serve_forever()
+            server.server_close()
+        else:
+            _on_shutdown(front.stop_intake)
+            front.poll()
+    finally:
+        # воркерам — время на свою очередь и ещё немного на выход
+        front.stop(cfg.drain_timeout + 10)
 
 
 def main():
     load_dotenv()
     cfg = load_config()
 
-    engine = make_engine(cfg.db_url)
+    engine = engine_from_config(cfg)
     Base.metadata.create_all(engine)
+    ensure_indexes(engine)
 
-    session_factory = make_session_factory(engine)
-    app = BotApp(cfg, session_factory)
+    if cfg.metrics_port:
+        # при шардах здесь только фронт: приём и очереди воркеров
+        metrics.start_metrics_server(cfg.metrics_host, cfg.metrics_port)
 
-    app.bot.infinity_polling(skip_pending=True)
+    start_janitor(
+        cfg.export_dir,
+        cfg.export_dir_max_age,
+        cfg.export_dir_max_bytes,
+        cfg.export_janitor_interval,
+    )
+
+    if cfg.shards > 0:
+        # у каждого воркера свои движок, планировщик и state store
+        run_sharded(cfg)
+        return
+
+    session_factory = make_session_factory(engine)
+    read_engine = read_engine_from_config(cfg)
+    read_session_factory = read_engine and make_session_factory(read_engine)
+    metrics.watch_pool("main", engine)
+    if read_engine is not None:
+        metrics.watch_pool("read", read_engine)
+    state_store = make_state_store(
+        cfg.state_store,
+        session_factory,
+        cfg.state_max_users,
+        cfg.state_ttl,
+        cfg.state_flush_interval,
+    )
+    try:
+        run_threads(cfg, session_factory, state_store, read_session_factory)
+    finally:
+        # несброшенные состояния диалогов не теряем
+        state_store.close()
+        engine.dispose()
+        if read_engine is not None:
+            read_engine.dispose()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,34 @@
+# Общие фикстуры: BotApp на SQLite во временном каталоге с данными из
+# bench/loadtest.py и Telegram-заглушкой на уровне транспорта.
+import pytest
+from telebot import apihelper
+
+from app.bot import BotApp, DispatchingTeleBot
+from app.config import Config
+from app.db import Base, ensure_indexes, make_engine, make_session_factory
+from bench.loadtest import FakeTelegram, seed
+
+
+@pytest.fixture
+def telegram():
+    fake = FakeTelegram(0)
+    apihelper.CUSTOM_REQUEST_SENDER = fake
+    yield fake
+    apihelper.CUSTOM_REQUEST_SENDER = None
+
+
+@pytest.fixture
+def env(tmp_path, telegram):
+    # -> (app, Session, {tg_id: outlet_id}, {outlet_id: [item_id]})
+    db_url = f"sqlite:///{tmp_path / 'bot.db'}"
+    engine = make_engine(db_url)
+    Base.metadata.create_all(engine)
+    ensure_indexes(engine)
+    Session = make_session_factory(engine)
+    home, items_by_outlet = seed(Session, users=3, outlets=2, items=20)
+    cfg = Config(bot_token="1:test", db_url=db_url, export_dir=str(tmp_path))
+    bot = DispatchingTeleBot(cfg.bot_token, threaded=False)
+    app = BotApp(cfg, Session, bot=bot)
+    yield app, Session, home, items_by_outlet
+    app.drain()
+    engine.dispose()
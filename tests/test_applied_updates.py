@@ -0,0 +1,74 @@
+# Повторы апдейтов в режиме шардов: применённый апдейт второй раз не
+# применяется, чтение отметку не пишет, чат и пользователь с одним id —
+# разные ключи.
+import random
+
+from sqlalchemy import func, select
+from telebot import types
+
+from app import applied_updates
+from app import callbacks as cbdata
+from app.models import AppliedUpdate, StockBalance
+from bench.loadtest import Updates
+
+
+def _applied(Session):
+    with Session() as db:
+        return db.execute(
+            select(AppliedUpdate.kind, AppliedUpdate.key_id, AppliedUpdate.update_id)
+        ).all()
+
+
+def test_replay_is_skipped(env):
+    app, Session, home, items_by_outlet = env
+    tg_id, outlet_id = next(iter(home.items()))
+    item_id = items_by_outlet[outlet_id][0]
+    update = Updates(random.Random(1)).callback(
+        tg_id, "i:qty", outlet_id, item_id, 1, cbdata.SORT_ALPHA
+    )
+    assert app.process_once(update)
+    assert not app.process_once(update)
+    with Session() as db:
+        quantity = db.scalar(
+            select(StockBalance.quantity).where(StockBalance.item_id == item_id)
+        )
+    assert quantity == 11
+    assert _applied(Session) == [("chat", tg_id, update.update_id)]
+
+
+def test_read_only_update_writes_nothing(env):
+    app, Session, home, items_by_outlet = env
+    tg_id, outlet_id = next(iter(home.items()))
+    gen = Updates(random.Random(1))
+    # первое нажатие переименовывает пользователя — это запись
+    assert app.process_once(gen.callback(tg_id, "i:open", outlet_id, cbdata.SORT_ALPHA))
+    written = _applied(Session)
+    assert len(written) == 1
+
+    assert app.process_once(gen.callback(tg_id, "i:open", outlet_id, cbdata.SORT_ALPHA))
+    assert _applied(Session) == written
+
+
+def test_user_key_does_not_shadow_chat(env):
+    app, Session, home, _ = env
+    tg_id = next(iter(home))
+    with Session() as db:
+        db.add(AppliedUpdate(kind="chat", key_id=tg_id, update_id=100))
+        db.commit()
+    # кнопка под inline-сообщением: чата нет, ключ — пользователь
+    update = types.Update.de_json(
+        {
+            "update_id": 50,
+            "callback_query": {
+                "id": "1",
+                "chat_instance": "x",
+                "inline_message_id": "m",
+                "data": "x",
+                "from": {"id": tg_id, "is_bot": False, "first_name": "u"},
+            },
+        }
+    )
+    with applied_updates.applying(Session, update) as fresh:
+        assert fresh
+    with Session() as db:
+        assert db.scalar(select(func.count()).select_from(AppliedUpdate)) == 1
@@ -0,0 +1,89 @@
+# Кодек callback_data: туда-обратно для каждого действия, старые строки с уже
+# отправленных кнопок и мусор.
+import pytest
+
+from app import callbacks as cbdata
+
+SAMPLES = {
+    cbdata.INT: (0, 1, -1, 63, -64, 127, 128, 300, 2**31, -(2**40)),
+    cbdata.SORT: (None, cbdata.SORT_ALPHA, cbdata.SORT_CREATED, cbdata.SORT_UPDATED),
+    cbdata.TARGET: (None, "outlets", "inventory"),
+}
+
+
+def _args(action, k):
+    return tuple(
+        SAMPLES[kind][(k + i) % len(SAMPLES[kind])]
+        for i, kind in enumerate(action.fields)
+    )
+
+
+@pytest.mark.parametrize("action", cbdata.ACTIONS, ids=lambda a: a.name)
+def test_round_trip(action):
+    for k in range(10):
+        args = _args(action, k)
+        data = cbdata.encode(action.name, *args)
+        assert data.startswith(cbdata.MARKER)
+        assert len(data) <= cbdata.MAX_LEN
+        assert cbdata.decode(data) == (action.name, args)
+
+
+def test_missing_trailing_args_are_none():
+    data = cbdata.encode("i:open", 5)
+    assert cbdata.decode(data) == ("i:open", (5, None))
+
+
+def test_codes_are_unique():
+    assert len({a.code for a in cbdata.ACTIONS}) == len(cbdata.ACTIONS)
+    assert len({a.name for a in cbdata.ACTIONS}) == len(cbdata.ACTIONS)
+
+
+def test_encode_rejects_bad_input():
+    with pytest.raises(ValueError):
+        cbdata.encode("m:home", 1)
+    with pytest.raises(KeyError):
+        cbdata.encode("nope")
+
+
+@pytest.mark.parametrize(
+    "data, expected",
+    [
+        ("i:qty:1:2:-1:alpha", ("i:qty", (1, 2, -1, "alpha"))),
+        ("i:qty:1:2:3", ("i:qty", (1, 2, 3, None))),
+        ("i:open:7", ("i:open", (7, None))),
+        ("g:select:3:inventory", ("g:select", (3, "inventory"))),
+        ("m:home", ("m:home", ())),
+    ],
+)
+def test_legacy(data, expected):
+    assert cbdata.decode(data) == expected
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        "",
+        "~",
+        "~!!!",
+        "~AA",  # версия 0
+        "~AT8",  # неизвестный код действия
+        cbdata.encode("i:open", 5)[:-1],  # обрезано
+        cbdata.encode("m:home") + "AA",  # лишние байты
+        "i:qty:1",  # не хватает обязательных int
+        "i:qty:a:b:c",
+        "i:open:1:bogus",
+        "i:open:1:alpha:extra",
+        "x:y:z",
+        "hello",
+        "~привет",
+    ],
+)
+def test_garbage_is_none(data):
+    assert cbdata.decode(data) is None
+
+
+def test_outlet_of():
+    assert cbdata.outlet_of("i:qty", (4, 2, 1, None)) == 4
+    assert cbdata.outlet_of("o:select", (9, "outlets")) == 9
+    assert cbdata.outlet_of("g:select", (3, "outlets")) is None
+    assert cbdata.outlet_of("i:pick_group", ()) is None
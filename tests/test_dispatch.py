@@ -0,0 +1,138 @@
+# UpdateDispatcher: порядок внутри чата, параллельность между чатами,
+# сброс при переполнении и устаревшие апдейты. Апдейт здесь — (чат, номер).
+import random
+import threading
+import time
+
+from app.dispatch import UpdateDispatcher
+
+
+def _key(item):
+    return item[0]
+
+
+def test_order_within_chat():
+    seen: dict[str, list[int]] = {}
+    active: dict[str, int] = {}
+    overlaps = []
+    lock = threading.Lock()
+    rnd = random.Random(1)
+    delays = [rnd.random() / 1000 for _ in range(300)]
+
+    def handle(item):
+        chat, n = item
+        with lock:
+            active[chat] = active.get(chat, 0) + 1
+            if active[chat] > 1:
+                overlaps.append(item)
+        time.sleep(delays[n % len(delays)])
+        with lock:
+            active[chat] -= 1
+            seen.setdefault(chat, []).append(n)
+
+    d = UpdateDispatcher(handle, workers=4, queue_size=1000, key=_key)
+    d.start()
+    for n in range(100):
+        for chat in ("a", "b", "c"):
+            d.submit((chat, n))
+    d.stop(timeout=10)
+
+    assert overlaps == []
+    assert seen == {chat: list(range(100)) for chat in ("a", "b", "c")}
+
+
+def test_slow_chat_does_not_block_others():
+    release = threading.Event()
+    done = []
+
+    def handle(item):
+        if item[0] == "slow":
+            release.wait(5)
+        done.append(item)
+
+    d = UpdateDispatcher(handle, workers=2, queue_size=10, key=_key)
+    d.start()
+    d.submit(("slow", 0))
+    d.submit(("slow", 1))
+    d.submit(("fast", 0))
+    deadline = time.monotonic() + 2
+    while ("fast", 0) not in done and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert done == [("fast", 0)]
+    release.set()
+    d.stop(timeout=5)
+    assert done[1:] == [("slow", 0), ("slow", 1)]
+
+
+def test_shed_when_full():
+    release = threading.Event()
+    handled, shed = [], []
+
+    def handle(item):
+        release.wait(5)
+        handled.append(item)
+
+    def shed_fn(item):
+        # бросать можно только нажатия кнопок
+        if item[1] == "button":
+            shed.append(item)
+            return True
+        return False
+
+    d = UpdateDispatcher(
+        handle, workers=1, queue_size=2, key=_key, overflow="shed", shed=shed_fn
+    )
+    d.start()
+    assert d.submit(("a", "text"))
+    assert d.submit(("b", "text"))
+    # очередь полна: кнопку сбрасываем сразу
+    assert not d.submit(("c", "button"))
+    assert shed == [("c", "button")]
+    assert d.shed_count == 1
+
+    # текст не бросаем — submit ждёт места
+    accepted = []
+    t = threading.Thread(target=lambda: accepted.append(d.submit(("d", "text"))))
+    t.start()
+    t.join(0.1)
+    assert t.is_alive()
+    release.set()
+    t.join(5)
+    assert accepted == [True]
+    d.stop(timeout=5)
+    assert sorted(handled) == [("a", "text"), ("b", "text"), ("d", "text")]
+
+
+def test_stale_update_is_shed():
+    release = threading.Event()
+    handled, shed = [], []
+
+    def handle(item):
+        if item[1] == 0:
+            release.wait(5)
+        handled.append(item)
+
+    def shed_fn(item):
+        shed.append(item)
+        return True
+
+    d = UpdateDispatcher(
+        handle, workers=1, queue_size=10, key=_key, stale_after=0.05, shed=shed_fn
+    )
+    d.start()
+    d.submit(("a", 0))
+    d.submit(("a", 1))
+    time.sleep(0.1)
+    release.set()
+    d.stop(timeout=5)
+    assert handled == [("a", 0)]
+    assert shed == [("a", 1)]
+
+
+def test_stop_refuses_new_updates():
+    d = UpdateDispatcher(lambda item: None, workers=1, queue_size=10, key=_key)
+    d.start()
+    assert d.submit(("a", 0))
+    d.stop(timeout=5)
+    assert not d.submit(("a", 1))
+    assert d.queue_depth() == 0
@@ -0,0 +1,66 @@
+# Кеш экспорта точки при отстающей реплике (DB_READ_URL): файл собирается
+# с реплики и кешируется под её watermark, а не под watermark основной базы,
+# иначе старый файл отдавался бы до следующей записи.
+import random
+
+import pytest
+
+from app import callbacks as cbdata
+from app.bot import BotApp, DispatchingTeleBot
+from app.config import Config
+from app.db import Base, make_engine, make_session_factory
+from app.export_cache import export_watermark
+from bench.loadtest import Updates, seed
+
+
+def _database(path):
+    engine = make_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(engine)
+    Session = make_session_factory(engine)
+    # seed детерминирован: обе базы одинаковые
+    home, items_by_outlet = seed(Session, users=2, outlets=1, items=5)
+    return engine, Session, home, items_by_outlet
+
+
+@pytest.fixture
+def lagging(tmp_path, telegram):
+    engine, Session, home, items_by_outlet = _database(tmp_path / "primary.db")
+    replica, ReplicaSession, _, _ = _database(tmp_path / "replica.db")
+    cfg = Config(bot_token="1:test", db_url="sqlite://", export_dir=str(tmp_path))
+    app = BotApp(
+        cfg,
+        Session,
+        bot=DispatchingTeleBot(cfg.bot_token, threaded=False),
+        read_session_factory=ReplicaSession,
+    )
+    yield app, Session, ReplicaSession, home, items_by_outlet
+    app.drain()
+    engine.dispose()
+    replica.dispose()
+
+
+def test_export_cached_under_replica_watermark(lagging, telegram):
+    app, Session, ReplicaSession, home, items_by_outlet = lagging
+    tg_id, outlet_id = next(iter(home.items()))
+    gen = Updates(random.Random(1))
+    # запись уходит только в основную базу — реплика отстала
+    app.bot.process_update_now(
+        gen.callback(
+            tg_id,
+            "i:qty",
+            outlet_id,
+            items_by_outlet[outlet_id][0],
+            1,
+            cbdata.SORT_ALPHA,
+        )
+    )
+    app.bot.process_update_now(gen.callback(tg_id, "i:export", outlet_id))
+    assert telegram.calls["sendDocument"] == 1
+
+    with Session() as db, ReplicaSession() as rdb:
+        primary = export_watermark(db, outlet_id)
+        replica = export_watermark(rdb, outlet_id)
+    assert primary != replica
+    key = ("outlet", outlet_id)
+    assert app.export_cache.get(key, replica) is not None
+    assert app.export_cache.get(key, primary) is None
@@ -0,0 +1,64 @@
+# Выгрузка группы: листы в порядке точек, и в памяти не больше max_workers
+# снимков сразу.
+import io
+import threading
+
+import pytest
+from openpyxl import load_workbook
+from sqlalchemy import select
+
+from app import export_xslx
+from app.db import Base, make_engine, make_session_factory
+from app.models import Outlet
+from bench.loadtest import seed
+
+
+@pytest.fixture
+def Session(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'group.db'}")
+    Base.metadata.create_all(engine)
+    Session = make_session_factory(engine)
+    seed(Session, users=1, outlets=7, items=3)
+    yield Session
+    engine.dispose()
+
+
+def test_sheets_in_outlet_order(Session):
+    with Session() as db:
+        (group_id,) = db.scalars(select(Outlet.group_id).distinct()).all()
+        ids = db.scalars(select(Outlet.id).order_by(Outlet.id)).all()
+
+    buf = export_xslx.export_group_xlsx(Session, group_id, io.BytesIO(), max_workers=3)
+    buf.seek(0)
+    wb = load_workbook(buf, read_only=True)
+    assert wb.sheetnames[:2] == ["Summary", "Audit"]
+    assert [int(t.split()[0]) for t in wb.sheetnames[2:]] == ids
+    summary = list(wb["Summary"].iter_rows(min_row=5, values_only=True))
+    assert [row[0] for row in summary] == ids
+    assert all(row[2] == 3 for row in summary)
+
+
+def test_window_is_bounded(Session, monkeypatch):
+    with Session() as db:
+        (group_id,) = db.scalars(select(Outlet.group_id).distinct()).all()
+
+    lock = threading.Lock()
+    live, peak = [0], [0]
+    snapshot = export_xslx._snapshot_outlet
+
+    class Counted(export_xslx.OutletSnapshot):
+        def __del__(self):
+            with lock:
+                live[0] -= 1
+
+    def counted(session_factory, outlet_id, name):
+        snap = snapshot(session_factory, outlet_id, name)
+        with lock:
+            live[0] += 1
+            peak[0] = max(peak[0], live[0])
+        return Counted(**vars(snap))
+
+    monkeypatch.setattr(export_xslx, "_snapshot_outlet", counted)
+    export_xslx.export_group_xlsx(Session, group_id, io.BytesIO(), max_workers=2)
+    assert 1 <= peak[0] <= 2
+    assert live[0] == 0
@@ -0,0 +1,152 @@
+# Планировщик исходящих: приоритеты, 429 и остановка с очередью. Транспорт —
+# функция send, которая пишет порядок вызовов и при нужде держит запрос.
+import threading
+import time
+
+import pytest
+
+from app.outbound import OutboundScheduler
+
+URL = "https://api.telegram.org/bot1:x/"
+
+
+class _Response:
+    def __init__(self, status_code=200, retry_after=None):
+        self.status_code = status_code
+        self._retry_after = retry_after
+
+    def json(self):
+        return {"ok": False, "parameters": {"retry_after": self._retry_after}}
+
+
+class Transport:
+    def __init__(self):
+        self.calls = []  # (method, chat_id, monotonic)
+        self.gate = threading.Event()
+        self.gate.set()
+        self.hold = set()  # методы, которые ждут gate
+        self.limited = {}  # (method, chat_id) -> сколько раз ответить 429
+        self.retry_after = 0.2
+
+    def __call__(self, method, url, **kwargs):
+        name = url.rsplit("/", 1)[-1]
+        chat = (kwargs.get("params") or {}).get("chat_id")
+        self.calls.append((name, chat, time.monotonic()))
+        if name in self.hold:
+            self.gate.wait(5)
+        if self.limited.get((name, chat), 0) > 0:
+            self.limited[(name, chat)] -= 1
+            return _Response(429, self.retry_after)
+        return _Response()
+
+
+@pytest.fixture
+def transport():
+    return Transport()
+
+
+@pytest.fixture
+def scheduler(transport):
+    s = OutboundScheduler(
+        send=transport, global_rate=1000, chat_rate=1000, burst=1000, senders=4
+    )
+    yield s
+    transport.gate.set()
+    s.stop(timeout=1)
+
+
+def call(scheduler, name, chat=None):
+    params = {} if chat is None else {"chat_id": chat}
+    return scheduler.request("post", URL + name, params=params)
+
+
+def in_thread(fn, *args):
+    result = {}
+
+    def run():
+        try:
+            result["value"] = fn(*args)
+        except BaseException as e:
+            result["error"] = e
+
+    t = threading.Thread(target=run, daemon=True)
+    t.start()
+    return t, result
+
+
+def wait_for(cond, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def test_priorities(transport):
+    # общий лимит 5/с выбран пятью запросами — остальное копится в очереди
+    # и уходит по приоритетам: ответы на callback, правки, файлы
+    scheduler = OutboundScheduler(
+        send=transport, global_rate=5, chat_rate=1000, burst=1000
+    )
+    try:
+        for _ in range(5):
+            call(scheduler, "getChat")
+        threads = [
+            in_thread(call, scheduler, "sendDocument", 2)[0],
+            in_thread(call, scheduler, "editMessageText", 3)[0],
+            in_thread(call, scheduler, "answerCallbackQuery")[0],
+        ]
+        wait_for(lambda: scheduler.queue_depth() == 3)
+        for t in threads:
+            t.join(2)
+    finally:
+        scheduler.stop(timeout=1)
+    assert [name for name, _, _ in transport.calls[5:]] == [
+        "answerCallbackQuery",
+        "editMessageText",
+        "sendDocument",
+    ]
+
+
+def test_429_freezes_only_that_chat(scheduler, transport):
+    transport.limited[("sendMessage", 1)] = 1
+    frozen, result = in_thread(call, scheduler, "sendMessage", 1)
+    wait_for(lambda: transport.calls)
+    started = time.monotonic()
+    # другой чат не ждёт заморозки первого
+    call(scheduler, "sendMessage", 2)
+    assert time.monotonic() - started < transport.retry_after / 2
+    frozen.join(2)
+    assert result["value"].status_code == 200
+    retries = [at for name, chat, at in transport.calls if chat == 1]
+    assert len(retries) == 2
+    assert retries[1] - retries[0] >= transport.retry_after * 0.9
+
+
+def test_429_without_chat_freezes_only_the_method(scheduler, transport):
+    transport.limited[("answerCallbackQuery", None)] = 1
+    transport.retry_after = 0.5
+    answer, result = in_thread(call, scheduler, "answerCallbackQuery")
+    wait_for(lambda: transport.calls)
+    started = time.monotonic()
+    call(scheduler, "sendMessage", 1)
+    assert time.monotonic() - started < 0.25
+    answer.join(2)
+    assert result["value"].status_code == 200
+
+
+def test_stop_fails_queued_jobs(scheduler, transport):
+    transport.hold = {"sendMessage"}
+    transport.gate.clear()
+    inflight, inflight_result = in_thread(call, scheduler, "sendMessage", 1)
+    wait_for(lambda: transport.calls)
+    # тот же чат — ждёт в очереди, пока первый запрос не ответит
+    queued, queued_result = in_thread(call, scheduler, "editMessageText", 1)
+    wait_for(lambda: scheduler.queue_depth() == 1)
+
+    threading.Timer(0.2, transport.gate.set).start()
+    scheduler.stop(timeout=0.05)
+    queued.join(1)
+    inflight.join(1)
+    assert not queued.is_alive()
+    assert isinstance(queued_result["error"], RuntimeError)
+    assert inflight_result["value"].status_code == 200
@@ -0,0 +1,79 @@
+# Кеш метаданных точек: попадания, сброс после commit (и чтение соседней
+# сессии между flush и commit не оставляет старую строку), rollback, TTL.
+import time
+
+import pytest
+from sqlalchemy import select
+
+from app.db import Base, make_engine, make_session_factory
+from app.models import Outlet
+from app.outlet_cache import outlet_cache
+from bench.loadtest import seed
+
+
+@pytest.fixture
+def Session(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'outlets.db'}")
+    Base.metadata.create_all(engine)
+    Session = make_session_factory(engine)
+    seed(Session, users=1, outlets=2, items=1)
+    outlet_cache.configure(100, 60)
+    yield Session
+    outlet_cache.configure(100, 60)
+    engine.dispose()
+
+
+def _outlet_id(Session) -> int:
+    with Session() as db:
+        return db.scalars(select(Outlet.id).order_by(Outlet.id)).first()
+
+
+def test_hit_after_first_read(Session):
+    outlet_id = _outlet_id(Session)
+    with Session() as db:
+        first = outlet_cache.get(db, outlet_id)
+        hits = outlet_cache.hits
+        assert outlet_cache.get(db, outlet_id) is first
+        assert outlet_cache.hits == hits + 1
+        assert outlet_cache.get(db, 10_000) is None
+
+
+def test_rename_invalidates_after_commit(Session):
+    outlet_id = _outlet_id(Session)
+    with Session() as db:
+        assert outlet_cache.get(db, outlet_id).name == "outlet 0"
+
+    with Session() as writer, Session() as reader:
+        writer.get(Outlet, outlet_id).name = "renamed"
+        writer.flush()
+        # соседняя сессия читает ещё закоммиченное — и кладёт это в кеш
+        assert outlet_cache.get(reader, outlet_id).name == "outlet 0"
+        writer.commit()
+
+    with Session() as db:
+        assert outlet_cache.get(db, outlet_id).name == "renamed"
+
+
+def test_deactivate_and_rollback(Session):
+    outlet_id = _outlet_id(Session)
+    with Session() as db:
+        assert outlet_cache.get(db, outlet_id).is_active
+        db.get(Outlet, outlet_id).is_active = False
+        db.flush()
+        # своя сессия видит изменение сразу после flush
+        assert not outlet_cache.get(db, outlet_id).is_active
+        db.rollback()
+
+    with Session() as db:
+        assert outlet_cache.get(db, outlet_id).is_active
+
+
+def test_ttl(Session):
+    outlet_cache.configure(100, 0.05)
+    outlet_id = _outlet_id(Session)
+    with Session() as db:
+        outlet_cache.get(db, outlet_id)
+        time.sleep(0.1)
+        misses = outlet_cache.misses
+        outlet_cache.get(db, outlet_id)
+        assert outlet_cache.misses == misses + 1
@@ -0,0 +1,50 @@
+# Профилировщик апдейтов: cProfile одновременно только у одного апдейта,
+# занятый профилировщик апдейт не роняет.
+import cProfile
+import os
+import threading
+
+from app.profiling import UpdateProfiler
+
+
+def _profiles(directory):
+    return sorted(n for n in os.listdir(directory) if n.endswith(".prof"))
+
+
+def test_one_cprofile_at_a_time(tmp_path):
+    profiler = UpdateProfiler(str(tmp_path), sample_rate=1.0)
+    inside, release = threading.Event(), threading.Event()
+
+    def first():
+        with profiler.profile("i:open"):
+            inside.set()
+            release.wait(5)
+
+    t = threading.Thread(target=first)
+    t.start()
+    assert inside.wait(5)
+    # второй апдейт в это время идёт без cProfile, а не падает
+    with profiler.profile("i:qty"):
+        pass
+    release.set()
+    t.join(5)
+    profiles = _profiles(tmp_path)
+    assert len(profiles) == 1
+    assert "i_open" in profiles[0]
+
+    with profiler.profile("i:qty"):
+        pass
+    assert len(_profiles(tmp_path)) == 2
+
+
+def test_busy_profiler_does_not_fail_update(tmp_path, monkeypatch):
+    def enable(self):
+        raise ValueError("Another profiling tool is already active")
+
+    monkeypatch.setattr(cProfile.Profile, "enable", enable)
+    profiler = UpdateProfiler(str(tmp_path), sample_rate=1.0)
+    ran = False
+    with profiler.profile("i:qty"):
+        ran = True
+    assert ran
+    assert _profiles(tmp_path) == []
@@ -0,0 +1,49 @@
+# Бюджеты запросов на нажатие: апдейты из сценариев bench/loadtest.py идут
+# через BotApp.process_once целиком (Telegram — заглушка на уровне
+# транспорта), каждый под sqlstats.assert_query_budget с бюджетом своего
+# действия. Кеши холодные — это худший случай для бюджета.
+import logging
+import random
+
+import pytest
+from sqlalchemy import select
+
+from app import callbacks as cbdata
+from app import sqlstats
+from app.models import StockBalance
+from bench.loadtest import FLOWS, QUERY_BUDGETS, Updates
+
+
+@pytest.mark.parametrize("flow", sorted(FLOWS))
+def test_flow_within_query_budget(env, telegram, caplog, flow):
+    app, Session, home, items_by_outlet = env
+    tg_id, outlet_id = next(iter(home.items()))
+    steps = Updates(random.Random(1)).flow(
+        flow, tg_id, outlet_id, items_by_outlet[outlet_id]
+    )
+    with caplog.at_level(logging.ERROR):
+        for action, update in steps:
+            calls = sum(telegram.calls.values())
+            with sqlstats.assert_query_budget(QUERY_BUDGETS[action]) as stats:
+                assert app.process_once(update)
+            # хендлер действительно отработал, а не упал на первом запросе
+            assert stats.count > 0, action
+            assert sum(telegram.calls.values()) > calls, action
+    # исключения хендлеров telebot только логирует
+    assert not caplog.records, caplog.text
+
+
+def test_qty_applies_delta(env):
+    app, Session, home, items_by_outlet = env
+    tg_id, outlet_id = next(iter(home.items()))
+    item_id = items_by_outlet[outlet_id][0]
+    update = Updates(random.Random(1)).callback(
+        tg_id, "i:qty", outlet_id, item_id, 1, cbdata.SORT_ALPHA
+    )
+    with sqlstats.assert_query_budget(QUERY_BUDGETS["i:qty"]):
+        assert app.process_once(update)
+    with Session() as db:
+        quantity = db.scalar(
+            select(StockBalance.quantity).where(StockBalance.item_id == item_id)
+        )
+    assert quantity == 11
@@ -0,0 +1,205 @@
+# Планы горячих запросов на SQLite: ни полного прохода по таблице, ни
+# сортировки во временном B-дереве. Запросы — настоящие, из кода бота:
+# перехватываем каждый SELECT и прогоняем его же через EXPLAIN QUERY PLAN.
+import datetime
+import re
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event, select
+
+from app import access
+from app.db import Base, ensure_indexes, make_engine, make_session_factory
+from app.export_cache import export_watermark
+from app.export_rows import audit_rows, inventory_rows
+from app.models import (
+    AuditAction,
+    AuditLog,
+    Group,
+    GroupMembership,
+    GroupRole,
+    Item,
+    Outlet,
+    OutletMembership,
+    OutletRole,
+    StockBalance,
+    User,
+)
+from app.services import groups as groups_svc
+from app.services import inventory as inventory_svc
+
+USERS = 200
+OUTLETS = 50  # в одной группе
+ITEM_OUTLETS = 5  # из них с товарами
+ITEMS = 300
+AUDIT = 5000
+
+# SCAN — проход по всей таблице или по всему индексу; SEARCH — поиск по ключу
+FULL_SCAN = re.compile(r"^SCAN (?!CONSTANT ROW)")
+TEMP_SORT = "USE TEMP B-TREE"
+# выгрузка за период сортирует только попавшие в окно строки — это дешевле,
+# чем идти по всей точке в порядке имени
+SORT_OK = {"inventory_rows range"}
+
+SINCE = datetime.datetime(2024, 1, 1, 2)
+UNTIL = datetime.datetime(2024, 1, 1, 4)
+
+# (название, вызов(db, ids)) — то, что выполняется на каждое нажатие или экспорт
+HOT_QUERIES = [
+    (
+        "can_access_outlet",
+        lambda db, q: access.can_access_outlet(db, q.user_id, q.outlet_id),
+    ),
+    ("user_groups", lambda db, q: groups_svc.user_groups(db, q.user_id)),
+    (
+        "outlets of group",
+        lambda db, q: db.scalars(
+            select(Outlet)
+            .where(Outlet.group_id == q.group_id, Outlet.is_active == True)
+            .order_by(Outlet.id.asc())
+        ).all(),
+    ),
+    *(
+        (
+            f"list_items {sort}",
+            lambda db, q, sort=sort: inventory_svc.list_items(db, q.outlet_id, sort),
+        )
+        for sort in ("alpha", "created", "updated")
+    ),
+    (
+        "item by id",
+        lambda db, q: db.scalar(
+            select(Item).where(
+                Item.id == q.item_id,
+                Item.outlet_id == q.outlet_id,
+                Item.is_active == True,
+            )
+        ),
+    ),
+    (
+        "balance",
+        lambda db, q: inventory_svc.get_or_create_balance(db, q.outlet_id, q.item_id),
+    ),
+    (
+        "balances of listed items",
+        lambda db, q: db.scalars(
+            select(StockBalance.quantity).where(
+                StockBalance.outlet_id == q.outlet_id,
+                StockBalance.item_id.in_([q.item_id, q.item_id + 1]),
+            )
+        ).all(),
+    ),
+    ("list_balances", lambda db, q: inventory_svc.list_balances(db, q.outlet_id)),
+    ("export_watermark", lambda db, q: export_watermark(db, q.outlet_id)),
+    ("inventory_rows", lambda db, q: list(inventory_rows(db, q.outlet_id))),
+    (
+        "inventory_rows range",
+        lambda db, q: list(inventory_rows(db, q.outlet_id, since=SINCE, until=UNTIL)),
+    ),
+    ("audit_rows", lambda db, q: list(audit_rows(db, q.outlet_id))),
+    (
+        "audit_rows range",
+        lambda db, q: list(audit_rows(db, q.outlet_id, since=SINCE, until=UNTIL)),
+    ),
+]
+
+
+def seed(db) -> SimpleNamespace:
+    users = [User(tg_user_id=1000 + i, name=f"user {i}") for i in range(USERS)]
+    db.add_all(users)
+    db.flush()
+    u = users[0]
+    groups = [Group(name=f"group {i}", created_by_user_id=u.id) for i in range(10)]
+    db.add_all(groups)
+    db.flush()
+    g = groups[0]
+    db.add_all(
+        GroupMembership(
+            group_id=groups[i % len(groups)].id,
+            user_id=user.id,
+            role=GroupRole.GROUP_OWNER if i == 0 else GroupRole.GROUP_MANAGER,
+        )
+        for i, user in enumerate(users)
+    )
+    now = datetime.datetime(2024, 1, 1)
+    outlets = []
+    for o_i in range(OUTLETS):
+        o = Outlet(group_id=g.id, name=f"outlet {o_i}", is_active=o_i != 0)
+        db.add(o)
+        db.flush()
+        outlets.append(o.id)
+        db.add(
+            OutletMembership(outlet_id=o.id, user_id=u.id, role=OutletRole.OUTLET_STAFF)
+        )
+        for i in range(ITEMS if o_i < ITEM_OUTLETS else 0):
+            ts = now + datetime.timedelta(minutes=i)
+            it = Item(
+                outlet_id=o.id,
+                name=f"item {i:04d}",
+                unit="pcs",
+                is_active=i % 10 != 0,
+                created_at=ts,
+                updated_at=ts,
+            )
+            db.add(it)
+            db.flush()
+            db.add(StockBalance(outlet_id=o.id, item_id=it.id, quantity=i))
+    for i in range(AUDIT):
+        db.add(
+            AuditLog(
+                user_id=users[i % USERS].id,
+                outlet_id=outlets[i % ITEM_OUTLETS],
+                group_id=g.id,
+                action=AuditAction.QTY_DELTA,
+                entity_type="item",
+                created_at=now + datetime.timedelta(minutes=i),
+            )
+        )
+    db.commit()
+    outlet_id = outlets[1]
+    return SimpleNamespace(
+        user_id=u.id,
+        group_id=g.id,
+        outlet_id=outlet_id,
+        item_id=db.scalar(select(Item.id).where(Item.outlet_id == outlet_id)),
+    )
+
+
+@pytest.fixture(scope="module")
+def explained():
+    # -> (сессия, ids, список (SELECT, строки плана) последнего вызова)
+    engine = make_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    ensure_indexes(engine)
+    plans: list[tuple[str, list[str]]] = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def explain(conn, cursor, statement, parameters, context, executemany):
+        if executemany or not statement.lstrip().upper().startswith("SELECT"):
+            return
+        rows = cursor.execute("EXPLAIN QUERY PLAN " + statement, parameters).fetchall()
+        plans.append((statement, [r[-1] for r in rows]))
+
+    with make_session_factory(engine)() as db:
+        ids = seed(db)
+        # статистика для планировщика — как на живой базе
+        db.connection().exec_driver_sql("ANALYZE")
+        yield db, ids, plans
+    engine.dispose()
+
+
+@pytest.mark.parametrize(
+    "name, run", HOT_QUERIES, ids=[name for name, _ in HOT_QUERIES]
+)
+def test_hot_query_uses_indexes(explained, name, run):
+    db, ids, plans = explained
+    plans.clear()
+    run(db, ids)
+    assert plans, "no SELECT was executed"
+    bad = [
+        f"{line}  <-  {' '.join(statement.split())}"
+        for statement, lines in plans
+        for line in lines
+        if FULL_SCAN.match(line) or (TEMP_SORT in line and name not in SORT_OK)
+    ]
+    assert not bad, "\n".join(bad)
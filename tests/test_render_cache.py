@@ -0,0 +1,48 @@
+# Кеш отрисовки: тот же текст и клавиатура в то же сообщение — edit не шлём.
+import random
+
+from app import callbacks as cbdata
+from app.render_cache import RenderCache, render_fingerprint
+from bench.loadtest import Updates
+
+
+def test_identical_edit_is_skipped(env, telegram):
+    app, Session, home, items_by_outlet = env
+    tg_id, outlet_id = next(iter(home.items()))
+    gen = Updates(random.Random(1))
+
+    def press(*args):
+        before = telegram.calls["editMessageText"]
+        app.bot.process_update_now(gen.callback(tg_id, *args))
+        return telegram.calls["editMessageText"] - before
+
+    assert press("i:open", outlet_id, cbdata.SORT_ALPHA) == 1
+    # ничего не изменилось — второй раз не редактируем
+    assert press("i:open", outlet_id, cbdata.SORT_ALPHA) == 0
+    # количество изменилось — список уже другой
+    item_id = items_by_outlet[outlet_id][0]
+    assert press("i:qty", outlet_id, item_id, 1, cbdata.SORT_ALPHA) == 1
+    assert press("i:open", outlet_id, cbdata.SORT_ALPHA) == 1
+    assert press("i:open", outlet_id, cbdata.SORT_ALPHA) == 0
+    assert telegram.calls["answerCallbackQuery"] == 5
+
+
+def test_fingerprint_covers_keyboard():
+    assert render_fingerprint("a") == render_fingerprint("a", None)
+    assert render_fingerprint("a") != render_fingerprint("a", "{}")
+    assert render_fingerprint("a", "{}") != render_fingerprint("b", "{}")
+
+
+def test_lru_eviction():
+    cache = RenderCache(maxsize=2)
+    fp = render_fingerprint("x")
+    cache.remember(1, 1, fp)
+    cache.remember(1, 2, fp)
+    assert cache.is_current(1, 1, fp)  # 1/1 теперь свежее 1/2
+    cache.remember(1, 3, fp)
+    assert len(cache) == 2
+    assert not cache.is_current(1, 2, fp)
+    assert cache.is_current(1, 1, fp) and cache.is_current(1, 3, fp)
+    cache.forget(1, 3)
+    assert not cache.is_current(1, 3, fp)
+    assert cache.hits == 3
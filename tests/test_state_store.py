@@ -0,0 +1,117 @@
+# Хранилища состояния диалогов: запись и чтение, копии, TTL, LRU; SQL —
+# переживает новый экземпляр, shared видит чужие записи сразу.
+import datetime
+import time
+
+import pytest
+from sqlalchemy import select, update
+
+from app.db import Base, make_engine, make_session_factory
+from app.models import DialogState
+from app.state_store import MemoryStateStore, SqlStateStore, make_state_store
+
+
+@pytest.fixture
+def Session(tmp_path):
+    engine = make_engine(f"sqlite:///{tmp_path / 'state.db'}")
+    Base.metadata.create_all(engine)
+    yield make_session_factory(engine)
+    engine.dispose()
+
+
+@pytest.fixture
+def sql_store(Session):
+    stores = []
+
+    def make(**kwargs):
+        kwargs = {"maxsize": 100, "ttl": 3600, "flush_interval": 60, **kwargs}
+        store = SqlStateStore(Session, **kwargs)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def test_memory_round_trip():
+    store = MemoryStateStore(maxsize=10, ttl=60)
+    state = {"mode": "set_qty", "outlet_id": 1}
+    store.put(1, state)
+    state["mode"] = "changed"
+    got = store.get(1)
+    assert got == {"mode": "set_qty", "outlet_id": 1}
+    # get отдаёт копию
+    got["mode"] = "changed"
+    assert store.get(1)["mode"] == "set_qty"
+    store.delete(1)
+    assert store.get(1) == {}
+    assert store.get(2) == {}
+
+
+def test_memory_ttl_and_lru():
+    store = MemoryStateStore(maxsize=2, ttl=0.05)
+    store.put(1, {"a": 1})
+    time.sleep(0.1)
+    assert store.get(1) == {}
+    assert store.peek(1) is None
+
+    store = MemoryStateStore(maxsize=2, ttl=60)
+    store.put(1, {"a": 1})
+    store.put(2, {"a": 2})
+    store.get(1)
+    store.put(3, {"a": 3})
+    assert len(store) == 2
+    assert store.peek(2) is None
+    assert store.get(1) == {"a": 1}
+
+
+def test_sql_round_trip(Session, sql_store):
+    store = sql_store()
+    store.put(1, {"mode": "rename_item", "item_id": 7})
+    store.put(2, {"mode": "add_item"})
+    assert store.get(1) == {"mode": "rename_item", "item_id": 7}
+    store.flush()
+    # новый процесс — читает из базы
+    fresh = sql_store()
+    assert fresh.get(1) == {"mode": "rename_item", "item_id": 7}
+
+    store.delete(2)
+    store.flush()
+    with Session() as db:
+        assert db.scalars(select(DialogState.tg_user_id)).all() == [1]
+
+
+def test_sql_ttl(Session, sql_store):
+    store = sql_store(ttl=60)
+    store.put(1, {"mode": "set_qty"})
+    store.flush()
+    with Session() as db:
+        db.execute(
+            update(DialogState).values(
+                updated_at=datetime.datetime.utcnow() - datetime.timedelta(minutes=2)
+            )
+        )
+        db.commit()
+    assert sql_store(ttl=60).get(1) == {}
+
+
+def test_sql_shared_sees_other_writers(Session, sql_store):
+    a, b = sql_store(shared=True), sql_store(shared=True)
+    assert b.get(1) == {}
+    a.put(1, {"mode": "set_qty"})
+    # без flush и без локального кеша
+    assert b.get(1) == {"mode": "set_qty"}
+    b.put(1, {"mode": "add_item"})
+    assert a.get(1) == {"mode": "add_item"}
+    a.delete(1)
+    assert b.get(1) == {}
+
+
+def test_make_state_store(Session):
+    assert isinstance(make_state_store("memory", Session, 10, 60, 1), MemoryStateStore)
+    store = make_state_store("sql", Session, 10, 60, 1, shared=True)
+    assert isinstance(store, SqlStateStore) and store.shared
+    store.close()
+    with pytest.raises(RuntimeError):
+        make_state_store("mongo://", Session, 10, 60, 1)
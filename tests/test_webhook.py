@@ -0,0 +1,108 @@
+# Webhook: без верного секрета — 403, кривой JSON — 400, апдейт уходит в
+# submit. И проверки секрета в load_config.
+import http.client
+import json
+import threading
+
+import pytest
+
+from app.config import load_config
+from app.webhook import SECRET_HEADER, make_webhook_server
+
+SECRET = "s3cret_token-1"
+UPDATE = {
+    "update_id": 7,
+    "message": {
+        "message_id": 1,
+        "date": 0,
+        "chat": {"id": 5, "type": "private"},
+        "from": {"id": 5, "is_bot": False, "first_name": "u"},
+        "text": "/start",
+    },
+}
+
+
+@pytest.fixture(scope="module")
+def running():
+    received = []
+    srv = make_webhook_server("127.0.0.1", 0, "/webhook", SECRET, received.append)
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield srv.server_address[1], received
+    srv.shutdown()
+    srv.server_close()
+
+
+@pytest.fixture
+def server(running):
+    port, received = running
+    received.clear()
+    return port, received
+
+
+def post(port, body: bytes, secret: str | None = SECRET, path="/webhook") -> int:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    headers = {"Content-Type": "application/json"}
+    if secret is not None:
+        headers[SECRET_HEADER] = secret
+    conn.request("POST", path, body=body, headers=headers)
+    status = conn.getresponse().status
+    conn.close()
+    return status
+
+
+def test_accepts_update(server):
+    port, received = server
+    assert post(port, json.dumps(UPDATE).encode()) == 200
+    assert [u.update_id for u in received] == [7]
+
+
+@pytest.mark.parametrize("secret", [None, "", "wrong", SECRET + "x"])
+def test_rejects_bad_secret(server, secret):
+    port, received = server
+    assert post(port, json.dumps(UPDATE).encode(), secret=secret) == 403
+    assert received == []
+
+
+@pytest.mark.parametrize("body", [b"{not json", b"", b"[1, 2"])
+def test_rejects_bad_json(server, body):
+    port, received = server
+    assert post(port, body) == 400
+    assert received == []
+
+
+def test_unknown_path(server):
+    port, received = server
+    assert post(port, json.dumps(UPDATE).encode(), path="/other") == 404
+    assert received == []
+
+
+def test_secret_is_required():
+    with pytest.raises(ValueError):
+        make_webhook_server("127.0.0.1", 0, "/webhook", "", lambda u: None)
+
+
+@pytest.fixture
+def webhook_env(monkeypatch):
+    monkeypatch.setenv("BOT_TOKEN", "1:x")
+    monkeypatch.setenv("BOT_MODE", "webhook")
+    monkeypatch.delenv("WEBHOOK_SECRET", raising=False)
+    monkeypatch.delenv("WEBHOOK_URL", raising=False)
+    return monkeypatch
+
+
+def test_config_needs_secret_without_url(webhook_env):
+    with pytest.raises(RuntimeError, match="WEBHOOK_SECRET"):
+        load_config()
+
+
+def test_config_generates_secret_with_url(webhook_env):
+    webhook_env.setenv("WEBHOOK_URL", "https://example.com/webhook")
+    first, second = load_config(), load_config()
+    assert first.webhook_secret and first.webhook_secret != second.webhook_secret
+
+
+def test_config_rejects_invalid_secret(webhook_env):
+    webhook_env.setenv("WEBHOOK_SECRET", "has spaces")
+    with pytest.raises(RuntimeError, match="WEBHOOK_SECRET"):
+        load_config()